@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
@@ -7,8 +8,20 @@ from dateutil.relativedelta import relativedelta
 import os
 import json
 import hashlib
+import html
 import secrets
+import threading
 import time
+from collections import OrderedDict
+from operator import itemgetter
+import glob
+import openpyxl
+import pyarrow as pa
+import pyarrow.feather as feather
+from armazenamento import criar_armazenamento, gravar_atomico, ler_json, salvar_json, atualizar_json
+from formatacao import formatar_moeda, formatar_moedas, formatar_datas, FORMATO_DATA_BR
+from extratos import (PARSERS, CacheExtratos, chave_cache, hash_arquivo, identificar_extrato,
+                      processar_extrato_bradesco, processar_extratos_em_paralelo, saldos_finais)
 
 # Classe de Autenticação
 class AuthenticationSystem:
@@ -391,38 +404,709 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+class CachePlanilhas:
+    """Cache LRU de planilhas já processadas, chaveado pela impressão digital do arquivo"""
+    
+    def __init__(self, capacidade=4):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._hashes = {}
+        self._lock = threading.Lock()
+    
+    def _hash_conteudo(self, caminho, tamanho, mtime):
+        """Calcula o SHA-256 do arquivo, reaproveitando o último cálculo se tamanho/mtime não mudaram"""
+        memo = self._hashes.get(caminho)
+        if memo and memo[0] == tamanho and memo[1] == mtime:
+            return memo[2]
+        
+        sha = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(bloco)
+        digest = sha.hexdigest()
+        self._hashes[caminho] = (tamanho, mtime, digest)
+        return digest
+    
+    def impressao_digital(self, caminho):
+        """Retorna (caminho resolvido, tamanho, mtime, hash do conteúdo)"""
+        caminho = os.path.realpath(caminho)
+        info = os.stat(caminho)
+        with self._lock:
+            digest = self._hash_conteudo(caminho, info.st_size, info.st_mtime_ns)
+        return (caminho, info.st_size, info.st_mtime_ns, digest)
+    
+    def obter(self, chave):
+        """Retorna o valor em cache (marcando como usado recentemente) ou None"""
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+    
+    def guardar(self, chave, valor):
+        """Guarda um valor, descartando versões antigas do mesmo arquivo e o item menos usado"""
+        with self._lock:
+            for antiga in [c for c in self._itens if c[0] == chave[0] and c != chave]:
+                del self._itens[antiga]
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+    
+    def invalidar(self, caminho=None):
+        """Remove do cache um arquivo específico ou, sem argumento, todos os itens"""
+        with self._lock:
+            if caminho is None:
+                self._itens.clear()
+                self._hashes.clear()
+                return
+            caminho = os.path.realpath(caminho)
+            for chave in [c for c in self._itens if c[0] == caminho]:
+                del self._itens[chave]
+            self._hashes.pop(caminho, None)
+    
+    def __len__(self):
+        return len(self._itens)
+
+class CacheFragmentos:
+    """Cache LRU de trechos de HTML já renderizados (chave montada por quem renderiza)"""
+    
+    def __init__(self, capacidade=64):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obter(self, chave):
+        """Retorna o fragmento (marcando como usado recentemente) ou None"""
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+    
+    def guardar(self, chave, fragmento):
+        """Guarda um fragmento, descartando o menos usado quando passa da capacidade"""
+        with self._lock:
+            self._itens[chave] = fragmento
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+    
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+    
+    def __len__(self):
+        return len(self._itens)
+
+class ArvoreFenwick:
+    """Árvore de Fenwick (BIT): soma de prefixo e atualização pontual em O(log n)"""
+    
+    def __init__(self, valores):
+        self.valores = np.nan_to_num(np.asarray(valores, dtype=float)).copy()
+        self.n = len(self.valores)
+        
+        # Construção em bloco: o nó i guarda a soma de (i - lowbit(i), i]
+        acumulado = np.concatenate(([0.0], np.cumsum(self.valores)))
+        i = np.arange(1, self.n + 1)
+        self.arvore = np.zeros(self.n + 1)
+        self.arvore[1:] = acumulado[i] - acumulado[i - (i & -i)]
+    
+    def __len__(self):
+        return self.n
+    
+    def atualizar(self, posicao, diferenca):
+        """Soma `diferenca` ao valor da posição (0-based)"""
+        self.valores[posicao] += diferenca
+        i = posicao + 1
+        while i <= self.n:
+            self.arvore[i] += diferenca
+            i += i & -i
+    
+    def definir(self, posicao, valor):
+        """Troca o valor da posição (0-based)"""
+        valor = 0.0 if pd.isna(valor) else float(valor)
+        self.atualizar(posicao, valor - self.valores[posicao])
+    
+    def prefixo(self, posicao):
+        """Soma das posições 0..posicao (inclusive); -1 retorna 0"""
+        total = 0.0
+        i = min(posicao, self.n - 1) + 1
+        while i > 0:
+            total += self.arvore[i]
+            i -= i & -i
+        return total
+    
+    def soma(self, inicio, fim):
+        """Soma das posições [inicio, fim)"""
+        return self.prefixo(fim - 1) - self.prefixo(inicio - 1)
+    
+    def prefixos(self, inicio, fim):
+        """Subtotais acumulados das posições [inicio, fim): uma consulta + cumsum da janela"""
+        return self.prefixo(inicio - 1) + np.cumsum(self.valores[inicio:fim])
+
+class SubtotaisFluxo:
+    """Subtotais acumulados de uma ordenação do fluxo: geral e por grupo de prioridade
+    
+    Guarda uma ArvoreFenwick para a ordem completa e uma para cada prioridade
+    (linhas do grupo na mesma ordem). Alterar um valor é uma atualização pontual
+    e o subtotal de qualquer linha ou janela sai sem percorrer os dados. Também
+    serve de índice dos grupos (posições, quantidades e totais) para as páginas.
+    """
+    
+    def __init__(self, dados):
+        self.dados = dados
+        valores = pd.to_numeric(dados['Valor'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        self.geral = ArvoreFenwick(valores)
+        
+        prioridades = pd.to_numeric(dados['Prioridade'], errors='coerce').to_numpy(dtype=float)
+        self.grupo_linha = [self.chave_grupo(p) for p in prioridades]
+        self.posicoes_grupo = {}
+        self.arvores_grupo = {}
+        for grupo in pd.unique(pd.Series(prioridades)):
+            grupo = self.chave_grupo(grupo)
+            posicoes = np.flatnonzero(np.isnan(prioridades)) if grupo is None else np.flatnonzero(prioridades == grupo)
+            self.posicoes_grupo[grupo] = posicoes
+            self.arvores_grupo[grupo] = ArvoreFenwick(valores[posicoes])
+    
+    @staticmethod
+    def chave_grupo(prioridade):
+        """Prioridade normalizada (float) ou None para registros sem prioridade"""
+        return None if prioridade is None or pd.isna(prioridade) else float(prioridade)
+    
+    def _posicao_no_grupo(self, posicao):
+        grupo = self.grupo_linha[posicao]
+        return grupo, int(np.searchsorted(self.posicoes_grupo[grupo], posicao))
+    
+    def atualizar_valor(self, posicao, valor):
+        """Atualização pontual do valor de uma linha (geral e no grupo)"""
+        self.geral.definir(posicao, valor)
+        grupo, posicao_grupo = self._posicao_no_grupo(posicao)
+        self.arvores_grupo[grupo].definir(posicao_grupo, valor)
+    
+    def subtotal(self, posicao):
+        return self.geral.prefixo(posicao)
+    
+    def subtotal_grupo(self, posicao):
+        grupo, posicao_grupo = self._posicao_no_grupo(posicao)
+        return self.arvores_grupo[grupo].prefixo(posicao_grupo)
+    
+    def janela(self, inicio, fim):
+        """Subtotais gerais das posições [inicio, fim)"""
+        return self.geral.prefixos(inicio, fim)
+    
+    def janela_grupo(self, prioridade, inicio=0, fim=None):
+        """Subtotais das linhas [inicio, fim) de um grupo de prioridade (índices dentro do grupo)"""
+        arvore = self.arvores_grupo.get(self.chave_grupo(prioridade))
+        if arvore is None:
+            return np.zeros(0)
+        return arvore.prefixos(inicio, len(arvore) if fim is None else fim)
+    
+    def total_grupo(self, prioridade):
+        arvore = self.arvores_grupo.get(self.chave_grupo(prioridade))
+        return arvore.prefixo(len(arvore) - 1) if arvore is not None and len(arvore) else 0.0
+    
+    def quantidade_grupo(self, prioridade):
+        return len(self.posicoes_grupo.get(self.chave_grupo(prioridade), ()))
+    
+    def grupos(self):
+        """Prioridades presentes, em ordem crescente, com o grupo sem prioridade (None) por último"""
+        return sorted(self.posicoes_grupo, key=lambda grupo: (grupo is None, grupo or 0.0))
+    
+    def rotulos_linhas(self, rotulo):
+        """Array com o rótulo do grupo de cada linha; `rotulo(grupo)` é chamado uma vez por grupo"""
+        rotulos = np.empty(len(self.grupo_linha), dtype=object)
+        for grupo, posicoes in self.posicoes_grupo.items():
+            rotulos[posicoes] = rotulo(grupo)
+        return rotulos
+
 class FluxoCaixaApp:
-    def __init__(self):
-        self.arquivo_excel = "Previsão de fluxo de caixa projetado até dezembro_2025.xlsx"
-        self.arquivo_json = "dados_fluxo_caixa.json"
+    # Colunas da aba "Analítico" efetivamente usadas pelo app
+    COLUNAS_PLANILHA = [
+        'Filial', 'No. Titulo', 'Parcela', 'Tipo', 'Natureza', 'Fornecedor', 'Loja',
+        'Razão Social', 'Vencto Real', 'Historico', 'Valor',
+        'Data Renegociacao', 'Prioridade', 'Situacao', 'Descricao_Negociacao'
+    ]
+    COLUNAS_DATA = ['Vencto Real', 'Data Renegociacao']
+    FORMATOS_DATA = ['%d/%m/%Y', '%d/%m/%y']
+    # Chave composta de um registro e colunas de desempate para chaves repetidas
+    CHAVE_REGISTRO = ['Vencto Real', 'Razão Social']
+    DESEMPATE_REGISTRO = ['No. Titulo', 'Parcela']
+    # Campos cuja edição é registrada no diário e colunas que compõem a chave do registro
+    CAMPOS_DIARIO = ['Data Renegociacao', 'Prioridade', 'Situacao', 'Descricao_Negociacao', 'Valor']
+    COLUNAS_CHAVE_UNICA = ['Filial', 'No. Titulo', 'Parcela', 'Fornecedor', 'Razão Social']
+    # Número de edições no diário que dispara a compactação em segundo plano
+    LIMITE_DIARIO = 50
+    # Incrementar quando o formato do snapshot colunar (ou as colunas lidas) mudar
+    VERSAO_SNAPSHOT = 1
+    # Colunas calculadas mantidas em self.dados, mas nunca persistidas
+    # (Ordem_Registro desempata chaves repetidas e é numerada na ordem da base persistida)
+    COLUNAS_DERIVADAS = ['Data Efetiva', 'Chave_Ordenacao', 'Ordem_Registro']
+    # Chave de ordenação empacotada em int64: prioridade << 42 | renegociação << 21 | data efetiva
+    # (datas em dias desde 1900-01-01; data ausente e prioridade ausente ficam por último)
+    BITS_CHAVE = 21
+    SEM_VALOR_CHAVE = (1 << 21) - 1
+    PRIORIDADE_AUSENTE = 999
+    EPOCA_CHAVE = np.datetime64('1900-01-01', 'D')
+    # Modelos do relatório HTML do fluxo (preenchidos com str.format, colunas já formatadas)
+    MODELO_CABECALHO_FLUXO = (
+        '<div class="prioridade-section"><div class="prioridade-header {0}">{1} ({2} registros)</div>'
+        '<table class="fluxo-table"><thead><tr><th>Empresa</th><th>Vencto Real</th><th>Data Reneg.</th>'
+        '<th>Data Efetiva</th><th>Valor</th><th>Subtotal</th><th>Situação</th><th>Descrição</th>'
+        '<th>Histórico</th></tr></thead><tbody>'
+    )
+    MODELO_LINHA_FLUXO = (
+        '<tr class="{0}"><td class="empresa-col">{1}</td><td class="data-col">{2}</td>'
+        '<td class="data-col">{3}</td><td class="data-col"><strong>{4}</strong></td>'
+        '<td class="valor-col">{5}</td><td class="valor-col"><strong>{6}</strong></td>'
+        '<td class="situacao-col {7}">{8}</td><td class="descricao-col" title="{9}">{10}</td>'
+        '<td class="historico-col">{11}</td></tr>'
+    )
+    ROTULOS_PRIORIDADE = {
+        1: "Prioridade 1 - Urgente",
+        2: "Prioridade 2 - Alta", 
+        3: "Prioridade 3 - Média",
+        4: "Prioridade 4 - Baixa",
+        5: "Prioridade 5 - Muito Baixa",
+        None: "Sem Prioridade"
+    }
+    # Colunas que entram no conteúdo (e no hash) de uma seção do relatório
+    COLUNAS_HTML_FLUXO = ('Razão Social', 'Vencto Real', 'Data Renegociacao', 'Data Efetiva', 'Valor',
+                          'Situacao', 'Descricao_Negociacao', 'Historico')
+    # Textos e classes da situação na grade virtual (o índice é o código enviado ao navegador)
+    SITUACOES_GRADE = (('-', ''), ('✅ PG', 'situacao-pg'), ('❌ N_PG', 'situacao-npg'))
+    MODELO_TOTAL_FLUXO = (
+        '<tr class="total-row"><td colspan="4">Total {0}</td><td class="valor-col">{1}</td>'
+        '<td colspan="4"></td></tr></tbody></table></div>'
+    )
+    CSS_FLUXO = """
+        <style>
+        .fluxo-container {
+            font-family: Arial, sans-serif;
+            max-width: 100%;
+            margin: 0;
+        }
+        .prioridade-section {
+            margin-bottom: 20px;
+            border-radius: 8px;
+            overflow: hidden;
+            border: 1px solid #ddd;
+        }
+        .prioridade-header {
+            padding: 10px 15px;
+            font-weight: bold;
+            font-size: 16px;
+            color: white;
+            margin: 0;
+        }
+        .prioridade-1 { background-color: #FF0000; }
+        .prioridade-2 { background-color: #FF8000; }
+        .prioridade-3 { background-color: #FFFF00; color: #000; }
+        .prioridade-4 { background-color: #80FF00; color: #000; }
+        .prioridade-5 { background-color: #ADD8E6; color: #000; }
+        .sem-prioridade { background-color: #6c757d; }
+        
+        .fluxo-table {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 0;
+            font-size: 12px;
+        }
+        .fluxo-table th, .fluxo-table td {
+            padding: 8px;
+            text-align: left;
+            border-bottom: 1px solid #ddd;
+        }
+        .fluxo-table th {
+            background-color: #f8f9fa;
+            font-weight: bold;
+            font-size: 11px;
+        }
+        .fluxo-table tr:nth-child(even) {
+            background-color: #f9f9f9;
+        }
+        .fluxo-table tr:hover {
+            background-color: #f0f0f0;
+        }
+        .valor-col {
+            text-align: right;
+            font-family: 'Courier New', monospace;
+            font-size: 11px;
+        }
+        .data-col {
+            font-family: 'Courier New', monospace;
+            font-size: 11px;
+        }
+        .renegociada-row {
+            background-color: #fff3cd !important;
+        }
+        .total-row {
+            background-color: #e9ecef !important;
+            font-weight: bold;
+        }
+        .empresa-col {
+            max-width: 200px;
+            overflow: hidden;
+            text-overflow: ellipsis;
+            white-space: nowrap;
+        }
+        .historico-col {
+            max-width: 150px;
+            overflow: hidden;
+            text-overflow: ellipsis;
+            white-space: nowrap;
+            font-size: 10px;
+        }
+        .situacao-col {
+            text-align: center;
+            font-weight: bold;
+            font-size: 11px;
+        }
+        .situacao-pg {
+            background-color: #d4edda;
+            color: #155724;
+        }
+        .situacao-npg {
+            background-color: #f8d7da;
+            color: #721c24;
+        }
+        .descricao-col {
+            max-width: 200px;
+            overflow: hidden;
+            text-overflow: ellipsis;
+            white-space: nowrap;
+            font-size: 10px;
+            font-style: italic;
+        }
+        </style>
+        """
+    # Relatório HTML dos extratos: CSS fixo, modelo de linha (colunas já formatadas) e linhas por bloco
+    CSS_EXTRATOS = """
+        <style>
+            .extrato-table {
+                width: 100%;
+                border-collapse: collapse;
+                margin: 10px 0;
+                font-family: Arial, sans-serif;
+                font-size: 12px;
+            }
+            .extrato-table th, .extrato-table td {
+                border: 1px solid #ddd;
+                padding: 8px;
+                text-align: left;
+            }
+            .extrato-table th {
+                background-color: #1f77b4;
+                color: white;
+                font-weight: bold;
+                text-align: center;
+            }
+            .extrato-table tr:nth-child(even) {
+                background-color: #f9f9f9;
+            }
+            .extrato-table tr:hover {
+                background-color: #f5f5f5;
+            }
+            .credito {
+                color: #28a745;
+                font-weight: bold;
+            }
+            .debito {
+                color: #dc3545;
+                font-weight: bold;
+            }
+            .saldo-positivo {
+                color: #28a745;
+                font-weight: bold;
+            }
+            .saldo-negativo {
+                color: #dc3545;
+                font-weight: bold;
+            }
+            .data-col {
+                text-align: center;
+                width: 100px;
+            }
+            .valor-col {
+                text-align: right;
+                width: 120px;
+            }
+            .lancamento-col {
+                max-width: 300px;
+            }
+            .saldo-final {
+                background-color: #e9ecef;
+                border: 2px solid #007bff;
+                padding: 15px;
+                margin: 15px 0;
+                border-radius: 5px;
+                text-align: center;
+                font-size: 18px;
+                font-weight: bold;
+            }
+        </style>
+        """
+    MODELO_CABECALHO_EXTRATOS = (
+        '<table class="extrato-table"><thead><tr><th class="data-col">Data</th>'
+        '<th class="lancamento-col">Lançamento</th><th>Dcto</th><th class="valor-col">Crédito</th>'
+        '<th class="valor-col">Débito</th><th class="valor-col">Saldo</th><th>Arquivo</th></tr></thead><tbody>'
+    )
+    MODELO_LINHA_EXTRATO = (
+        '<tr><td class="data-col">{0}</td><td class="lancamento-col">{1}</td><td>{2}</td>'
+        '<td class="valor-col credito">{3}</td><td class="valor-col debito">{4}</td>'
+        '<td class="valor-col {5}">{6}</td><td>{7}</td></tr>'
+    )
+    TAMANHO_BLOCO_EXTRATOS = 500
+    ARQUIVO_EXCEL_PADRAO = "Previsão de fluxo de caixa projetado até dezembro_2025.xlsx"
+    
+    def __init__(self, arquivo_excel=None):
+        self.arquivo_excel = arquivo_excel or self.ARQUIVO_EXCEL_PADRAO
+        # Backend de persistência: 'json' (padrão) ou 'sqlite' via ROTA_VERDE_ARMAZENAMENTO
+        self.armazenamento = criar_armazenamento(
+            os.environ.get('ROTA_VERDE_ARMAZENAMENTO', 'json').strip().lower(),
+            "dados_fluxo_caixa",
+            funcao_chave=self._chaves_registros,
+        )
         self.pasta_uploads = "uploads"
         self.dados = None
         self.dados_originais = None
         
+        # Estado residente: versão dos dados e assinatura dos arquivos de origem
+        self.versao_dados = 0
+        self.mensagem_status = ""
+        self._assinatura_fontes = None
+        self._lock = threading.RLock()
+        self.cache_planilhas = CachePlanilhas()
+        
+        # Controle de gravação: flag de alteração (o hash do último conteúdo fica no armazenamento)
+        self._dados_sujos = True
+        
+        # DataFrame já ordenado pela chave e registros cuja chave mudou desde então
+        self._dados_ordenados = None
+        self._reposicionar_pendentes = set()
+        
+        # Subtotais (árvores de Fenwick) da ordenação atual; a coluna Sub_Total é materializada sob demanda
+        self._subtotais = None
+        self._sub_total_atualizado = False
+        
+        # Seções do relatório HTML já renderizadas e hashes de conteúdo dos grupos
+        self.cache_fragmentos = CacheFragmentos()
+        self._memo_hash_grupos = {}
+        
         # Cria pasta uploads se não existir
         if not os.path.exists(self.pasta_uploads):
             os.makedirs(self.pasta_uploads)
         
-    def salvar_dados_json(self):
-        """Salva os dados em formato JSON incluindo renegociação e prioridade"""
-        if self.dados is not None:
-            # Converte datas para string para serialização JSON
-            dados_json = self.dados.copy()
-            for col in dados_json.columns:
-                if pd.api.types.is_datetime64_any_dtype(dados_json[col]):
-                    dados_json[col] = dados_json[col].dt.strftime('%Y-%m-%d')
-                elif col in ['Data Renegociacao'] and dados_json[col].notna().any():
-                    dados_json[col] = pd.to_datetime(dados_json[col], errors='coerce').dt.strftime('%Y-%m-%d')
-            
-            # Preenche valores NaN com None para JSON
-            dados_json = dados_json.where(pd.notnull(dados_json), None)
-            
-            # Converte para dicionário e salva
-            dados_dict = dados_json.to_dict('records')
-            with open(self.arquivo_json, 'w', encoding='utf-8') as f:
-                json.dump(dados_dict, f, ensure_ascii=False, indent=2)
+    def marcar_dados_alterados(self):
+        """Sinaliza que self.dados mudou e precisa ser persistido"""
+        with self._lock:
+            self._dados_sujos = True
+            self.versao_dados += 1
+    
+    def _registros_para_persistir(self):
+        """Converte self.dados em lista de dicionários serializáveis (datas ISO, NaN como None)"""
+        if not self._sub_total_atualizado:
+            self.calcular_subtotal()
+        
+        # Converte datas para string para serialização JSON (colunas derivadas não são gravadas)
+        dados_json = self.dados.drop(columns=self.COLUNAS_DERIVADAS, errors='ignore')
+        for col in dados_json.columns:
+            if pd.api.types.is_datetime64_any_dtype(dados_json[col]):
+                dados_json[col] = dados_json[col].dt.strftime('%Y-%m-%d')
+            elif col in ['Data Renegociacao'] and dados_json[col].notna().any():
+                dados_json[col] = pd.to_datetime(dados_json[col], errors='coerce').dt.strftime('%Y-%m-%d')
+        
+        # Preenche valores NaN com None para JSON
+        dados_json = dados_json.where(pd.notnull(dados_json), None)
+        
+        return dados_json.to_dict('records')
+    
+    def salvar_dados_json(self, forcar=False):
+        """Salva os dados em formato JSON incluindo renegociação e prioridade
+        
+        A gravação é pulada quando os dados não foram marcados como alterados
+        ou quando o conteúdo serializado é idêntico ao último salvo (mesmo hash).
+        """
+        if self.dados is None:
+            return False
+        
+        with self._lock, self.armazenamento.bloqueio():
+            if not forcar and not self._dados_sujos:
+                return True
+            
+            # Incorpora edições que outras instâncias gravaram no diário desde a nossa carga
+            externas = self.armazenamento.edicoes_externas()
+            if externas:
+                self.aplicar_diario(self.dados, externas)
+            
+            gravado = self.armazenamento.salvar(self._registros_para_persistir())
+            self._dados_sujos = False
+            
+            # A base agora está na ordem de self.dados: as chaves do diário passam a seguir essa ordem
+            self.numerar_registros(self.dados)
+            
+            if gravado:
+                # A escrita foi feita pelo próprio app: não deve disparar nova sincronização
+                self._registrar_escrita_json()
+        return True
+    
+    def _texto_chave(self, dados, colunas):
+        """Colunas (ausentes como '') e Vencto Real unidas por '|', calculadas em bloco"""
+        chave = None
+        for coluna in colunas:
+            if coluna in dados.columns:
+                parte = dados[coluna].astype(object).where(dados[coluna].notna(), '').astype(str)
+            else:
+                parte = pd.Series('', index=dados.index)
+            chave = parte if chave is None else chave + '|' + parte
+        vencto = pd.to_datetime(dados['Vencto Real'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+        return chave + '|' + vencto
+    
+    def _ordem_registros(self, dados):
+        """Ordem de cada linha entre as de mesmo Vencto Real e Razão Social (a de _chaves_registro), na ordem de `dados`"""
+        chaves = self._chaves_registro(dados)
+        ordem = np.empty(len(dados), dtype=np.int64)
+        ordem[chaves['_pos'].to_numpy()] = chaves['_ordem'].to_numpy()
+        return pd.Series(ordem, index=dados.index)
+    
+    def numerar_registros(self, dados):
+        """Grava em Ordem_Registro a ordem de cada linha; chamada com os dados na ordem da base persistida"""
+        dados['Ordem_Registro'] = self._ordem_registros(dados)
+        return dados
+    
+    def _chaves_registros(self, dados):
+        """Chave textual (Filial|Titulo|Parcela|Fornecedor|Razão Social|Vencto Real#ordem) de cada linha, calculada em bloco
+        
+        Lançamentos manuais (sem filial, título e fornecedor) repetem as colunas da chave;
+        a ordem os desempata. Ela vem de Ordem_Registro, que acompanha a linha quando
+        os dados são reordenados, ou é calculada na ordem das linhas de `dados`.
+        """
+        if 'Ordem_Registro' in dados.columns and dados['Ordem_Registro'].notna().all():
+            ordem = dados['Ordem_Registro']
+        else:
+            ordem = self._ordem_registros(dados)
+        return self._texto_chave(dados, self.COLUNAS_CHAVE_UNICA) + '#' + ordem.astype(np.int64).astype(str)
+    
+    def _valor_para_diario(self, valor):
+        """Converte um valor do DataFrame para um tipo serializável no diário"""
+        if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+            return None
+        if hasattr(valor, 'strftime'):
+            return valor.strftime('%Y-%m-%d')
+        if hasattr(valor, 'item'):
+            return valor.item()
+        return valor
+    
+    def _valor_do_diario(self, campo, valor):
+        """Converte um valor lido do diário para o tipo da coluna"""
+        if valor is None:
+            return pd.NaT if campo == 'Data Renegociacao' else None
+        if campo == 'Data Renegociacao':
+            return pd.to_datetime(valor, errors='coerce')
+        if campo in ['Valor', 'Prioridade']:
+            return float(valor)
+        return valor
+    
+    def registrar_edicao(self, idx, campo, novo_valor, usuario=None):
+        """Altera um campo de um registro e persiste só essa edição (diário ou UPDATE no banco)"""
+        with self._lock:
+            if campo not in self.dados.columns:
+                self.dados[campo] = None
+            
+            anterior = self._valor_para_diario(self.dados.loc[idx, campo])
+            novo = self._valor_para_diario(novo_valor)
+            if anterior == novo:
+                return False
+            
+            # Sem Ordem_Registro (linha ainda não gravada) a ordem precisa de todas as linhas
+            if 'Ordem_Registro' in self.dados.columns and pd.notna(self.dados.at[idx, 'Ordem_Registro']):
+                chave = self._chaves_registros(self.dados.loc[[idx]]).iat[0]
+            else:
+                chave = self._chaves_registros(self.dados).loc[idx]
+            self.dados.loc[idx, campo] = novo_valor
+            if campo in ['Data Renegociacao', 'Prioridade'] and 'Chave_Ordenacao' in self.dados.columns:
+                # Data efetiva e chave recalculadas juntas sobre a linha já editada
+                linha = self.atualizar_colunas_derivadas(self.dados.loc[[idx]].copy())
+                self.dados.loc[idx, 'Data Efetiva'] = linha['Data Efetiva'].iat[0]
+                self.dados.loc[idx, 'Chave_Ordenacao'] = linha['Chave_Ordenacao'].iat[0]
+                self._reposicionar_pendentes.add(idx)
+            if campo == 'Valor':
+                # Atualização pontual na árvore de subtotais; a coluna Sub_Total fica para depois
+                if self._subtotais is not None and self._subtotais.dados is self.dados:
+                    self._subtotais.atualizar_valor(self.dados.index.get_loc(idx), novo)
+                self._sub_total_atualizado = False
+            aplicada_na_base = self.armazenamento.registrar_edicao(chave, campo, anterior, novo, usuario)
+            if not aplicada_na_base:
+                self.marcar_dados_alterados()
+            # A escrita foi feita pelo próprio app: não deve disparar nova sincronização
+            self._registrar_escrita_json()
             return True
-        return False
+    
+    def aplicar_diario(self, dados, entradas=None):
+        """Reaplica sobre os dados base as edições registradas no diário"""
+        if entradas is None:
+            entradas = self.armazenamento.edicoes_pendentes()
+        if not entradas or dados is None or len(dados) == 0:
+            return dados, 0
+        
+        # Posição de cada chave (o diário não altera campos da chave)
+        chaves = self._chaves_registros(dados)
+        posicoes = pd.Series(np.arange(len(dados)), index=chaves.to_numpy())
+        
+        aplicadas = 0
+        for entrada in entradas:
+            campo = entrada.get('campo')
+            if campo not in self.CAMPOS_DIARIO or entrada.get('chave') not in posicoes.index:
+                continue
+            if campo not in dados.columns:
+                dados[campo] = None
+            dados.iloc[posicoes[entrada['chave']], dados.columns.get_loc(campo)] = self._valor_do_diario(campo, entrada.get('novo'))
+            aplicadas += 1
+        return dados, aplicadas
+    
+    def compactar_diario(self):
+        """Regrava a base com as edições do diário e zera o diário"""
+        with self._lock:
+            if self.armazenamento.quantidade_pendente() == 0:
+                return False
+            return self.salvar_dados_json(forcar=True)
+    
+    def concluir_edicoes(self):
+        """Finaliza um lote de edições; compacta o diário em segundo plano se ele cresceu demais"""
+        if self.armazenamento.quantidade_pendente() >= self.LIMITE_DIARIO:
+            threading.Thread(target=self.compactar_diario, daemon=True).start()
+        return True
+    
+    def _assinatura_arquivo(self, caminho):
+        """Retorna (caminho absoluto, tamanho, mtime) de um arquivo ou None se não existir"""
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            return None
+        return (os.path.abspath(caminho), info.st_size, info.st_mtime_ns)
+    
+    def obter_assinatura_fontes(self):
+        """Assinatura atual das fontes de dados (Excel e armazenamento dos registros)"""
+        return (self._assinatura_arquivo(self.arquivo_excel), self.armazenamento.assinatura())
+    
+    def _registrar_escrita_json(self):
+        """Atualiza a versão e a assinatura do JSON após uma gravação feita pelo app"""
+        with self._lock:
+            self.versao_dados += 1
+            if self._assinatura_fontes is not None:
+                self._assinatura_fontes = (self._assinatura_fontes[0], self.armazenamento.assinatura())
+    
+    def garantir_dados_atualizados(self):
+        """Reconstrói os dados apenas quando o Excel ou o JSON mudaram desde a última sincronização"""
+        with self._lock:
+            if self.dados is not None and self.obter_assinatura_fontes() == self._assinatura_fontes:
+                return True, self.mensagem_status
+            
+            sucesso, mensagem = self.inicializar_dados()
+            if sucesso:
+                self._assinatura_fontes = self.obter_assinatura_fontes()
+                self.mensagem_status = mensagem
+            return sucesso, mensagem
     
     def listar_arquivos_uploads(self):
         """Lista arquivos Excel na pasta uploads"""
@@ -437,31 +1121,63 @@ class FluxoCaixaApp:
         """Salva arquivo enviado na pasta uploads"""
         try:
             caminho_arquivo = os.path.join(self.pasta_uploads, arquivo_uploadado.name)
-            with open(caminho_arquivo, "wb") as f:
-                f.write(arquivo_uploadado.getbuffer())
+            gravar_atomico(caminho_arquivo, arquivo_uploadado.getbuffer())
             return True, caminho_arquivo
         except Exception as e:
             return False, str(e)
     
+    def _converter_datas_persistidas(self, df):
+        """Converte de volta as colunas de data gravadas como texto ISO"""
+        if 'Vencto Real' in df.columns:
+            df['Vencto Real'] = pd.to_datetime(df['Vencto Real'])
+        if 'Data Renegociacao' in df.columns:
+            df['Data Renegociacao'] = pd.to_datetime(df['Data Renegociacao'], errors='coerce')
+        return df
+    
     def carregar_dados_json(self):
-        """Carrega os dados salvos do arquivo JSON"""
-        if os.path.exists(self.arquivo_json):
-            try:
-                with open(self.arquivo_json, 'r', encoding='utf-8') as f:
-                    dados_dict = json.load(f)
-                
-                df = pd.DataFrame(dados_dict)
-                # Converte datas de volta
-                if 'Vencto Real' in df.columns:
-                    df['Vencto Real'] = pd.to_datetime(df['Vencto Real'])
-                if 'Data Renegociacao' in df.columns:
-                    df['Data Renegociacao'] = pd.to_datetime(df['Data Renegociacao'], errors='coerce')
-                
-                return df
-            except Exception as e:
-                st.error(f"Erro ao carregar dados JSON: {e}")
+        """Carrega os dados salvos (arquivo JSON ou banco SQLite, conforme o armazenamento)"""
+        try:
+            df = self.armazenamento.carregar()
+            if df is None:
                 return None
-        return None
+            df = self._converter_datas_persistidas(df)
+            
+            # Reaplica as edições gravadas no diário desde a última compactação
+            df, _ = self.aplicar_diario(df)
+            
+            # Ordem dos registros repetidos, fixada na ordem da base (acompanha as linhas quando reordenadas)
+            return self.numerar_registros(df)
+        except Exception as e:
+            st.error(f"Erro ao carregar dados JSON: {e}")
+            return None
+    
+    def filtrar_registros(self, data_inicio=None, data_fim=None, razao_social=None, prioridade=None):
+        """Filtra os registros por período de vencimento, fornecedor e prioridade
+        
+        Com o armazenamento SQLite (e sem alterações pendentes em memória) o filtro
+        roda no banco usando os índices; caso contrário é aplicado sobre self.dados.
+        """
+        if self.armazenamento.suporta_consulta and not self._dados_sujos:
+            try:
+                return self._converter_datas_persistidas(self.armazenamento.consultar(
+                    data_inicio=data_inicio.strftime('%Y-%m-%d') if data_inicio is not None else None,
+                    data_fim=data_fim.strftime('%Y-%m-%d') if data_fim is not None else None,
+                    razao_social=razao_social,
+                    prioridade=prioridade,
+                ))
+            except Exception:
+                pass
+        
+        mascara = pd.Series(True, index=self.dados.index)
+        if data_inicio is not None:
+            mascara &= self.dados['Vencto Real'].dt.date >= data_inicio
+        if data_fim is not None:
+            mascara &= self.dados['Vencto Real'].dt.date <= data_fim
+        if razao_social is not None:
+            mascara &= self.dados['Razão Social'] == razao_social
+        if prioridade is not None:
+            mascara &= self.dados['Prioridade'] == prioridade
+        return self.dados[mascara].copy()
         
     def gerar_chave_unica(self, row):
         """Gera uma chave única para identificar um registro baseada em campos principais"""
@@ -485,75 +1201,182 @@ class FluxoCaixaApp:
         """Salva controle de parcelamentos em arquivo JSON separado"""
         arquivo_controle = "controle_parcelamentos.json"
         
-        try:
-            # Carrega dados existentes se houver
-            dados_existentes = []
-            if os.path.exists(arquivo_controle):
-                try:
-                    with open(arquivo_controle, 'r', encoding='utf-8') as f:
-                        dados_existentes = json.load(f)
-                except Exception as e:
-                    st.warning(f"⚠️ Erro ao carregar controle existente: {e}")
-                    dados_existentes = []
-            
-            # Adiciona novos parcelamentos
+        def adicionar_parcelamentos(dados_existentes):
+            if not isinstance(dados_existentes, list):
+                dados_existentes = []
             dados_existentes.extend(alteracoes_parcelamento)
-            
-            # Salva arquivo atualizado
-            with open(arquivo_controle, 'w', encoding='utf-8') as f:
-                json.dump(dados_existentes, f, ensure_ascii=False, indent=2)
-            
+            return dados_existentes
+        
+        try:
+            # Lê, acrescenta e regrava sob o mesmo bloqueio (outras sessões podem estar gravando)
+            atualizar_json(arquivo_controle, adicionar_parcelamentos, padrao=[])
             return True
             
         except Exception as e:
             st.error(f"❌ Erro ao salvar controle de parcelamentos: {e}")
             return False
         
+    def parcelar_registro(self, idx, parcelas, valor_novo_total, data_primeira_parcela,
+                          descricao, situacao, prioridade):
+        """Transforma um registro na 1ª parcela e acrescenta as demais, tudo sob o bloqueio do app
+        
+        A instância é compartilhada entre sessões: alteração, inclusão das novas linhas,
+        ordenação e gravação acontecem sem que outra sessão intercale edições.
+        Retorna (salvo, mensagens).
+        """
+        descricao = descricao or 'Parcelamento'
+        with self._lock:
+            registro_original = self.dados.loc[idx].copy()
+            info_parcelamento = {
+                'tipo_operacao': 'parcelamento',
+                'registro_original_id': self._gerar_id_registro(registro_original),
+                'valor_original': float(registro_original['Valor']),
+                'valor_novo_total': float(valor_novo_total),
+                'quantidade_parcelas': len(parcelas),
+                'data_primeira_parcela': data_primeira_parcela.strftime('%Y-%m-%d'),
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'descricao_parcelamento': descricao,
+                'situacao': situacao,
+                'prioridade': prioridade
+            }
+            
+            def dados_parcela(registro, parcela):
+                registro['Valor'] = float(parcela['valor'])
+                registro['Vencto Real'] = pd.to_datetime(parcela['data'])
+                registro['Descricao_Negociacao'] = f"PARCELA {parcela['numero']} - {descricao}"
+                registro['Historico'] = f"PARC {parcela['numero']} - {registro_original.get('Historico', '')}"
+                registro['Parcela'] = parcela['numero']
+                registro['Situacao'] = situacao
+                registro['Prioridade'] = prioridade
+                registro['ID_Parcela'] = self._gerar_id_registro(registro)
+                registro['ID_Parcelamento_Original'] = info_parcelamento['registro_original_id']
+                return registro
+            
+            # O registro original vira a 1ª parcela; as demais são registros novos
+            registros = [dados_parcela(registro_original.copy(), parcela) for parcela in parcelas]
+            for campo in ['Valor', 'Vencto Real', 'Descricao_Negociacao', 'Historico', 'Parcela',
+                          'Situacao', 'Prioridade', 'ID_Parcela', 'ID_Parcelamento_Original']:
+                self.dados.loc[idx, campo] = registros[0][campo]
+            novos_registros = registros[1:]
+            
+            info_parcelamento['parcelas'] = [{
+                'numero_parcela': parcela['numero'],
+                'valor_parcela': float(parcela['valor']),
+                'data_vencimento': parcela['data'].strftime('%Y-%m-%d'),
+                'id_parcela': registro['ID_Parcela'],
+                'status_parcela': 'criada_original' if posicao == 0 else 'criada_nova',
+                'fornecedor': str(registro.get('Razão Social', '')),
+                'filial': str(registro.get('Filial', '')),
+                'titulo_original': str(registro.get('No. Titulo', ''))
+            } for posicao, (parcela, registro) in enumerate(zip(parcelas, registros))]
+            
+            if novos_registros:
+                # Rótulos novos, depois dos existentes (os atuais identificam os registros)
+                inicio_novos = int(self.dados.index.max()) + 1 if len(self.dados) else 0
+                df_novos = pd.DataFrame(novos_registros, index=range(inicio_novos, inicio_novos + len(novos_registros)))
+                self.dados = pd.concat([self.dados, df_novos])
+            
+            mensagens = []
+            if self._salvar_controle_parcelamento([info_parcelamento]):
+                if novos_registros:
+                    mensagens.append("✅ Registro original transformado na 1ª parcela")
+                    mensagens.append(f"✅ Criados {len(novos_registros)} novos registros para parcelas adicionais")
+                else:
+                    mensagens.append("✅ Registro original atualizado (parcela única)")
+                mensagens.append("📋 Registro de controle salvo para consulta futura")
+            elif novos_registros:
+                st.error("❌ Erro ao salvar controle de parcelamento!")
+            
+            self.ordenar_por_prioridade_e_renegociacao()
+            self.marcar_dados_alterados()
+            return self.salvar_dados_json(), mensagens
+    
     def gerar_chave_vencto_razao(self, row):
         """Gera chave baseada em Vencto Real e Razão Social"""
         vencto = str(row.get('Vencto Real', ''))
         razao = str(row.get('Razão Social', ''))
         return f"{vencto}|{razao}"
         
+    def _chaves_registro(self, dados):
+        """Monta a chave composta (Vencto Real, Razão Social, ordem) de cada linha
+        
+        Registros com o mesmo Vencto Real e Razão Social são desempatados pela
+        ordem de No. Titulo/Parcela, em vez de sobrescreverem uns aos outros.
+        """
+        chaves = pd.DataFrame({
+            '_vencto': pd.to_datetime(dados['Vencto Real'], errors='coerce').dt.normalize(),
+            '_razao': dados['Razão Social'].astype('string').str.strip(),
+            '_pos': np.arange(len(dados))
+        })
+        
+        colunas_desempate = []
+        for i, coluna in enumerate(self.DESEMPATE_REGISTRO):
+            if coluna in dados.columns:
+                chaves[f'_desempate{i}'] = dados[coluna].to_numpy()
+                colunas_desempate.append(f'_desempate{i}')
+        
+        chaves = chaves.sort_values(['_vencto', '_razao'] + colunas_desempate + ['_pos'],
+                                    kind='stable', na_position='last')
+        chaves['_ordem'] = chaves.groupby(['_vencto', '_razao'], dropna=False, sort=False).cumcount()
+        return chaves[['_vencto', '_razao', '_ordem', '_pos']]
+    
+    def _alinhar_registros(self, dados_excel, dados_json):
+        """Associa as linhas do Excel às do JSON pela chave composta (junção colunar)
+        
+        Retorna um DataFrame com as posições correspondentes em cada lado
+        (_pos_excel, _pos_json).
+        """
+        return self._chaves_registro(dados_excel).merge(
+            self._chaves_registro(dados_json),
+            on=['_vencto', '_razao', '_ordem'],
+            how='inner',
+            suffixes=('_excel', '_json')
+        )
+    
     def atualizar_campos_renegociacao_prioridade(self, dados_excel, dados_json):
         """Atualiza apenas os campos Data Renegociacao e Prioridade dos registros existentes no JSON"""
         if dados_json is None or len(dados_json) == 0:
             st.warning("⚠️ JSON não existe. Carregando dados do Excel pela primeira vez.")
             return dados_excel
-            
-        # Cria dicionário com registros do Excel usando chave Vencto Real + Razão Social
-        registros_excel = {}
-        for _, row in dados_excel.iterrows():
-            chave = self.gerar_chave_vencto_razao(row)
-            registros_excel[chave] = row
         
-        # Atualiza registros no JSON com dados do Excel (apenas Data Renegociacao e Prioridade)
-        dados_atualizados = dados_json.copy()
-        registros_atualizados = 0
-        registros_encontrados = 0
+        # Associa os registros do Excel aos do JSON pela chave Vencto Real + Razão Social
+        pares = self._alinhar_registros(dados_excel, dados_json)
+        pos_excel = pares['_pos_excel'].to_numpy()
+        pos_json = pares['_pos_json'].to_numpy()
+        registros_encontrados = len(pares)
         
-        for idx, row_json in dados_atualizados.iterrows():
-            chave = self.gerar_chave_vencto_razao(row_json)
-            
-            if chave in registros_excel:
-                registros_encontrados += 1
-                row_excel = registros_excel[chave]
-                
-                # Verifica e atualiza Data Renegociacao
-                data_renegoc_excel = row_excel.get('Data Renegociacao')
-                if pd.notna(data_renegoc_excel) and str(data_renegoc_excel) != str(row_json.get('Data Renegociacao')):
-                    dados_atualizados.at[idx, 'Data Renegociacao'] = data_renegoc_excel
-                    registros_atualizados += 1
-                
-                # Verifica e atualiza Prioridade
-                prioridade_excel = row_excel.get('Prioridade')
-                if pd.notna(prioridade_excel) and str(prioridade_excel) != str(row_json.get('Prioridade')):
-                    dados_atualizados.at[idx, 'Prioridade'] = prioridade_excel
-                    if registros_atualizados == 0:  # Só conta se não foi contado pela data
-                        registros_atualizados += 1
+        dados_atualizados = dados_json.copy()
+        for coluna in ['Data Renegociacao', 'Prioridade']:
+            if coluna not in dados_atualizados.columns:
+                dados_atualizados[coluna] = pd.NaT if coluna == 'Data Renegociacao' else None
+        
+        # Data Renegociacao: atualiza quando o Excel tem data e ela difere da do JSON
+        data_excel = pd.to_datetime(dados_excel['Data Renegociacao'], errors='coerce').iloc[pos_excel].reset_index(drop=True)
+        data_json = pd.to_datetime(dados_atualizados['Data Renegociacao'], errors='coerce').iloc[pos_json].reset_index(drop=True)
+        mascara_data = (data_excel.notna() & (data_json.isna() | (data_excel != data_json))).to_numpy()
+        
+        # Prioridade: mesma regra, comparando numericamente
+        prioridade_excel = pd.to_numeric(dados_excel['Prioridade'], errors='coerce').iloc[pos_excel].reset_index(drop=True)
+        prioridade_json = pd.to_numeric(dados_atualizados['Prioridade'], errors='coerce').iloc[pos_json].reset_index(drop=True)
+        mascara_prioridade = (prioridade_excel.notna() & (prioridade_json.isna() | (prioridade_excel != prioridade_json))).to_numpy()
+        
+        # Aplica as atualizações como atribuições colunares mascaradas
+        if mascara_data.any():
+            coluna = dados_atualizados.columns.get_loc('Data Renegociacao')
+            dados_atualizados['Data Renegociacao'] = pd.to_datetime(dados_atualizados['Data Renegociacao'], errors='coerce')
+            dados_atualizados.iloc[pos_json[mascara_data], coluna] = data_excel[mascara_data].to_numpy()
+        if mascara_prioridade.any():
+            coluna = dados_atualizados.columns.get_loc('Prioridade')
+            dados_atualizados['Prioridade'] = pd.to_numeric(dados_atualizados['Prioridade'], errors='coerce')
+            dados_atualizados.iloc[pos_json[mascara_prioridade], coluna] = prioridade_excel[mascara_prioridade].to_numpy()
+        
+        registros_atualizados = int((mascara_data | mascara_prioridade).sum())
         
         if registros_atualizados > 0:
-            st.success(f"� Atualizados {registros_atualizados} registros com novos dados de renegociação/prioridade")
+            st.success(
+                f"🔄 Atualizados {registros_atualizados} registros com novos dados de renegociação/prioridade "
+                f"({int(mascara_data.sum())} datas, {int(mascara_prioridade.sum())} prioridades)"
+            )
         else:
             st.info(f"✅ Todos os {registros_encontrados} registros já estão atualizados")
             
@@ -561,79 +1384,75 @@ class FluxoCaixaApp:
         
     def comparar_alteracoes_renegociacao(self, dados_excel, dados_json):
         """Compara dados focando em alterações de renegociação e prioridade"""
-        alteracoes_encontradas = []
-        
         if dados_json is None or len(dados_json) == 0:
             st.warning("⚠️ Arquivo JSON não existe ou está vazio. Não há dados para comparar.")
             return []
         
-        # Cria dicionário com registros do JSON usando chave Vencto Real + Razão Social
-        registros_json = {}
-        for _, row in dados_json.iterrows():
-            chave = self.gerar_chave_vencto_razao(row)
-            registros_json[chave] = row
+        # Alinha Excel e JSON pela chave do registro (junção colunar)
+        pares = self._alinhar_registros(dados_excel, dados_json)
+        pos_excel = pares['_pos_excel'].to_numpy()
+        pos_json = pares['_pos_json'].to_numpy()
+        registros_comparados = len(pares)
+        
+        def coluna_alinhada(dados, coluna, posicoes, conversor):
+            if coluna not in dados.columns:
+                return pd.Series([np.nan] * len(posicoes), dtype='float64')
+            return conversor(dados[coluna], errors='coerce').iloc[posicoes].reset_index(drop=True)
+        
+        # Igualdade sensível ao tipo: dois valores ausentes (NaT/None/NaN) são iguais
+        campos = {
+            'Data Renegociacao': pd.to_datetime,
+            'Prioridade': pd.to_numeric
+        }
+        valores = {}
+        mascaras = {}
+        for campo, conversor in campos.items():
+            novo = coluna_alinhada(dados_excel, campo, pos_excel, conversor)
+            anterior = coluna_alinhada(dados_json, campo, pos_json, conversor)
+            mascaras[campo] = (novo.isna() != anterior.isna()) | (novo.notna() & anterior.notna() & (novo != anterior))
+            valores[campo] = (anterior, novo)
+        
+        mascara_alteracao = (mascaras['Data Renegociacao'] | mascaras['Prioridade']).to_numpy()
+        if not mascara_alteracao.any():
+            st.info(f"📊 Comparados {registros_comparados} registros usando Vencto Real + Razão Social")
+            st.info("✅ Nenhuma alteração detectada nos campos de renegociação/prioridade")
+            return []
         
-        # Compara com registros do Excel
-        registros_comparados = 0
-        for _, row_excel in dados_excel.iterrows():
-            chave = self.gerar_chave_vencto_razao(row_excel)
-            
-            if chave in registros_json:
-                registros_comparados += 1
-                row_json = registros_json[chave]
-                
-                # Verifica se houve alteração em Data Renegociacao ou Prioridade
-                alteracao_detectada = False
-                alteracao_info = {
-                    'Vencto Real': row_excel.get('Vencto Real'),
-                    'Razão Social': row_excel.get('Razão Social'),
-                    'alteracoes': []
+        # Monta os registros de alteração em bloco, apenas para as linhas alteradas
+        linhas_excel = dados_excel.iloc[pos_excel[mascara_alteracao]].reset_index(drop=True)
+        resultado = pd.DataFrame({
+            'Vencto Real': linhas_excel['Vencto Real'],
+            'Razão Social': linhas_excel['Razão Social']
+        })
+        textos = {}
+        for campo, (anterior, novo) in valores.items():
+            anterior = anterior[mascara_alteracao].reset_index(drop=True)
+            novo = novo[mascara_alteracao].reset_index(drop=True)
+            resultado[campo] = novo.where(mascaras[campo][mascara_alteracao].to_numpy(), anterior)
+            if campo == 'Data Renegociacao':
+                textos[campo] = (anterior.dt.strftime('%Y-%m-%d').fillna('None'),
+                                 novo.dt.strftime('%Y-%m-%d').fillna('None'))
+            else:
+                textos[campo] = (anterior.round().astype('Int64').astype('string').fillna('None'),
+                                 novo.round().astype('Int64').astype('string').fillna('None'))
+        for campo in ['Filial', 'No. Titulo', 'Parcela', 'Fornecedor', 'Valor']:
+            if campo in linhas_excel.columns:
+                resultado[campo] = linhas_excel[campo]
+        
+        alteracoes_encontradas = resultado.astype(object).where(resultado.notna(), None).to_dict('records')
+        mascaras_alteradas = {campo: mascara[mascara_alteracao].to_numpy() for campo, mascara in mascaras.items()}
+        for i, alteracao_info in enumerate(alteracoes_encontradas):
+            alteracao_info['alteracoes'] = [
+                {
+                    'campo': campo,
+                    'valor_anterior': textos[campo][0].iat[i],
+                    'valor_novo': textos[campo][1].iat[i]
                 }
-                
-                # Compara Data Renegociacao
-                data_renegoc_excel = row_excel.get('Data Renegociacao')
-                data_renegoc_json = row_json.get('Data Renegociacao')
-                
-                if str(data_renegoc_excel) != str(data_renegoc_json):
-                    alteracao_detectada = True
-                    alteracao_info['alteracoes'].append({
-                        'campo': 'Data Renegociacao',
-                        'valor_anterior': str(data_renegoc_json),
-                        'valor_novo': str(data_renegoc_excel)
-                    })
-                    alteracao_info['Data Renegociacao'] = data_renegoc_excel
-                else:
-                    alteracao_info['Data Renegociacao'] = data_renegoc_json
-                
-                # Compara Prioridade
-                prioridade_excel = row_excel.get('Prioridade')
-                prioridade_json = row_json.get('Prioridade')
-                
-                if str(prioridade_excel) != str(prioridade_json):
-                    alteracao_detectada = True
-                    alteracao_info['alteracoes'].append({
-                        'campo': 'Prioridade',
-                        'valor_anterior': str(prioridade_json),
-                        'valor_novo': str(prioridade_excel)
-                    })
-                    alteracao_info['Prioridade'] = prioridade_excel
-                else:
-                    alteracao_info['Prioridade'] = prioridade_json
-                
-                # Adiciona outros campos importantes
-                for campo in ['Filial', 'No. Titulo', 'Parcela', 'Fornecedor', 'Valor']:
-                    if campo in row_excel:
-                        alteracao_info[campo] = row_excel[campo]
-                
-                if alteracao_detectada:
-                    alteracoes_encontradas.append(alteracao_info)
+                for campo in campos if mascaras_alteradas[campo][i]
+            ]
         
         st.info(f"📊 Comparados {registros_comparados} registros usando Vencto Real + Razão Social")
-        
-        if alteracoes_encontradas:
-            st.success(f"🔍 Encontradas {len(alteracoes_encontradas)} alterações em Data Renegociacao/Prioridade")
-        else:
-            st.info("✅ Nenhuma alteração detectada nos campos de renegociação/prioridade")
+        st.success(f"🔍 Encontradas {len(alteracoes_encontradas)} alterações em Data Renegociacao/Prioridade")
             
         return alteracoes_encontradas
         
@@ -660,8 +1479,7 @@ class FluxoCaixaApp:
             dados_para_salvar.append(item)
         
         try:
-            with open(arquivo_alteracoes, 'w', encoding='utf-8') as f:
-                json.dump(dados_para_salvar, f, ensure_ascii=False, indent=2)
+            salvar_json(arquivo_alteracoes, dados_para_salvar)
             
             st.success(f"💾 Alterações salvas em: {arquivo_alteracoes}")
             return True
@@ -669,42 +1487,181 @@ class FluxoCaixaApp:
             st.error(f"❌ Erro ao salvar alterações: {e}")
             return False
         
-    @st.cache_data
-    def carregar_dados_excel(_self, arquivo_especifico=None):
-        """Carrega os dados do arquivo Excel (padrão ou específico)"""
+    def resolver_caminho_excel(self, arquivo_especifico=None):
+        """Resolve o caminho do Excel a usar (padrão, caminho informado ou arquivo da pasta uploads)"""
+        arquivo_para_usar = arquivo_especifico or self.arquivo_excel
+        
+        # Se arquivo está na pasta uploads, usa caminho completo
+        if arquivo_especifico and not os.path.exists(arquivo_especifico):
+            caminho_uploads = os.path.join(self.pasta_uploads, arquivo_especifico)
+            if os.path.exists(caminho_uploads):
+                arquivo_para_usar = caminho_uploads
+        
+        return arquivo_para_usar
+    
+    def _converter_coluna_data(self, serie):
+        """Converte uma coluna para datetime usando formatos explícitos (ISO e dd/mm/aaaa)"""
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            return serie
+        
+        texto = serie.astype('string').str.strip()
+        datas = pd.to_datetime(texto, format='ISO8601', errors='coerce')
+        for formato in self.FORMATOS_DATA:
+            faltando = datas.isna() & texto.notna()
+            if not faltando.any():
+                break
+            datas[faltando] = pd.to_datetime(texto[faltando], format=formato, errors='coerce')
+        return datas
+    
+    def _ler_aba_analitico(self, arquivo_para_usar):
+        """Lê a aba "Analítico" em uma única passada, projetando apenas as colunas usadas"""
+        if not arquivo_para_usar.lower().endswith(('.xlsx', '.xlsm')):
+            # Formato .xls (xlrd): abre o arquivo uma única vez e lê só as colunas usadas
+            with pd.ExcelFile(arquivo_para_usar) as xl:
+                aba = 'Analítico' if 'Analítico' in xl.sheet_names else xl.sheet_names[0]
+                dados = xl.parse(aba, header=0, usecols=lambda c: str(c).strip() in self.COLUNAS_PLANILHA)
+                dados.columns = [str(c).strip() for c in dados.columns]
+                return dados, xl.sheet_names
+        
+        wb = openpyxl.load_workbook(arquivo_para_usar, read_only=True, data_only=True)
         try:
-            arquivo_para_usar = arquivo_especifico or _self.arquivo_excel
-            
-            # Se arquivo está na pasta uploads, usa caminho completo
-            if arquivo_especifico and not os.path.exists(arquivo_especifico):
-                caminho_uploads = os.path.join(_self.pasta_uploads, arquivo_especifico)
-                if os.path.exists(caminho_uploads):
-                    arquivo_para_usar = caminho_uploads
-            
-            xl = pd.ExcelFile(arquivo_para_usar)
-            
-            if 'Analítico' in xl.sheet_names:
-                dados = pd.read_excel(arquivo_para_usar, sheet_name='Analítico', header=0)
-            else:
-                dados = pd.read_excel(arquivo_para_usar, header=0)
-            
-            # Converte a coluna de data
-            if 'Vencto Real' in dados.columns:
-                dados['Vencto Real'] = pd.to_datetime(dados['Vencto Real'], errors='coerce')
-            
-            # Adiciona colunas de renegociação e prioridade se não existirem
-            if 'Data Renegociacao' not in dados.columns:
-                dados['Data Renegociacao'] = pd.NaT
-            if 'Prioridade' not in dados.columns:
-                dados['Prioridade'] = None
-            if 'Sub_Total' not in dados.columns:
-                dados['Sub_Total'] = 0.0
-            if 'Situacao' not in dados.columns:
-                dados['Situacao'] = None
-            if 'Descricao_Negociacao' not in dados.columns:
-                dados['Descricao_Negociacao'] = None
-                
-            return dados, xl.sheet_names
+            abas = wb.sheetnames
+            ws = wb['Analítico'] if 'Analítico' in abas else wb[abas[0]]
+            linhas = ws.iter_rows(values_only=True)
+            
+            # Mapeia cabeçalho -> posição apenas para as colunas de interesse
+            cabecalho = next(linhas, ()) or ()
+            posicoes = {}
+            for i, nome in enumerate(cabecalho):
+                nome = str(nome).strip() if nome is not None else ''
+                if nome in self.COLUNAS_PLANILHA and nome not in posicoes:
+                    posicoes[nome] = i
+            if not posicoes:
+                return pd.DataFrame(columns=self.COLUNAS_PLANILHA[:11]), abas
+            
+            nomes = list(posicoes)
+            largura = max(posicoes.values()) + 1
+            projetar = itemgetter(*posicoes.values())
+            
+            # Completa linhas curtas para que a projeção nunca estoure o índice
+            linhas_projetadas = [
+                projetar(linha if len(linha) >= largura else linha + (None,) * (largura - len(linha)))
+                for linha in linhas
+            ]
+            if len(nomes) == 1:
+                linhas_projetadas = [(valor,) for valor in linhas_projetadas]
+        finally:
+            wb.close()
+        
+        dados = pd.DataFrame.from_records(linhas_projetadas, columns=nomes)
+        dados = dados.dropna(how='all').reset_index(drop=True)
+        
+        # Códigos gravados como texto ('01', '008') viram números, como no pd.read_excel
+        for coluna in dados.columns:
+            if coluna in self.COLUNAS_DATA or pd.api.types.is_numeric_dtype(dados[coluna]):
+                continue
+            try:
+                dados[coluna] = pd.to_numeric(dados[coluna])
+            except (ValueError, TypeError):
+                pass
+        
+        return dados, abas
+    
+    def _ler_planilha_excel(self, arquivo_para_usar):
+        """Lê e prepara a planilha de fluxo de caixa (sem cache)"""
+        dados, abas = self._ler_aba_analitico(arquivo_para_usar)
+        
+        # Converte as colunas de data com formatos explícitos
+        for coluna in self.COLUNAS_DATA:
+            if coluna in dados.columns:
+                dados[coluna] = self._converter_coluna_data(dados[coluna])
+        
+        # Adiciona colunas de renegociação e prioridade se não existirem
+        if 'Data Renegociacao' not in dados.columns:
+            dados['Data Renegociacao'] = pd.NaT
+        if 'Prioridade' not in dados.columns:
+            dados['Prioridade'] = None
+        if 'Sub_Total' not in dados.columns:
+            dados['Sub_Total'] = 0.0
+        if 'Situacao' not in dados.columns:
+            dados['Situacao'] = None
+        if 'Descricao_Negociacao' not in dados.columns:
+            dados['Descricao_Negociacao'] = None
+            
+        return dados, abas
+    
+    def caminho_snapshot(self, arquivo_excel, hash_conteudo):
+        """Caminho do snapshot colunar (.feather) gravado ao lado do Excel"""
+        return f"{arquivo_excel}.{hash_conteudo[:16]}.feather"
+    
+    def _ler_snapshot(self, arquivo_excel, hash_conteudo):
+        """Lê o snapshot colunar do Excel, se existir e for da versão atual"""
+        caminho = self.caminho_snapshot(arquivo_excel, hash_conteudo)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            tabela = feather.read_table(caminho)
+            metadados = tabela.schema.metadata or {}
+            if metadados.get(b'rota_verde_versao') != str(self.VERSAO_SNAPSHOT).encode():
+                return None
+            abas = json.loads(metadados.get(b'rota_verde_abas', b'[]').decode('utf-8'))
+            return tabela.to_pandas(), abas
+        except Exception:
+            # Snapshot corrompido ou incompatível: volta para a leitura do Excel
+            return None
+    
+    def _gravar_snapshot(self, arquivo_excel, hash_conteudo, dados, abas):
+        """Grava o snapshot colunar e remove snapshots de versões anteriores do mesmo arquivo"""
+        caminho = self.caminho_snapshot(arquivo_excel, hash_conteudo)
+        try:
+            tabela = pa.Table.from_pandas(dados, preserve_index=False)
+            metadados = dict(tabela.schema.metadata or {})
+            metadados[b'rota_verde_versao'] = str(self.VERSAO_SNAPSHOT).encode()
+            metadados[b'rota_verde_abas'] = json.dumps(abas, ensure_ascii=False).encode('utf-8')
+            tabela = tabela.replace_schema_metadata(metadados)
+            
+            # Serializa em memória e grava como os demais arquivos (temporário único + fsync + rename):
+            # dois processos gravando o snapshot do mesmo arquivo não disputam o mesmo temporário
+            buffer = pa.BufferOutputStream()
+            feather.write_feather(tabela, buffer, compression='uncompressed')
+            gravar_atomico(caminho, buffer.getvalue())
+        except Exception:
+            # O snapshot é apenas uma otimização: falhas não impedem o carregamento
+            return False
+        
+        for antigo in glob.glob(f"{glob.escape(arquivo_excel)}.*.feather"):
+            if os.path.abspath(antigo) != os.path.abspath(caminho):
+                try:
+                    os.remove(antigo)
+                except OSError:
+                    pass
+        return True
+    
+    def carregar_dados_excel(self, arquivo_especifico=None):
+        """Carrega os dados do arquivo Excel (padrão ou específico)
+        
+        O resultado fica em cache chaveado por caminho, tamanho, mtime e hash do
+        conteúdo: editar ou trocar o arquivo invalida a entrada automaticamente.
+        Na primeira leitura de cada versão do arquivo é gravado um snapshot
+        .feather ao lado dele, usado nas cargas seguintes (inclusive após reinício).
+        """
+        try:
+            arquivo_para_usar = self.resolver_caminho_excel(arquivo_especifico)
+            chave = self.cache_planilhas.impressao_digital(arquivo_para_usar)
+            
+            em_cache = self.cache_planilhas.obter(chave)
+            if em_cache is None:
+                # Após reinício, lê o snapshot colunar em vez de reprocessar o xlsx
+                hash_conteudo = chave[3]
+                em_cache = self._ler_snapshot(arquivo_para_usar, hash_conteudo)
+                if em_cache is None:
+                    em_cache = self._ler_planilha_excel(arquivo_para_usar)
+                    self._gravar_snapshot(arquivo_para_usar, hash_conteudo, *em_cache)
+                self.cache_planilhas.guardar(chave, em_cache)
+            
+            # Devolve uma cópia para que alterações do chamador não contaminem o cache
+            dados, abas = em_cache
+            return dados.copy(), abas
             
         except Exception as e:
             return None, str(e)
@@ -725,6 +1682,9 @@ class FluxoCaixaApp:
             
             # Atualiza apenas campos de renegociação e prioridade (sem adicionar novos registros)
             self.dados = self.atualizar_campos_renegociacao_prioridade(dados_excel, dados_json)
+            if 'Ordem_Registro' not in self.dados.columns:
+                # Primeira carga (só Excel): a gravação logo abaixo fixa a ordem definitiva
+                self.numerar_registros(self.dados)
             self.dados_originais = self.dados.copy()
             
             # Remove linhas com datas inválidas
@@ -733,7 +1693,8 @@ class FluxoCaixaApp:
             # Ordena por prioridade e data de renegociação
             self.ordenar_por_prioridade_e_renegociacao()
             
-            # Salva automaticamente em JSON (apenas se houver novos dados)
+            # Salva automaticamente em JSON (pulado se o conteúdo não mudou)
+            self.marcar_dados_alterados()
             self.salvar_dados_json()
             
             return True, f"Dados sincronizados. Total: {len(self.dados)} registros"
@@ -749,6 +1710,15 @@ class FluxoCaixaApp:
             
         # Calcula o subtotal acumulativo
         self.dados['Sub_Total'] = self.dados['Valor'].cumsum()
+        self._sub_total_atualizado = True
+    
+    def obter_subtotais(self):
+        """Índice de subtotais (Fenwick) da ordenação atual, reconstruído só quando a ordem muda"""
+        with self._lock:
+            self.garantir_ordenacao()
+            if self._subtotais is None or self._subtotais.dados is not self.dados:
+                self._subtotais = SubtotaisFluxo(self.dados)
+            return self._subtotais
     
     def obter_data_efetiva(self, row):
         """Retorna a data efetiva (renegociação se preenchida, senão vencimento real)"""
@@ -756,11 +1726,40 @@ class FluxoCaixaApp:
             return row['Data Renegociacao']
         return row['Vencto Real']
     
+    def _data_efetiva(self, dados):
+        """Data efetiva de todas as linhas de uma vez (renegociação, senão vencimento real)"""
+        data_renegociacao = pd.to_datetime(dados['Data Renegociacao'], errors='coerce')
+        return data_renegociacao.fillna(pd.to_datetime(dados['Vencto Real'], errors='coerce'))
+    
+    def _dias_chave(self, datas):
+        """Converte datas em dias desde EPOCA_CHAVE, limitados ao campo da chave (ausente = máximo)"""
+        valores = pd.to_datetime(datas, errors='coerce').to_numpy(dtype='datetime64[ns]')
+        ausentes = np.isnat(valores)
+        dias = (valores.astype('datetime64[D]') - self.EPOCA_CHAVE).astype(np.int64)
+        dias = np.clip(dias, 0, self.SEM_VALOR_CHAVE - 1)
+        dias[ausentes] = self.SEM_VALOR_CHAVE
+        return dias
+    
+    def calcular_chave_ordenacao(self, dados):
+        """Chave int64 que reproduz a ordem (Prioridade, Data Renegociacao, Data Efetiva), ausentes por último"""
+        prioridade = pd.to_numeric(dados['Prioridade'], errors='coerce').fillna(self.PRIORIDADE_AUSENTE).to_numpy()
+        prioridade = np.clip(prioridade, 0, self.SEM_VALOR_CHAVE).astype(np.int64)
+        data_efetiva = dados['Data Efetiva'] if 'Data Efetiva' in dados.columns else self._data_efetiva(dados)
+        return (
+            (prioridade << (2 * self.BITS_CHAVE))
+            | (self._dias_chave(dados['Data Renegociacao']) << self.BITS_CHAVE)
+            | self._dias_chave(data_efetiva)
+        )
+    
+    def atualizar_colunas_derivadas(self, dados):
+        """Recalcula (vetorizado) a data efetiva e a chave de ordenação de um DataFrame"""
+        dados['Data Efetiva'] = self._data_efetiva(dados)
+        dados['Chave_Ordenacao'] = self.calcular_chave_ordenacao(dados)
+        return dados
+    
     def formatar_valor_brasileiro(self, valor):
         """Formata valor com 2 casas decimais sem símbolo monetário"""
-        if pd.isna(valor):
-            return "0,00"
-        return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        return formatar_moeda(valor, simbolo=False)
     
     def obter_cor_prioridade(self, prioridade):
         """Retorna a cor baseada na prioridade"""
@@ -778,282 +1777,313 @@ class FluxoCaixaApp:
         if self.dados is None:
             return
             
-        # Cria coluna temporária com data efetiva
-        self.dados['Data Efetiva'] = self.dados.apply(self.obter_data_efetiva, axis=1)
-        
-        # Cria coluna auxiliar para prioridade (None vira 999 para ficar por último)
-        self.dados['Prioridade_Sort'] = self.dados['Prioridade'].fillna(999)
+        # Data efetiva e chave composta, calculadas em bloco e mantidas no DataFrame
+        self.atualizar_colunas_derivadas(self.dados)
         
         # Ordena por: 1º Prioridade, 2º Data de Renegociação (se existe), 3º Data Efetiva
-        self.dados = self.dados.sort_values([
-            'Prioridade_Sort', 
-            'Data Renegociacao', 
-            'Data Efetiva'
-        ], na_position='last').reset_index(drop=True)
-        
-        # Remove colunas temporárias
-        self.dados = self.dados.drop(['Data Efetiva', 'Prioridade_Sort'], axis=1)
+        # Os rótulos do índice acompanham as linhas: identificam o registro entre reordenações
+        ordem = np.argsort(self.dados['Chave_Ordenacao'].to_numpy(), kind='stable')
+        self.dados = self.dados.take(ordem)
+        self._dados_ordenados = self.dados
+        self._reposicionar_pendentes.clear()
         
         # Recalcula o subtotal após ordenação
         self.calcular_subtotal()
     
-    def ordenar_por_data_efetiva(self):
-        """Mantém compatibilidade - chama a nova função de ordenação"""
-        self.ordenar_por_prioridade_e_renegociacao()
-    
-    def gerar_html_fluxo_caixa(self, dados_para_exibir=None):
-        """Gera HTML para visualização do fluxo de caixa no Streamlit"""
-        if self.dados is None:
-            return "<p>Nenhum dado disponível</p>"
-        
-        # Usa dados específicos ou todos os dados
-        dados_html = dados_para_exibir.copy() if dados_para_exibir is not None else self.dados.copy()
+    def ordenacao_valida(self):
+        """Indica se self.dados ainda é o DataFrame ordenado por ordenar_por_prioridade_e_renegociacao
         
-        # Adiciona data efetiva se não existir
-        if 'Data Efetiva' not in dados_html.columns:
-            dados_html['Data Efetiva'] = dados_html.apply(self.obter_data_efetiva, axis=1)
-        
-        # Cria coluna auxiliar para prioridade (None vira 999 para ficar por último)
-        dados_html['Prioridade_Sort'] = dados_html['Prioridade'].fillna(999)
-        
-        # Ordena por: 1º Prioridade, 2º Data de Renegociação, 3º Data Efetiva
-        dados_html = dados_html.sort_values([
-            'Prioridade_Sort',
-            'Data Renegociacao', 
-            'Data Efetiva'
-        ], na_position='last').reset_index(drop=True)
-        
-        # Remove coluna auxiliar
-        dados_html = dados_html.drop('Prioridade_Sort', axis=1)
-        
-        # Recalcula subtotal
-        dados_html['Sub_Total'] = dados_html['Valor'].cumsum()
+        Edições feitas por registrar_edicao mantêm a ordem (as linhas com chave
+        alterada ficam em _reposicionar_pendentes); trocar self.dados a invalida.
+        """
+        return self.dados is not None and self.dados is self._dados_ordenados
+    
+    def garantir_ordenacao(self):
+        """Ordena os dados apenas se ainda não estiverem na ordem da chave"""
+        if self.dados is not None and (not self.ordenacao_valida() or self._reposicionar_pendentes):
+            self.ordenar_por_prioridade_e_renegociacao()
+    
+    def _mover_linha(self, origem, destino):
+        """Move a linha da posição `origem` para `destino`, deslocando só as linhas entre elas"""
+        inicio, fim = min(origem, destino), max(origem, destino)
+        tamanho = fim - inicio + 1
+        if origem < destino:
+            ordem_local = np.r_[1:tamanho, 0]
+        else:
+            ordem_local = np.r_[tamanho - 1, 0:tamanho - 1]
         
-        # CSS embutido para o HTML
-        css_style = """
-        <style>
-        .fluxo-container {
-            font-family: Arial, sans-serif;
-            max-width: 100%;
-            margin: 0;
-        }
-        .prioridade-section {
-            margin-bottom: 20px;
-            border-radius: 8px;
-            overflow: hidden;
-            border: 1px solid #ddd;
-        }
-        .prioridade-header {
-            padding: 10px 15px;
-            font-weight: bold;
-            font-size: 16px;
-            color: white;
-            margin: 0;
-        }
-        .prioridade-1 { background-color: #FF0000; }
-        .prioridade-2 { background-color: #FF8000; }
-        .prioridade-3 { background-color: #FFFF00; color: #000; }
-        .prioridade-4 { background-color: #80FF00; color: #000; }
-        .prioridade-5 { background-color: #ADD8E6; color: #000; }
-        .sem-prioridade { background-color: #6c757d; }
+        # Permutação que só gira o trecho entre as duas posições; um único take
+        # (cópia em bloco, sem comparações) sai mais barato que escrever célula a célula.
+        # O índice não é renumerado: o rótulo de cada registro (usado nas seleções
+        # das outras sessões) continua apontando para ele.
+        posicoes = np.arange(len(self.dados))
+        posicoes[inicio:fim + 1] = posicoes[inicio:fim + 1][ordem_local]
+        self.dados = self.dados.take(posicoes)
+        self._dados_ordenados = self.dados
         
-        .fluxo-table {
-            width: 100%;
-            border-collapse: collapse;
-            margin: 0;
-            font-size: 12px;
-        }
-        .fluxo-table th, .fluxo-table td {
-            padding: 8px;
-            text-align: left;
-            border-bottom: 1px solid #ddd;
-        }
-        .fluxo-table th {
-            background-color: #f8f9fa;
-            font-weight: bold;
-            font-size: 11px;
-        }
-        .fluxo-table tr:nth-child(even) {
-            background-color: #f9f9f9;
-        }
-        .fluxo-table tr:hover {
-            background-color: #f0f0f0;
-        }
-        .valor-col {
-            text-align: right;
-            font-family: 'Courier New', monospace;
-            font-size: 11px;
-        }
-        .data-col {
-            font-family: 'Courier New', monospace;
-            font-size: 11px;
-        }
-        .renegociada-row {
-            background-color: #fff3cd !important;
-        }
-        .total-row {
-            background-color: #e9ecef !important;
-            font-weight: bold;
-        }
-        .empresa-col {
-            max-width: 200px;
-            overflow: hidden;
-            text-overflow: ellipsis;
-            white-space: nowrap;
-        }
-        .historico-col {
-            max-width: 150px;
-            overflow: hidden;
-            text-overflow: ellipsis;
-            white-space: nowrap;
-            font-size: 10px;
-        }
-        .situacao-col {
-            text-align: center;
-            font-weight: bold;
-            font-size: 11px;
-        }
-        .situacao-pg {
-            background-color: #d4edda;
-            color: #155724;
-        }
-        .situacao-npg {
-            background-color: #f8d7da;
-            color: #721c24;
-        }
-        .descricao-col {
-            max-width: 200px;
-            overflow: hidden;
-            text-overflow: ellipsis;
-            white-space: nowrap;
-            font-size: 10px;
-            font-style: italic;
-        }
-        </style>
+        # Os subtotais do trecho deslocado mudam: o índice é refeito na próxima consulta
+        self._sub_total_atualizado = False
+    
+    def reposicionar_registro(self, idx):
+        """Reposiciona um registro cuja chave mudou por busca binária nos dados já ordenados
+        
+        Retorna a nova posição. As demais linhas continuam ordenadas, então basta
+        procurar a posição da nova chave acima ou abaixo da linha atual.
         """
+        chaves = self.dados['Chave_Ordenacao'].to_numpy()
+        origem = self.dados.index.get_loc(idx)
+        chave = chaves[origem]
+        
+        if origem > 0 and chave < chaves[origem - 1]:
+            # Sobe: fica depois das chaves iguais que já estavam antes dela
+            destino = int(np.searchsorted(chaves[:origem], chave, side='right'))
+        elif origem < len(chaves) - 1 and chave > chaves[origem + 1]:
+            # Desce: fica antes das chaves iguais que já estavam depois dela
+            destino = origem + int(np.searchsorted(chaves[origem + 1:], chave, side='left'))
+        else:
+            return origem
         
-        # Agrupa por prioridade
-        prioridades = {
-            1: "Prioridade 1 - Urgente",
-            2: "Prioridade 2 - Alta", 
-            3: "Prioridade 3 - Média",
-            4: "Prioridade 4 - Baixa",
-            5: "Prioridade 5 - Muito Baixa",
-            None: "Sem Prioridade"
-        }
+        self._mover_linha(origem, destino)
+        return destino
+    
+    def reposicionar_registros_editados(self):
+        """Reposiciona os registros editados; reordena tudo se houver mais de um ou se a ordem não for confiável"""
+        with self._lock:
+            pendentes = self._reposicionar_pendentes
+            if len(pendentes) == 1 and self.ordenacao_valida():
+                self.reposicionar_registro(pendentes.pop())
+            elif pendentes or not self.ordenacao_valida():
+                self.ordenar_por_prioridade_e_renegociacao()
+    
+    def ordenar_por_data_efetiva(self):
+        """Mantém compatibilidade - chama a nova função de ordenação"""
+        self.ordenar_por_prioridade_e_renegociacao()
+    
+    def _truncar_escapar(self, serie, limite, vazio):
+        """Trunca textos em `limite` caracteres (com '...', None = sem corte) e escapa HTML; ausentes viram `vazio`"""
+        textos = serie.astype(object).where(serie.notna(), None).tolist()
+        resultado = []
+        for texto in textos:
+            if texto is None or texto == '':
+                resultado.append(vazio)
+                continue
+            texto = str(texto)
+            if limite is not None and len(texto) > limite:
+                texto = texto[:limite] + "..."
+            resultado.append(html.escape(texto))
+        return np.array(resultado, dtype=object)
+    
+    def _colunas_html_fluxo(self, dados):
+        """Colunas já formatadas (arrays de texto) na ordem dos campos de MODELO_LINHA_FLUXO, sem o subtotal"""
+        def coluna_texto(nome):
+            return dados[nome] if nome in dados.columns else pd.Series(None, index=dados.index, dtype=object)
+        
+        renegociada = dados['Data Renegociacao'].notna().to_numpy()
+        classe_linha = np.where(renegociada, 'renegociada-row', '').astype(object)
+        
+        def datas(nome):
+            return formatar_datas(dados[nome]).to_numpy(dtype=object)
+        
+        situacao = coluna_texto('Situacao').astype(object)
+        situacao_texto = situacao.map({'PG': '✅ PG', 'N_PG': '❌ N_PG'}).fillna('-').to_numpy(dtype=object)
+        situacao_classe = situacao.map({'PG': 'situacao-pg', 'N_PG': 'situacao-npg'}).fillna('').to_numpy(dtype=object)
+        
+        descricao = coluna_texto('Descricao_Negociacao')
+        descricao_titulo = self._truncar_escapar(descricao, None, '')
+        
+        return [
+            classe_linha,
+            self._truncar_escapar(coluna_texto('Razão Social'), 30, ''),
+            datas('Vencto Real'),
+            datas('Data Renegociacao'),
+            datas('Data Efetiva'),
+            formatar_moedas(dados['Valor'].to_numpy(dtype=float, na_value=np.nan), simbolo=False),
+            situacao_classe,
+            situacao_texto,
+            descricao_titulo,
+            self._truncar_escapar(descricao, 50, '-'),
+            self._truncar_escapar(coluna_texto('Historico'), 25, '-'),
+        ]
+    
+    def preparar_visao_fluxo(self, dados_para_exibir=None):
+        """Retorna (dados na ordem de exibição, índice de subtotais) para o relatório e a paginação"""
+        # Todos os dados: usa a ordenação mantida e o índice de subtotais
+        if dados_para_exibir is None:
+            subtotais = self.obter_subtotais()
+            dados_html = self.dados
+        else:
+            # Usa dados específicos (filtrados): ordena e acumula só esse recorte
+            dados_html = dados_para_exibir.copy()
+            
+            # Adiciona data efetiva e chave de ordenação se não existirem
+            if 'Chave_Ordenacao' not in dados_html.columns:
+                self.atualizar_colunas_derivadas(dados_html)
+            
+            # Ordena por: 1º Prioridade, 2º Data de Renegociação, 3º Data Efetiva
+            ordem = np.argsort(dados_html['Chave_Ordenacao'].to_numpy(), kind='stable')
+            dados_html = dados_html.take(ordem).reset_index(drop=True)
+            subtotais = SubtotaisFluxo(dados_html)
+        return dados_html, subtotais
+    
+    def _hash_grupo_fluxo(self, dados_html, subtotais, prioridade):
+        """Hash do conteúdo exibido de um grupo de prioridade, memorizado por versão dos dados"""
+        grupo = SubtotaisFluxo.chave_grupo(prioridade)
+        with self._lock:
+            memo = self._memo_hash_grupos
+            if memo.get('subtotais') is not subtotais or memo.get('versao') != self.versao_dados:
+                memo = self._memo_hash_grupos = {'subtotais': subtotais, 'versao': self.versao_dados, 'hashes': {}}
+            if grupo not in memo['hashes']:
+                linhas = dados_html.take(subtotais.posicoes_grupo[grupo]).reindex(columns=list(self.COLUNAS_HTML_FLUXO))
+                hashes_linhas = pd.util.hash_pandas_object(linhas, index=False).to_numpy()
+                memo['hashes'][grupo] = hashlib.sha1(hashes_linhas.tobytes()).hexdigest()
+            return memo['hashes'][grupo]
+    
+    def _renderizar_secao_fluxo(self, dados_html, subtotais, prioridade, rotulo, primeira, ultima):
+        """HTML de uma seção de prioridade: cabeçalho, linhas [primeira, ultima) do grupo e total"""
+        posicoes_grupo = subtotais.posicoes_grupo[SubtotaisFluxo.chave_grupo(prioridade)]
+        colunas = self._colunas_html_fluxo(dados_html.take(posicoes_grupo[primeira:ultima]))
+        
+        # Cabeçalho da seção e da tabela (contagem do grupo inteiro)
+        classe_prioridade = f"prioridade-{prioridade}" if prioridade else "sem-prioridade"
+        partes = [self.MODELO_CABECALHO_FLUXO.format(classe_prioridade, rotulo, len(posicoes_grupo))]
+        
+        # Linhas do grupo (dados_html já está na ordem da chave) com o subtotal da árvore de Fenwick
+        subtotal_grupo = formatar_moedas(subtotais.janela_grupo(prioridade, primeira, ultima), simbolo=False)
+        partes.append(''.join(map(self.MODELO_LINHA_FLUXO.format, *colunas[:6], subtotal_grupo, *colunas[6:])))
+        
+        # Total da seção
+        total_formatado = self.formatar_valor_brasileiro(subtotais.total_grupo(prioridade))
+        partes.append(self.MODELO_TOTAL_FLUXO.format(rotulo, total_formatado))
+        return ''.join(partes)
+    
+    def gerar_html_fluxo_caixa(self, dados_para_exibir=None, inicio=0, fim=None, visao=None):
+        """Gera HTML para visualização do fluxo de caixa no Streamlit
+        
+        Com `inicio`/`fim` só as linhas dessa janela (posições na ordem de exibição)
+        são formatadas e enviadas; subtotais e totais continuam sendo os do conjunto
+        completo. `visao` reaproveita o retorno de preparar_visao_fluxo.
+        """
+        if self.dados is None:
+            return "<p>Nenhum dado disponível</p>"
         
-        # Início do HTML
-        html_content = css_style + '<div class="fluxo-container">'
+        dados_html, subtotais = visao if visao is not None else self.preparar_visao_fluxo(dados_para_exibir)
+        fim = len(dados_html) if fim is None else min(fim, len(dados_html))
+        inicio = max(0, min(inicio, fim))
         
-        for prioridade in [1, 2, 3, 4, 5, None]:
-            if prioridade is None:
-                dados_prioridade = dados_html[dados_html['Prioridade'].isna()]
-            else:
-                dados_prioridade = dados_html[dados_html['Prioridade'] == prioridade]
+        # Início do HTML (CSS fixo, montado uma vez na classe)
+        partes = [self.CSS_FLUXO, '<div class="fluxo-container">']
+        
+        # Agrupa por prioridade
+        for prioridade, rotulo in self.ROTULOS_PRIORIDADE.items():
+            posicoes_grupo = subtotais.posicoes_grupo.get(SubtotaisFluxo.chave_grupo(prioridade))
+            if posicoes_grupo is None or len(posicoes_grupo) == 0:
+                continue
             
-            if len(dados_prioridade) == 0:
+            # Linhas do grupo dentro da janela (as posições do grupo são crescentes)
+            primeira = int(np.searchsorted(posicoes_grupo, inicio, side='left'))
+            ultima = int(np.searchsorted(posicoes_grupo, fim, side='left'))
+            if primeira == ultima:
                 continue
-                
-            # Cabeçalho da seção
-            classe_prioridade = f"prioridade-{prioridade}" if prioridade else "sem-prioridade"
-            html_content += f'<div class="prioridade-section">'
-            html_content += f'<div class="prioridade-header {classe_prioridade}">'
-            html_content += f'{prioridades[prioridade]} ({len(dados_prioridade)} registros)'
-            html_content += f'</div>'
-            
-            # Tabela
-            html_content += '<table class="fluxo-table">'
-            html_content += '<thead><tr>'
-            html_content += '<th>Empresa</th>'
-            html_content += '<th>Vencto Real</th>'
-            html_content += '<th>Data Reneg.</th>'
-            html_content += '<th>Data Efetiva</th>'
-            html_content += '<th>Valor</th>'
-            html_content += '<th>Subtotal</th>'
-            html_content += '<th>Situação</th>'
-            html_content += '<th>Descrição</th>'
-            html_content += '<th>Histórico</th>'
-            html_content += '</tr></thead><tbody>'
-            
-            # Ordena dentro da prioridade por data de renegociação primeiro
-            dados_prioridade = dados_prioridade.sort_values([
-                'Data Renegociacao', 
-                'Data Efetiva'
-            ], na_position='last').reset_index(drop=True)
-            
-            # Recalcula subtotal para este grupo
-            dados_prioridade['Sub_Total_Grupo'] = dados_prioridade['Valor'].cumsum()
-            
-            for idx, row in dados_prioridade.iterrows():
-                # Verifica se foi renegociada
-                foi_renegociada = pd.notna(row['Data Renegociacao'])
-                classe_row = "renegociada-row" if foi_renegociada else ""
-                
-                # Formata valores
-                valor_formatado = self.formatar_valor_brasileiro(row['Valor'])
-                subtotal_formatado = self.formatar_valor_brasileiro(row['Sub_Total_Grupo'])
-                
-                # Formata datas
-                data_original = row['Vencto Real'].strftime('%Y-%m-%d')
-                data_renegociacao = row['Data Renegociacao'].strftime('%Y-%m-%d') if foi_renegociada else "-"
-                data_efetiva = row['Data Efetiva'].strftime('%Y-%m-%d')
-                
-                # Trunca texto longo
-                empresa = row['Razão Social'][:30] + "..." if len(row['Razão Social']) > 30 else row['Razão Social']
-                historico = row['Historico'][:25] + "..." if len(str(row['Historico'])) > 25 else str(row['Historico'])
-                
-                # Processa situação
-                situacao = row.get('Situacao', None) if 'Situacao' in row else None
-                if situacao == 'PG':
-                    situacao_texto = '✅ PG'
-                    situacao_classe = 'situacao-pg'
-                elif situacao == 'N_PG':
-                    situacao_texto = '❌ N_PG'
-                    situacao_classe = 'situacao-npg'
-                else:
-                    situacao_texto = '-'
-                    situacao_classe = ''
-                
-                html_content += f'<tr class="{classe_row}">'
-                # Processa descrição da negociação
-                descricao = row.get('Descricao_Negociacao', '') if 'Descricao_Negociacao' in row else ''
-                descricao_texto = str(descricao)[:50] + "..." if len(str(descricao)) > 50 else str(descricao) if descricao else "-"
-                
-                html_content += f'<td class="empresa-col">{empresa}</td>'
-                html_content += f'<td class="data-col">{data_original}</td>'
-                html_content += f'<td class="data-col">{data_renegociacao}</td>'
-                html_content += f'<td class="data-col"><strong>{data_efetiva}</strong></td>'
-                html_content += f'<td class="valor-col">{valor_formatado}</td>'
-                html_content += f'<td class="valor-col"><strong>{subtotal_formatado}</strong></td>'
-                html_content += f'<td class="situacao-col {situacao_classe}">{situacao_texto}</td>'
-                html_content += f'<td class="descricao-col" title="{descricao}">{descricao_texto}</td>'
-                html_content += f'<td class="historico-col">{historico}</td>'
-                html_content += '</tr>'
-            
-            # Total da seção
-            total_prioridade = dados_prioridade['Valor'].sum()
-            total_formatado = self.formatar_valor_brasileiro(total_prioridade)
-            
-            html_content += '<tr class="total-row">'
-            html_content += f'<td colspan="4">Total {prioridades[prioridade]}</td>'
-            html_content += f'<td class="valor-col">{total_formatado}</td>'
-            html_content += '<td colspan="4"></td>'
-            html_content += '</tr>'
-            
-            html_content += '</tbody></table></div>'
-
+            
+            # Seção já renderizada do mesmo grupo, com o mesmo conteúdo e a mesma janela: reaproveita
+            # (o hash cobre só as linhas; grupo e versão dos dados definem cabeçalho, classe e total)
+            chave = (prioridade, self.versao_dados, self._hash_grupo_fluxo(dados_html, subtotais, prioridade),
+                     primeira, ultima, self.COLUNAS_HTML_FLUXO)
+            fragmento = self.cache_fragmentos.obter(chave)
+            if fragmento is None:
+                fragmento = self._renderizar_secao_fluxo(dados_html, subtotais, prioridade, rotulo, primeira, ultima)
+                self.cache_fragmentos.guardar(chave, fragmento)
+            partes.append(fragmento)
+        
         # Total geral
-        total_geral = dados_html['Valor'].sum()
+        total_geral = subtotais.geral.prefixo(len(dados_html) - 1)
         total_geral_formatado = self.formatar_valor_brasileiro(total_geral)
         
-        html_content += f'<div style="text-align: center; font-size: 18px; font-weight: bold; margin-top: 15px; padding: 10px; background-color: #e9ecef; border-radius: 5px;">'
-        html_content += f'Total Geral: {total_geral_formatado}'
-        html_content += '</div>'
+        partes.append(f'<div style="text-align: center; font-size: 18px; font-weight: bold; margin-top: 15px; padding: 10px; background-color: #e9ecef; border-radius: 5px;">')
+        partes.append(f'Total Geral: {total_geral_formatado}')
+        partes.append('</div>')
         
-        html_content += '</div>'
+        partes.append('</div>')
         
+        html_content = ''.join(partes)
         return html_content
     
+    def gerar_dados_grade_virtual(self, visao):
+        """Dados da grade virtual em JSON compacto por colunas, na ordem de exibição do relatório
+        
+        Textos repetidos vão como dicionário + códigos (-1 = ausente), datas como dias desde
+        1970-01-01 (None = ausente) e a situação como código de SITUACOES_GRADE; a formatação
+        e o escape ficam no navegador. Retorna (assinatura, dados) para o componente só
+        reconstruir a grade quando o conteúdo mudar.
+        """
+        dados_html, subtotais = visao
+        
+        # Grupos na ordem do relatório; o hash de cada grupo compõe a assinatura
+        grupos, posicoes, subtotais_grupo, hashes = [], [], [], []
+        for prioridade, rotulo in self.ROTULOS_PRIORIDADE.items():
+            posicoes_grupo = subtotais.posicoes_grupo.get(SubtotaisFluxo.chave_grupo(prioridade))
+            if posicoes_grupo is None or len(posicoes_grupo) == 0:
+                continue
+            grupos.append({
+                'rotulo': rotulo,
+                'classe': f"prioridade-{prioridade}" if prioridade else "sem-prioridade",
+                'inicio': sum(len(p) for p in posicoes),
+                'quantidade': len(posicoes_grupo),
+                'total': round(float(subtotais.total_grupo(prioridade)), 2),
+            })
+            posicoes.append(posicoes_grupo)
+            subtotais_grupo.append(subtotais.janela_grupo(prioridade))
+            hashes.append(f"{prioridade}:{self._hash_grupo_fluxo(dados_html, subtotais, prioridade)}")
+        assinatura = hashlib.sha1(f"{self.versao_dados}|{'|'.join(hashes)}".encode()).hexdigest()
+        
+        chave = ('grade_virtual', assinatura)
+        dados = self.cache_fragmentos.obter(chave)
+        if dados is not None:
+            return assinatura, dados
+        
+        ordem = np.concatenate(posicoes) if posicoes else np.zeros(0, dtype=int)
+        linhas = dados_html.take(ordem).reindex(columns=list(self.COLUNAS_HTML_FLUXO))
+        
+        def dicionario(nome):
+            codigos, valores = pd.factorize(linhas[nome].where(linhas[nome] != ''))
+            return [str(v) for v in valores], codigos.tolist()
+        
+        def dias(nome):
+            datas = pd.to_datetime(linhas[nome], errors='coerce')
+            numeros = datas.to_numpy(dtype='datetime64[D]').astype(np.int64).astype(object)
+            numeros[datas.isna().to_numpy()] = None
+            return numeros.tolist()
+        
+        def moedas(valores):
+            return np.round(np.nan_to_num(np.asarray(valores, dtype=float)), 2).tolist()
+        
+        empresas, codigos_empresa = dicionario('Razão Social')
+        descricoes, codigos_descricao = dicionario('Descricao_Negociacao')
+        historicos, codigos_historico = dicionario('Historico')
+        situacao = linhas['Situacao'].map({'PG': 1, 'N_PG': 2}).fillna(0).astype(int)
+        
+        dados = {
+            'grupos': grupos,
+            'total_geral': round(float(subtotais.geral.prefixo(len(dados_html) - 1)), 2),
+            'situacoes': [list(s) for s in self.SITUACOES_GRADE],
+            'empresas': empresas,
+            'descricoes': descricoes,
+            'historicos': historicos,
+            'colunas': {
+                'empresa': codigos_empresa,
+                'vencto': dias('Vencto Real'),
+                'reneg': dias('Data Renegociacao'),
+                'efetiva': dias('Data Efetiva'),
+                'valor': moedas(pd.to_numeric(linhas['Valor'], errors='coerce')),
+                'subtotal': moedas(np.concatenate(subtotais_grupo) if subtotais_grupo else []),
+                'situacao': situacao.tolist(),
+                'descricao': codigos_descricao,
+                'historico': codigos_historico,
+            },
+        }
+        self.cache_fragmentos.guardar(chave, dados)
+        return assinatura, dados
+
     def listar_arquivos_extratos(self):
         """Lista todos os arquivos na pasta extratos"""
         pasta_extratos = "extratos"
@@ -1069,242 +2099,152 @@ class FluxoCaixaApp:
         
         return sorted(arquivos)
     
-    def verificar_arquivo_bradesco(self, caminho_arquivo):
-        """Verifica se o arquivo contém a palavra 'bradesco' (case insensitive)"""
-        nome_arquivo = os.path.basename(caminho_arquivo).lower()
-        return 'bradesco' in nome_arquivo
+    def identificar_banco_extrato(self, caminho_arquivo):
+        """Banco do extrato ('Bradesco', 'BB', 'REAG'), reconhecido pelas primeiras linhas do arquivo, ou None"""
+        parser = identificar_extrato(caminho_arquivo)
+        return PARSERS[parser].tipo if parser is not None else None
     
     def processar_extrato_bradesco(self, caminho_arquivo):
-        """Processa um extrato do Bradesco seguindo as regras específicas"""
-        try:
-            # Lê o arquivo Excel
-            df = pd.read_excel(caminho_arquivo, header=None)
-            
-            # Procura pela linha que contém 'Total' para definir o fim
-            linha_final = None
-            for idx, row in df.iterrows():
-                if any('total' in str(cell).lower() for cell in row if pd.notna(cell)):
-                    linha_final = idx
-                    break
-            
-            if linha_final is None:
-                linha_final = len(df)
-            
-            # Lê a partir da linha 10 (índice 9) até a linha com 'Total'
-            # Seleciona apenas as primeiras 5 colunas
-            dados_extratos = df.iloc[9:linha_final, :5].copy()
-            
-            # Define os nomes das colunas
-            dados_extratos.columns = ['Data', 'Lancamento', 'Dcto', 'Credito', 'Debito']
-            
-            # Remove linhas vazias
-            dados_extratos = dados_extratos.dropna(how='all')
-            
-            # Converte a coluna Data
-            dados_extratos['Data'] = pd.to_datetime(dados_extratos['Data'], errors='coerce')
-            
-            # Converte colunas de valores para números com 2 casas decimais
-            for coluna in ['Credito', 'Debito']:
-                if coluna in dados_extratos.columns:
-                    # Remove caracteres não numéricos e converte
-                    dados_extratos[coluna] = dados_extratos[coluna].astype(str)
-                    dados_extratos[coluna] = dados_extratos[coluna].str.replace('[^0-9.,\\-]', '', regex=True)
-                    dados_extratos[coluna] = dados_extratos[coluna].str.replace(',', '.')
-                    dados_extratos[coluna] = pd.to_numeric(dados_extratos[coluna], errors='coerce').fillna(0)
-                    dados_extratos[coluna] = dados_extratos[coluna].round(2)
-            
-            # Calcula o saldo
-            dados_extratos['Saldo'] = (dados_extratos['Credito'] - dados_extratos['Debito']).cumsum().round(2)
-            
-            # Remove linhas com data inválida
-            dados_extratos = dados_extratos.dropna(subset=['Data'])
-            
-            return dados_extratos, None
-            
-        except Exception as e:
-            return None, f"Erro ao processar arquivo {os.path.basename(caminho_arquivo)}: {str(e)}"
+        """Processa um extrato do Bradesco seguindo as regras específicas (ver extratos.py)"""
+        return processar_extrato_bradesco(caminho_arquivo)
     
-    def processar_todos_extratos(self):
-        """Processa todos os extratos da pasta extratos"""
+    def processar_todos_extratos(self, ao_progresso=None):
+        """Processa todos os extratos (Bradesco, BB e REAG) da pasta extratos em paralelo (um processo por arquivo, até o nº de CPUs)
+        
+        `ao_progresso(concluidos, total, arquivo)` é chamado a cada arquivo terminado.
+        """
         arquivos = self.listar_arquivos_extratos()
         
         if not arquivos:
             return None, "Nenhum arquivo encontrado na pasta extratos"
         
-        extratos_processados = []
-        erros = []
-        
+        # Cada arquivo vai para o parser do seu banco (reconhecido pelo conteúdo)
+        caminhos = {}
         for arquivo in arquivos:
             caminho_completo = os.path.join("extratos", arquivo)
+            parser = identificar_extrato(caminho_completo)
             
-            if self.verificar_arquivo_bradesco(caminho_completo):
-                dados, erro = self.processar_extrato_bradesco(caminho_completo)
-                
-                if dados is not None:
-                    dados['Arquivo_Origem'] = arquivo
-                    extratos_processados.append(dados)
-                else:
-                    erros.append(erro)
+            if parser is not None:
+                caminhos[caminho_completo] = parser
             else:
-                st.info(f"📄 Arquivo {arquivo} não contém 'bradesco' no nome - ignorado")
+                st.info(f"📄 Arquivo {arquivo} não corresponde a nenhum formato de extrato conhecido - ignorado")
+        
+        # Arquivos já processados (mesmo conteúdo e mesma versão do parser) vêm do cache
+        cache = CacheExtratos()
+        chaves = {caminho: chave_cache(hash_arquivo(caminho), parser) for caminho, parser in caminhos.items()}
+        resultados = {}
+        for caminho, chave in chaves.items():
+            dados = cache.obter(chave, os.path.basename(caminho))
+            if dados is not None:
+                resultados[caminho] = dados
         
-        if extratos_processados:
-            # Combina todos os extratos
-            df_combinado = pd.concat(extratos_processados, ignore_index=True)
-            df_combinado = df_combinado.sort_values('Data').reset_index(drop=True)
+        concluidos = len(resultados)
+        if concluidos and ao_progresso is not None:
+            ao_progresso(concluidos, len(caminhos), "extratos já processados")
+        
+        # Só os arquivos novos ou alterados são processados
+        pendentes = [caminho for caminho in caminhos if caminho not in resultados]
+        novos = {}
+        erros = []
+        for caminho, dados, erro in processar_extratos_em_paralelo({caminho: caminhos[caminho] for caminho in pendentes}):
+            if dados is not None:
+                resultados[caminho] = dados
+                novos[chaves[caminho]] = (caminhos[caminho], os.path.basename(caminho), dados)
+            else:
+                erros.append(erro)
+            concluidos += 1
+            if ao_progresso is not None:
+                ao_progresso(concluidos, len(caminhos), os.path.basename(caminho))
+        
+        if novos or pendentes:
+            cache.gravar(novos, {os.path.basename(caminho): chave for caminho, chave in chaves.items()})
+        
+        # Valores que o parser não conseguiu ler entram como 0: avisa por arquivo
+        for caminho in caminhos:
+            nao_convertidos = resultados[caminho].attrs.get('valores_nao_convertidos', 0) if caminho in resultados else 0
+            if nao_convertidos:
+                erros.append(f"Arquivo {os.path.basename(caminho)}: {nao_convertidos} valor(es) não reconhecido(s) como número - considerados como 0")
+        
+        if resultados:
+            # Combina todos os extratos (na ordem dos arquivos, independente da ordem de término);
+            # cada linha leva o banco do seu arquivo, para os saldos finais por banco
+            df_combinado = pd.concat([resultados[c].assign(Banco=PARSERS[caminhos[c]].tipo)
+                                      for c in caminhos if c in resultados], ignore_index=True)
+            df_combinado = df_combinado.sort_values('Data', kind='stable').reset_index(drop=True)
             
             return df_combinado, erros
         else:
-            return None, "Nenhum extrato do Bradesco foi processado com sucesso"
-    
-    def gerar_html_extratos(self, dados_extratos):
-        """Gera HTML para visualização dos extratos bancários"""
-        if dados_extratos is None or len(dados_extratos) == 0:
-            return "<p>Nenhum dado de extrato disponível</p>"
-        
-        # Pega o último saldo como saldo final
-        saldo_final = dados_extratos['Saldo'].iloc[-1] if len(dados_extratos) > 0 else 0
-        
-        # CSS para estilização da tabela
-        css_style = """
-        <style>
-            .extrato-table {
-                width: 100%;
-                border-collapse: collapse;
-                margin: 10px 0;
-                font-family: Arial, sans-serif;
-                font-size: 12px;
-            }
-            .extrato-table th, .extrato-table td {
-                border: 1px solid #ddd;
-                padding: 8px;
-                text-align: left;
-            }
-            .extrato-table th {
-                background-color: #1f77b4;
-                color: white;
-                font-weight: bold;
-                text-align: center;
-            }
-            .extrato-table tr:nth-child(even) {
-                background-color: #f9f9f9;
-            }
-            .extrato-table tr:hover {
-                background-color: #f5f5f5;
-            }
-            .credito {
-                color: #28a745;
-                font-weight: bold;
-            }
-            .debito {
-                color: #dc3545;
-                font-weight: bold;
-            }
-            .saldo-positivo {
-                color: #28a745;
-                font-weight: bold;
-            }
-            .saldo-negativo {
-                color: #dc3545;
-                font-weight: bold;
-            }
-            .data-col {
-                text-align: center;
-                width: 100px;
-            }
-            .valor-col {
-                text-align: right;
-                width: 120px;
-            }
-            .lancamento-col {
-                max-width: 300px;
-            }
-            .saldo-final {
-                background-color: #e9ecef;
-                border: 2px solid #007bff;
-                padding: 15px;
-                margin: 15px 0;
-                border-radius: 5px;
-                text-align: center;
-                font-size: 18px;
-                font-weight: bold;
-            }
-        </style>
+            return None, "Nenhum extrato foi processado com sucesso"
+    
+    def _colunas_html_extratos(self, dados):
+        """Colunas de um bloco de transações já formatadas, na ordem dos campos de MODELO_LINHA_EXTRATO"""
+        def textos(coluna):
+            if coluna not in dados.columns:
+                return [''] * len(dados)
+            serie = dados[coluna].astype(object)
+            return [html.escape(texto) for texto in serie.where(serie.notna(), '').astype(str).tolist()]
+        
+        # Crédito/débito zerados ficam em branco
+        credito = pd.to_numeric(dados['Credito'], errors='coerce').fillna(0)
+        debito = pd.to_numeric(dados['Debito'], errors='coerce').fillna(0)
+        saldo = pd.to_numeric(dados['Saldo'], errors='coerce').fillna(0)
+        
+        return [
+            formatar_datas(dados['Data'], FORMATO_DATA_BR, vazio='').tolist(),
+            textos('Lancamento'),
+            textos('Dcto'),
+            formatar_moedas(credito.where(credito > 0)).where(credito > 0, '').tolist(),
+            formatar_moedas(debito.where(debito > 0)).where(debito > 0, '').tolist(),
+            np.where(saldo >= 0, "saldo-positivo", "saldo-negativo").tolist(),
+            formatar_moedas(saldo).tolist(),
+            textos('Arquivo_Origem'),
+        ]
+    
+    def gerar_blocos_html_extratos(self, dados_extratos, inicio=0, fim=None, tamanho_bloco=None):
+        """Gera o HTML dos extratos em pedaços: abertura (CSS, saldo final e cabeçalho),
+        as linhas [inicio, fim) formatadas em bloco a cada `tamanho_bloco` transações e o fechamento
+        
+        Só as transações pedidas são formatadas; o saldo final é sempre o da última transação.
         """
+        if dados_extratos is None or len(dados_extratos) == 0:
+            yield "<p>Nenhum dado de extrato disponível</p>"
+            return
         
-        # Constrói o HTML da tabela
-        html_content = css_style
-        html_content += '<div class="saldo-final">'
-        html_content += f'💰 <strong>Saldo Final: R$ {saldo_final:,.2f}</strong>'
-        html_content += '</div>'
-        
-        html_content += '<table class="extrato-table">'
-        html_content += '''
-        <thead>
-            <tr>
-                <th class="data-col">Data</th>
-                <th class="lancamento-col">Lançamento</th>
-                <th>Dcto</th>
-                <th class="valor-col">Crédito</th>
-                <th class="valor-col">Débito</th>
-                <th class="valor-col">Saldo</th>
-                <th>Arquivo</th>
-            </tr>
-        </thead>
-        <tbody>
-        '''
-        
-        # Adiciona linhas da tabela
-        for idx, row in dados_extratos.iterrows():
-            data_formatada = row['Data'].strftime('%d/%m/%Y') if pd.notna(row['Data']) else ''
-            lancamento = str(row['Lancamento']) if pd.notna(row['Lancamento']) else ''
-            dcto = str(row['Dcto']) if pd.notna(row['Dcto']) else ''
-            
-            # Formata valores
-            credito = row['Credito'] if pd.notna(row['Credito']) else 0
-            debito = row['Debito'] if pd.notna(row['Debito']) else 0
-            saldo = row['Saldo'] if pd.notna(row['Saldo']) else 0
-            
-            credito_formatado = f"R$ {credito:,.2f}" if credito > 0 else ""
-            debito_formatado = f"R$ {debito:,.2f}" if debito > 0 else ""
-            
-            # Define classe CSS para o saldo
-            saldo_classe = "saldo-positivo" if saldo >= 0 else "saldo-negativo"
-            saldo_formatado = f"R$ {saldo:,.2f}"
-            
-            arquivo_origem = row['Arquivo_Origem'] if 'Arquivo_Origem' in row and pd.notna(row['Arquivo_Origem']) else ''
-            
-            html_content += f'''
-            <tr>
-                <td class="data-col">{data_formatada}</td>
-                <td class="lancamento-col">{lancamento}</td>
-                <td>{dcto}</td>
-                <td class="valor-col credito">{credito_formatado}</td>
-                <td class="valor-col debito">{debito_formatado}</td>
-                <td class="valor-col {saldo_classe}">{saldo_formatado}</td>
-                <td>{arquivo_origem}</td>
-            </tr>
-            '''
-        
-        html_content += '</tbody></table>'
+        tamanho_bloco = tamanho_bloco or self.TAMANHO_BLOCO_EXTRATOS
+        fim = len(dados_extratos) if fim is None else min(fim, len(dados_extratos))
+        inicio = max(0, min(inicio, fim))
         
-        return html_content
+        # Pega o último saldo como saldo final
+        saldo_final = dados_extratos['Saldo'].iloc[-1]
+        yield (f'{self.CSS_EXTRATOS}<div class="saldo-final">💰 <strong>Saldo Final: {formatar_moeda(saldo_final)}</strong></div>'
+               f'{self.MODELO_CABECALHO_EXTRATOS}')
+        
+        for posicao in range(inicio, fim, tamanho_bloco):
+            colunas = self._colunas_html_extratos(dados_extratos.iloc[posicao:min(fim, posicao + tamanho_bloco)])
+            yield ''.join(map(self.MODELO_LINHA_EXTRATO.format, *colunas))
+        
+        yield '</tbody></table>'
+    
+    def gerar_html_extratos(self, dados_extratos, inicio=0, fim=None):
+        """Gera HTML para visualização dos extratos bancários (transações [inicio, fim), todas por padrão)"""
+        return ''.join(self.gerar_blocos_html_extratos(dados_extratos, inicio, fim))
+    
+    def _estrutura_saldos(self, saldo_bradesco, saldo_bb, saldo_reag):
+        """Conteúdo de saldos_bancarios.json para os três saldos"""
+        return {
+            "ultima_atualizacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "saldos": {
+                "bradesco": float(saldo_bradesco) if saldo_bradesco else 0.0,
+                "banco_brasil": float(saldo_bb) if saldo_bb else 0.0,
+                "reag": float(saldo_reag) if saldo_reag else 0.0
+            },
+            "total": float(saldo_bradesco or 0) + float(saldo_bb or 0) + float(saldo_reag or 0)
+        }
     
     def salvar_saldos_bancarios(self, saldo_bradesco, saldo_bb, saldo_reag):
         """Salva os saldos dos bancos em arquivo JSON"""
         try:
-            saldos = {
-                "ultima_atualizacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "saldos": {
-                    "bradesco": float(saldo_bradesco) if saldo_bradesco else 0.0,
-                    "banco_brasil": float(saldo_bb) if saldo_bb else 0.0,
-                    "reag": float(saldo_reag) if saldo_reag else 0.0
-                },
-                "total": float(saldo_bradesco or 0) + float(saldo_bb or 0) + float(saldo_reag or 0)
-            }
-            
-            with open('saldos_bancarios.json', 'w', encoding='utf-8') as f:
-                json.dump(saldos, f, ensure_ascii=False, indent=2)
+            salvar_json('saldos_bancarios.json', self._estrutura_saldos(saldo_bradesco, saldo_bb, saldo_reag))
             
             return True, "Saldos salvos com sucesso!"
         except Exception as e:
@@ -1313,9 +2253,9 @@ class FluxoCaixaApp:
     def carregar_saldos_bancarios(self):
         """Carrega os saldos dos bancos do arquivo JSON"""
         try:
-            if os.path.exists('saldos_bancarios.json'):
-                with open('saldos_bancarios.json', 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            saldos = ler_json('saldos_bancarios.json')
+            if saldos is not None:
+                return saldos
             
             # Retorna estrutura padrão se arquivo não existe
             return {
@@ -1351,25 +2291,19 @@ class FluxoCaixaApp:
                 'saldo_restante': saldo_total
             }
             
+            # Totais e quantidades por prioridade saem do índice de grupos (sem varrer os dados)
+            grupos = self.obter_subtotais()
+            
             # Processa prioridades de 1 a 5
             for prioridade in range(1, 6):
-                # Filtra dados pela prioridade
-                dados_prioridade = self.dados[
-                    (self.dados['Prioridade'] == prioridade) & 
-                    (self.dados['Prioridade'].notna())
-                ]
-                
-                if len(dados_prioridade) > 0:
-                    valor_prioridade = dados_prioridade['Valor'].sum()
-                else:
-                    valor_prioridade = 0.0
+                valor_prioridade = grupos.total_grupo(prioridade)
                 
                 # Calcula saldo após desconto
                 saldo_apos_desconto = disponibilidade['saldo_restante'] - valor_prioridade
                 
                 disponibilidade['prioridades'][prioridade] = {
                     'valor_total': valor_prioridade,
-                    'quantidade_itens': len(dados_prioridade),
+                    'quantidade_itens': grupos.quantidade_grupo(prioridade),
                     'saldo_antes': disponibilidade['saldo_restante'],
                     'saldo_depois': saldo_apos_desconto,
                     'suficiente': saldo_apos_desconto >= 0
@@ -1378,23 +2312,15 @@ class FluxoCaixaApp:
                 # Atualiza saldo restante para próxima prioridade
                 disponibilidade['saldo_restante'] = saldo_apos_desconto
             
-            # Processa itens sem prioridade
-            dados_sem_prioridade = self.dados[
-                (self.dados['Prioridade'].isna()) | 
-                (self.dados['Prioridade'] == 0)
-            ]
-            
-            if len(dados_sem_prioridade) > 0:
-                valor_sem_prioridade = dados_sem_prioridade['Valor'].sum()
-            else:
-                valor_sem_prioridade = 0.0
+            # Processa itens sem prioridade (ausente ou 0)
+            valor_sem_prioridade = grupos.total_grupo(None) + grupos.total_grupo(0)
             
             # Calcula saldo após descontar itens sem prioridade
             saldo_apos_sem_prioridade = disponibilidade['saldo_restante'] - valor_sem_prioridade
             
             disponibilidade['sem_prioridade'] = {
                 'valor_total': valor_sem_prioridade,
-                'quantidade_itens': len(dados_sem_prioridade),
+                'quantidade_itens': grupos.quantidade_grupo(None) + grupos.quantidade_grupo(0),
                 'saldo_antes': disponibilidade['saldo_restante'],
                 'saldo_depois': saldo_apos_sem_prioridade,
                 'suficiente': saldo_apos_sem_prioridade >= 0
@@ -1412,41 +2338,51 @@ class FluxoCaixaApp:
     def atualizar_saldo_por_situacao(self, valor, situacao_anterior, situacao_nova):
         """Atualiza saldo do Bradesco baseado na mudança de situação"""
         try:
-            # Carrega saldos atuais
-            info_saldos = self.carregar_saldos_bancarios()
-            saldo_bradesco_atual = info_saldos.get('saldos', {}).get('bradesco', 0.0)
-            saldo_bb_atual = info_saldos.get('saldos', {}).get('banco_brasil', 0.0)
-            saldo_reag_atual = info_saldos.get('saldos', {}).get('reag', 0.0)
-            
-            # Calcula novo saldo do Bradesco baseado na mudança
-            novo_saldo_bradesco = saldo_bradesco_atual
-            
             # Se mudou de N_PG para PG: desconta do saldo
             if situacao_anterior != 'PG' and situacao_nova == 'PG':
-                novo_saldo_bradesco -= valor
-                mensagem = f"Saldo Bradesco reduzido em R$ {valor:,.2f} (item marcado como PAGO)"
+                diferenca = -valor
+                mensagem = f"Saldo Bradesco reduzido em {formatar_moeda(valor)} (item marcado como PAGO)"
             
             # Se mudou de PG para N_PG: soma ao saldo
             elif situacao_anterior == 'PG' and situacao_nova != 'PG':
-                novo_saldo_bradesco += valor
-                mensagem = f"Saldo Bradesco aumentado em R$ {valor:,.2f} (item marcado como NÃO PAGO)"
+                diferenca = valor
+                mensagem = f"Saldo Bradesco aumentado em {formatar_moeda(valor)} (item marcado como NÃO PAGO)"
             
             else:
                 # Sem mudança no saldo
                 mensagem = "Situação atualizada sem alteração no saldo"
                 return True, mensagem
             
-            # Salva novo saldo
-            sucesso, msg_save = self.salvar_saldos_bancarios(novo_saldo_bradesco, saldo_bb_atual, saldo_reag_atual)
+            def aplicar_diferenca(info_saldos):
+                saldos = (info_saldos or {}).get('saldos', {})
+                return self._estrutura_saldos(
+                    saldos.get('bradesco', 0.0) + diferenca,
+                    saldos.get('banco_brasil', 0.0),
+                    saldos.get('reag', 0.0)
+                )
             
-            if sucesso:
-                return True, mensagem
-            else:
-                return False, f"Erro ao atualizar saldo: {msg_save}"
+            # Lê, ajusta e regrava sob o mesmo bloqueio: duas sessões marcando itens ao
+            # mesmo tempo somam as duas diferenças em vez de uma sobrescrever a outra
+            try:
+                atualizado = atualizar_json('saldos_bancarios.json', aplicar_diferenca)
+            except Exception as e:
+                return False, f"Erro ao atualizar saldo: {str(e)}"
+            
+            novo_saldo_bradesco = atualizado['saldos']['bradesco']
+            return True, f"{mensagem} - novo saldo: {formatar_moeda(novo_saldo_bradesco)}"
                 
         except Exception as e:
             return False, f"Erro ao processar atualização de saldo: {str(e)}"
 
+@st.cache_resource
+def obter_app_residente(arquivo_excel=FluxoCaixaApp.ARQUIVO_EXCEL_PADRAO):
+    """Retorna a instância do app do arquivo Excel, compartilhada pelas sessões do processo que usam esse arquivo"""
+    return FluxoCaixaApp(arquivo_excel)
+
+def arquivo_excel_da_sessao():
+    """Arquivo Excel escolhido nesta sessão (o padrão enquanto nenhum outro for carregado)"""
+    return st.session_state.get('arquivo_excel', FluxoCaixaApp.ARQUIVO_EXCEL_PADRAO)
+
 def criar_sidebar():
     """Cria a barra lateral com navegação"""
     st.sidebar.title("🏦 Rota Verde")
@@ -1488,6 +2424,9 @@ def pagina_dashboard(app):
         st.error("Dados não carregados!")
         return
     
+    # Índice dos grupos de prioridade da ordenação atual (posições, quantidades e totais)
+    grupos = app.obter_subtotais()
+    
     # Métricas principais
     col1, col2, col3, col4 = st.columns(4)
     
@@ -1506,7 +2445,7 @@ def pagina_dashboard(app):
         st.metric("Valor Médio", valor_medio_formatado)
     
     with col4:
-        registros_prioridade = len(app.dados[app.dados['Prioridade'].notna()])
+        registros_prioridade = len(app.dados) - grupos.quantidade_grupo(None)
         st.metric("Itens com Prioridade", registros_prioridade)
     
     # Gráfico de valores por prioridade
@@ -1515,10 +2454,11 @@ def pagina_dashboard(app):
     # Prepara dados para o gráfico por prioridade
     dados_graf = app.dados.copy()
     
-    # Cria coluna de prioridade formatada para melhor visualização
-    dados_graf['Prioridade_Label'] = dados_graf['Prioridade'].apply(
-        lambda x: f'Prioridade {int(x)}' if pd.notna(x) else 'Sem Prioridade'
-    )
+    # Cria coluna de prioridade formatada para melhor visualização (um rótulo por grupo do índice)
+    def rotulo_grupo(grupo):
+        return f'Prioridade {int(grupo)}' if grupo is not None else 'Sem Prioridade'
+    
+    dados_graf['Prioridade_Label'] = grupos.rotulos_linhas(rotulo_grupo)
     
     # Agrupa por prioridade e mês para gráfico detalhado
     dados_graf['Mes'] = dados_graf['Vencto Real'].dt.strftime('%Y-%m')
@@ -1564,7 +2504,10 @@ def pagina_dashboard(app):
     with col_graf1:
         st.subheader("📊 Total por Prioridade")
         # Gráfico de pizza das prioridades
-        valores_por_prioridade = dados_graf.groupby('Prioridade_Label')['Valor'].sum().reset_index()
+        valores_por_prioridade = pd.DataFrame({
+            'Prioridade_Label': [rotulo_grupo(grupo) for grupo in grupos.grupos()],
+            'Valor': [grupos.total_grupo(grupo) for grupo in grupos.grupos()],
+        })
         
         fig_pie = px.pie(valores_por_prioridade, 
                          values='Valor', 
@@ -1584,34 +2527,95 @@ def pagina_dashboard(app):
     
     with col_graf2:
         st.subheader("📋 Estatísticas por Prioridade")
-        # Tabela com estatísticas
-        stats_prioridade = dados_graf.groupby('Prioridade_Label').agg({
-            'Valor': ['sum', 'count', 'mean'],
-            'Razão Social': 'nunique'
-        }).round(2)
-        
-        # Achata as colunas multi-level
-        stats_prioridade.columns = ['Total (R$)', 'Quantidade', 'Média (R$)', 'Fornecedores']
+        # Tabela com estatísticas (totais e quantidades do índice; fornecedores só nas linhas de cada grupo)
+        razao_social = app.dados['Razão Social']
+        linhas_stats = []
+        for grupo in grupos.grupos():
+            posicoes = grupos.posicoes_grupo[grupo]
+            total = grupos.total_grupo(grupo)
+            linhas_stats.append({
+                'Prioridade_Label': rotulo_grupo(grupo),
+                'Total (R$)': total,
+                'Quantidade': len(posicoes),
+                'Média (R$)': total / len(posicoes),
+                'Fornecedores': razao_social.take(posicoes).nunique(),
+            })
+        stats_prioridade = pd.DataFrame(linhas_stats).set_index('Prioridade_Label').sort_index().round(2)
         
         # Formata valores em reais
-        stats_prioridade['Total (R$)'] = stats_prioridade['Total (R$)'].apply(
-            lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        )
-        stats_prioridade['Média (R$)'] = stats_prioridade['Média (R$)'].apply(
-            lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        )
+        stats_prioridade['Total (R$)'] = formatar_moedas(stats_prioridade['Total (R$)'])
+        stats_prioridade['Média (R$)'] = formatar_moedas(stats_prioridade['Média (R$)'])
         
         st.dataframe(stats_prioridade, use_container_width=True)
     
     # Exibição em HTML ao invés de DataFrame
     st.subheader("📋 Fluxo de Caixa Ordenado por Prioridade e Data de Renegociação")
     
-    # Gera HTML dos dados
-    html_content = app.gerar_html_fluxo_caixa(app.dados.head(20))  # Mostra apenas os primeiros 20
+    # Gera HTML só dos primeiros 20 registros da ordenação mantida (totais dos grupos completos)
+    html_content = app.gerar_html_fluxo_caixa(fim=20)
     
     # Exibe o HTML
     st.components.v1.html(html_content, height=600, scrolling=True)
 
+def controles_paginacao(total, chave, datas_efetivas=None, tamanho_padrao=100):
+    """Controles de página (tamanho, número e ir para data); retorna a janela (inicio, fim)"""
+    if total == 0:
+        return 0, 0
+    
+    col_tamanho, col_pagina, col_data = st.columns([1, 1, 2])
+    
+    with col_tamanho:
+        opcoes_tamanho = [50, 100, 250, 500]
+        tamanho = st.selectbox("Linhas por página", opcoes_tamanho,
+                               index=opcoes_tamanho.index(tamanho_padrao), key=f"{chave}_tamanho")
+    total_paginas = max(1, -(-total // tamanho))
+    
+    chave_pagina = f"{chave}_pagina"
+    with col_data:
+        if datas_efetivas is not None:
+            data_alvo = st.date_input("Ir para data efetiva", value=None, key=f"{chave}_ir_data")
+            chave_ultima = f"{chave}_ultima_data"
+            if data_alvo is not None and data_alvo != st.session_state.get(chave_ultima):
+                # Primeira linha (na ordem de exibição) com data efetiva a partir da data escolhida
+                alcancadas = (pd.to_datetime(datas_efetivas) >= pd.Timestamp(data_alvo)).to_numpy()
+                posicao = int(np.argmax(alcancadas)) if alcancadas.any() else total - 1
+                st.session_state[chave_pagina] = posicao // tamanho + 1
+            st.session_state[chave_ultima] = data_alvo
+    
+    # Mantém a página dentro do intervalo quando o total ou o tamanho mudam
+    if st.session_state.get(chave_pagina, 1) > total_paginas:
+        st.session_state[chave_pagina] = total_paginas
+    
+    with col_pagina:
+        pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                                 step=1, key=chave_pagina)
+    
+    inicio = (int(pagina) - 1) * tamanho
+    fim = min(total, inicio + tamanho)
+    st.caption(f"Exibindo registros {inicio + 1}–{fim} de {total}")
+    return inicio, fim
+
+# Grade virtual: componente próprio (HTML + JS, sem build) que recebe os dados em JSON e
+# só desenha no navegador as linhas visíveis; opcional, a tabela HTML paginada continua sendo o padrão
+PASTA_GRADE_VIRTUAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "componentes", "grade_virtual")
+componente_grade_virtual = (
+    st.components.v1.declare_component("grade_virtual", path=PASTA_GRADE_VIRTUAL)
+    if os.path.exists(os.path.join(PASTA_GRADE_VIRTUAL, "index.html")) else None
+)
+
+def exibir_fluxo(app, visao, chave, altura):
+    """Exibe a visão do fluxo na grade virtual (se escolhida e disponível) ou na tabela HTML paginada"""
+    usar_grade = componente_grade_virtual is not None and st.checkbox(
+        "⚡ Grade virtual (rola todos os registros no navegador)", key=f"{chave}_grade_virtual")
+    if usar_grade:
+        assinatura, dados = app.gerar_dados_grade_virtual(visao)
+        componente_grade_virtual(dados=dados, assinatura=assinatura, altura=altura, key=f"{chave}_grade", default=None)
+        return
+
+    inicio, fim = controles_paginacao(len(visao[0]), chave, visao[0]['Data Efetiva'])
+    html_content = app.gerar_html_fluxo_caixa(inicio=inicio, fim=fim, visao=visao)
+    st.components.v1.html(html_content, height=altura, scrolling=True)
+
 def pagina_analises(app):
     """Página de análises detalhadas"""
     st.title("📈 Análises Detalhadas")
@@ -1634,15 +2638,12 @@ def pagina_analises(app):
     fornecedores = ['Todos'] + sorted(app.dados['Razão Social'].unique().tolist())
     fornecedor_selecionado = st.sidebar.selectbox("Fornecedor", fornecedores)
     
-    # Aplica filtros
-    dados_filtrados = app.dados.copy()
-    dados_filtrados = dados_filtrados[
-        (dados_filtrados['Vencto Real'].dt.date >= data_inicio) &
-        (dados_filtrados['Vencto Real'].dt.date <= data_fim)
-    ]
-    
-    if fornecedor_selecionado != 'Todos':
-        dados_filtrados = dados_filtrados[dados_filtrados['Razão Social'] == fornecedor_selecionado]
+    # Aplica filtros (no banco, quando o armazenamento suporta consultas)
+    dados_filtrados = app.filtrar_registros(
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        razao_social=None if fornecedor_selecionado == 'Todos' else fornecedor_selecionado,
+    )
     
     # Estatísticas
     col1, col2 = st.columns(2)
@@ -1665,9 +2666,9 @@ def pagina_analises(app):
     st.subheader("📋 Dados Filtrados - Visualização HTML")
     
     if len(dados_filtrados) > 0:
-        # Gera HTML dos dados filtrados
-        html_content = app.gerar_html_fluxo_caixa(dados_filtrados)
-        st.components.v1.html(html_content, height=700, scrolling=True)
+        # Gera HTML só da página visível (subtotais e totais são do recorte inteiro)
+        visao = app.preparar_visao_fluxo(dados_filtrados)
+        exibir_fluxo(app, visao, "analises", 700)
     else:
         st.warning("Nenhum dado encontrado para os filtros aplicados.")
 
@@ -1679,8 +2680,8 @@ def pagina_renegociacao_prioridade(app):
         st.error("Dados não carregados!")
         return
     
-    # Ordena por prioridade e data de renegociação
-    app.ordenar_por_prioridade_e_renegociacao()
+    # Ordena por prioridade e data de renegociação (só se a ordem não estiver válida)
+    app.garantir_ordenacao()
     
     # Filtro por prioridade
     col1, col2 = st.columns([3, 1])
@@ -1706,7 +2707,7 @@ def pagina_renegociacao_prioridade(app):
         # Seletor de registro
         opcoes_registro = []
         for idx, row in dados_display.head(50).iterrows():  # Limita a 50 para performance
-            data_efetiva = app.obter_data_efetiva(row)
+            data_efetiva = row['Data Efetiva']
             valor_formatado = app.formatar_valor_brasileiro(row['Valor'])
             opcoes_registro.append(f"{idx} - {row['Razão Social']} - {data_efetiva.strftime('%Y-%m-%d')} - {valor_formatado}")
         
@@ -1752,7 +2753,7 @@ def pagina_renegociacao_prioridade(app):
                 
                 with col_sit2:
                     valor_item = app.dados.loc[idx_selecionado, 'Valor']
-                    st.metric("Valor do Item", f"R$ {valor_item:,.2f}")
+                    st.metric("Valor do Item", formatar_moeda(valor_item))
                 
                 # Campo de descrição da negociação
                 st.markdown("**📝 Descrição da Negociação**")
@@ -1826,7 +2827,7 @@ def pagina_renegociacao_prioridade(app):
                     diferenca = novo_valor - valor_atual
                     if diferenca != 0:
                         cor_dif = "🟢" if diferenca > 0 else "🔴"
-                        st.info(f"{cor_dif} Diferença: R$ {diferenca:,.2f}")
+                        st.info(f"{cor_dif} Diferença: {formatar_moeda(diferenca)}")
                 
                 with col_alt2:
                     justificativa = st.selectbox(
@@ -1861,7 +2862,7 @@ def pagina_renegociacao_prioridade(app):
                         valor_por_parcela = novo_valor / num_parcelas
                         st.metric(
                             "💰 Valor por Parcela", 
-                            f"R$ {valor_por_parcela:,.2f}",
+                            formatar_moeda(valor_por_parcela),
                             delta=f"{num_parcelas} parcelas"
                         )
                     
@@ -1923,7 +2924,7 @@ def pagina_renegociacao_prioridade(app):
                         diferenca_total = abs(total_parcelas - novo_valor)
                         
                         if diferenca_total > 0.01:  # Tolerância de 1 centavo
-                            st.warning(f"⚠️ Total das parcelas (R$ {total_parcelas:,.2f}) difere do novo valor (R$ {novo_valor:,.2f})")
+                            st.warning(f"⚠️ Total das parcelas ({formatar_moeda(total_parcelas)}) difere do novo valor ({formatar_moeda(novo_valor)})")
                         else:
                             st.success("✅ Total das parcelas confere com o novo valor")
                 
@@ -1935,23 +2936,19 @@ def pagina_renegociacao_prioridade(app):
                         # Captura situação anterior para comparar
                         situacao_anterior = app.dados.loc[idx_selecionado, 'Situacao'] if 'Situacao' in app.dados.columns else None
                         
-                        # Atualiza data e prioridade
+                        usuario = st.session_state.get('username')
+                        
+                        # Atualiza data e prioridade (cada edição vai para o diário)
                         if nova_data_renegociacao:
-                            app.dados.loc[idx_selecionado, 'Data Renegociacao'] = pd.to_datetime(nova_data_renegociacao)
+                            app.registrar_edicao(idx_selecionado, 'Data Renegociacao', pd.to_datetime(nova_data_renegociacao), usuario)
                         else:
-                            app.dados.loc[idx_selecionado, 'Data Renegociacao'] = pd.NaT
+                            app.registrar_edicao(idx_selecionado, 'Data Renegociacao', pd.NaT, usuario)
                         
-                        app.dados.loc[idx_selecionado, 'Prioridade'] = nova_prioridade
+                        app.registrar_edicao(idx_selecionado, 'Prioridade', nova_prioridade, usuario)
                         
-                        # Adiciona colunas se não existirem
-                        if 'Situacao' not in app.dados.columns:
-                            app.dados['Situacao'] = None
-                        if 'Descricao_Negociacao' not in app.dados.columns:
-                            app.dados['Descricao_Negociacao'] = None
-                        
-                        # Atualiza situação e descrição
-                        app.dados.loc[idx_selecionado, 'Situacao'] = nova_situacao
-                        app.dados.loc[idx_selecionado, 'Descricao_Negociacao'] = nova_descricao.strip() if nova_descricao.strip() else None
+                        # Atualiza situação e descrição (colunas são criadas se não existirem)
+                        app.registrar_edicao(idx_selecionado, 'Situacao', nova_situacao, usuario)
+                        app.registrar_edicao(idx_selecionado, 'Descricao_Negociacao', nova_descricao.strip() if nova_descricao.strip() else None, usuario)
                         
                         # Processa alteração de valor - SEMPRE atualiza se valor mudou OU se for parcelamento
                         mensagens_valor = []
@@ -1961,126 +2958,19 @@ def pagina_renegociacao_prioridade(app):
                             
                             if justificativa == "Parcelamento":
                                 st.info("🔄 Iniciando processo de parcelamento...")
-                                try:
-                                    # Verifica se parcelas_dados foi criado
-                                    if not parcelas_dados:
-                                        st.error("❌ Erro: Configure as parcelas antes de salvar!")
-                                        st.stop()
-                                    
-                                    # Remove o registro original e cria novos para cada parcela
-                                    registro_original = app.dados.loc[idx_selecionado].copy()
-                                    
-                                    # Salva informações de controle do parcelamento
-                                    alteracoes_parcelamento = []
-                                    info_parcelamento = {
-                                        'tipo_operacao': 'parcelamento',
-                                        'registro_original_id': app._gerar_id_registro(registro_original),
-                                        'valor_original': float(valor_atual),
-                                        'valor_novo_total': float(novo_valor),
-                                        'quantidade_parcelas': int(num_parcelas),
-                                        'data_primeira_parcela': data_primeira_parcela.strftime('%Y-%m-%d'),
-                                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                        'descricao_parcelamento': nova_descricao.strip() if nova_descricao.strip() else 'Parcelamento',
-                                        'situacao': nova_situacao,
-                                        'prioridade': nova_prioridade
-                                    }
-                                
-                                except Exception as e:
-                                    st.error(f"❌ Erro ao preparar parcelamento: {e}")
+                                # Verifica se parcelas_dados foi criado
+                                if not parcelas_dados:
+                                    st.error("❌ Erro: Configure as parcelas antes de salvar!")
                                     st.stop()
                                 
                                 try:
-                                    # Atualiza o registro original para se tornar a 1ª parcela
-                                    primeira_parcela = parcelas_dados[0]
-                                    
-                                    # Atualiza o registro original com dados da 1ª parcela
-                                    app.dados.loc[idx_selecionado, 'Valor'] = float(primeira_parcela['valor'])
-                                    app.dados.loc[idx_selecionado, 'Vencto Real'] = pd.to_datetime(primeira_parcela['data'])
-                                    app.dados.loc[idx_selecionado, 'Descricao_Negociacao'] = f"PARCELA {primeira_parcela['numero']} - {nova_descricao.strip() if nova_descricao.strip() else 'Parcelamento'}"
-                                    app.dados.loc[idx_selecionado, 'Historico'] = f"PARC {primeira_parcela['numero']} - {registro_original.get('Historico', '')}"
-                                    app.dados.loc[idx_selecionado, 'Parcela'] = primeira_parcela['numero']
-                                    app.dados.loc[idx_selecionado, 'Situacao'] = nova_situacao
-                                    app.dados.loc[idx_selecionado, 'Prioridade'] = nova_prioridade
-                                    
-                                    # Adiciona campos de controle à 1ª parcela (registro original)
-                                    parcela_id_original = app._gerar_id_registro(app.dados.loc[idx_selecionado])
-                                    app.dados.loc[idx_selecionado, 'ID_Parcela'] = parcela_id_original
-                                    app.dados.loc[idx_selecionado, 'ID_Parcelamento_Original'] = info_parcelamento['registro_original_id']
-                                    
-                                    # Cria novos registros apenas para as parcelas 2, 3, 4, etc.
-                                    novos_registros = []
-                                    parcelas_info = []
-                                    
-                                    # Registra informações da 1ª parcela (registro original modificado)
-                                    parcela_info_original = {
-                                        'numero_parcela': primeira_parcela['numero'],
-                                        'valor_parcela': float(primeira_parcela['valor']),
-                                        'data_vencimento': primeira_parcela['data'].strftime('%Y-%m-%d'),
-                                        'id_parcela': parcela_id_original,
-                                        'status_parcela': 'criada_original',
-                                        'fornecedor': str(registro_original.get('Razão Social', '')),
-                                        'filial': str(registro_original.get('Filial', '')),
-                                        'titulo_original': str(registro_original.get('No. Titulo', ''))
-                                    }
-                                    parcelas_info.append(parcela_info_original)
-                                    
-                                    # Cria registros para parcelas 2 em diante
-                                    for i, parcela in enumerate(parcelas_dados[1:], start=1):  # Pula a primeira parcela
-                                        novo_registro = registro_original.copy()
-                                        novo_registro['Valor'] = float(parcela['valor'])
-                                        novo_registro['Vencto Real'] = pd.to_datetime(parcela['data'])
-                                        novo_registro['Descricao_Negociacao'] = f"PARCELA {parcela['numero']} - {nova_descricao.strip() if nova_descricao.strip() else 'Parcelamento'}"
-                                        novo_registro['Historico'] = f"PARC {parcela['numero']} - {registro_original.get('Historico', '')}"
-                                        novo_registro['Parcela'] = parcela['numero']
-                                        novo_registro['Situacao'] = nova_situacao
-                                        novo_registro['Prioridade'] = nova_prioridade
-                                        
-                                        # Gera ID único para cada parcela adicional
-                                        parcela_id = app._gerar_id_registro(novo_registro)
-                                        novo_registro['ID_Parcela'] = parcela_id
-                                        novo_registro['ID_Parcelamento_Original'] = info_parcelamento['registro_original_id']
-                                        
-                                        novos_registros.append(novo_registro)
-                                        
-                                        # Registra informações da parcela para controle
-                                        parcela_info = {
-                                            'numero_parcela': parcela['numero'],
-                                            'valor_parcela': float(parcela['valor']),
-                                            'data_vencimento': parcela['data'].strftime('%Y-%m-%d'),
-                                            'id_parcela': parcela_id,
-                                            'status_parcela': 'criada_nova',
-                                            'fornecedor': str(novo_registro.get('Razão Social', '')),
-                                            'filial': str(novo_registro.get('Filial', '')),
-                                            'titulo_original': str(novo_registro.get('No. Titulo', ''))
-                                        }
-                                        parcelas_info.append(parcela_info)
-                                    
-                                    # Adiciona informações das parcelas ao controle geral
-                                    info_parcelamento['parcelas'] = parcelas_info
-                                    alteracoes_parcelamento.append(info_parcelamento)
+                                    # Alteração do original, novas parcelas, ordenação e gravação numa só operação do app
+                                    salvo, mensagens_valor = app.parcelar_registro(
+                                        idx_selecionado, parcelas_dados, novo_valor, data_primeira_parcela,
+                                        nova_descricao.strip(), nova_situacao, nova_prioridade
+                                    )
                                     
-                                    # Adiciona os novos registros ao DataFrame (apenas parcelas 2+)
-                                    if novos_registros:
-                                        df_novos = pd.DataFrame(novos_registros)
-                                        app.dados = pd.concat([app.dados, df_novos], ignore_index=True)
-                                        
-                                        # Salva registro de controle do parcelamento
-                                        if app._salvar_controle_parcelamento(alteracoes_parcelamento):
-                                            mensagens_valor.append(f"✅ Registro original transformado na 1ª parcela")
-                                            mensagens_valor.append(f"✅ Criados {len(novos_registros)} novos registros para parcelas adicionais")
-                                            mensagens_valor.append(f"📋 Registro de controle salvo para consulta futura")
-                                        else:
-                                            st.error("❌ Erro ao salvar controle de parcelamento!")
-                                    else:
-                                        # Apenas 1 parcela, só modifica o registro original
-                                        if app._salvar_controle_parcelamento(alteracoes_parcelamento):
-                                            mensagens_valor.append(f"✅ Registro original atualizado (parcela única)")
-                                            mensagens_valor.append(f"📋 Registro de controle salvo para consulta futura")
-                                    
-                                    # CRUCIAL: Salva os dados após o parcelamento
-                                    app.ordenar_por_prioridade_e_renegociacao()
-                                    
-                                    if app.salvar_dados_json():
+                                    if salvo:
                                         st.success("✅ Parcelamento realizado com sucesso!")
                                         for msg in mensagens_valor:
                                             st.info(f"📊 {msg}")
@@ -2098,18 +2988,18 @@ def pagina_renegociacao_prioridade(app):
                                 # Atualiza o valor sempre que houver mudança (não parcelamento)
                                 if novo_valor != valor_atual:
                                     diferenca = novo_valor - valor_atual
-                                    app.dados.loc[idx_selecionado, 'Valor'] = novo_valor
+                                    app.registrar_edicao(idx_selecionado, 'Valor', novo_valor, usuario)
                                 
                                 # Adiciona justificativa à descrição se foi selecionada e não é "Sem Alteração"
                                 if justificativa != "Sem Alteração":
                                     desc_atual = app.dados.loc[idx_selecionado, 'Descricao_Negociacao'] or ""
-                                    justif_texto = f" | {justificativa.upper()}: {diferenca:+,.2f}"
+                                    justif_texto = f" | {justificativa.upper()}: {formatar_moeda(diferenca, simbolo=False, sinal=True)}"
                                     nova_desc_completa = f"{nova_descricao.strip()}{justif_texto}" if nova_descricao.strip() else justificativa
-                                    app.dados.loc[idx_selecionado, 'Descricao_Negociacao'] = nova_desc_completa[:200]  # Limita a 200 chars
-                                    mensagens_valor.append(f"💰 Valor alterado: {justificativa} de R$ {diferenca:+,.2f}")
+                                    app.registrar_edicao(idx_selecionado, 'Descricao_Negociacao', nova_desc_completa[:200], usuario)  # Limita a 200 chars
+                                    mensagens_valor.append(f"💰 Valor alterado: {justificativa} de {formatar_moeda(diferenca, sinal=True)}")
                                 else:
                                     # Valor alterado sem justificativa específica
-                                    mensagens_valor.append(f"💰 Valor alterado de R$ {valor_atual:,.2f} para R$ {novo_valor:,.2f}")
+                                    mensagens_valor.append(f"💰 Valor alterado de {formatar_moeda(valor_atual)} para {formatar_moeda(novo_valor)}")
                         
                         # Atualiza saldo se houve mudança de situação (apenas se não foi parcelamento)
                         mensagens = []
@@ -2124,12 +3014,12 @@ def pagina_renegociacao_prioridade(app):
                         
                         # Se não houve alteração de valor nem parcelamento, mas há outras alterações
                         
-                        # Reordena e recalcula subtotal (apenas se não foi parcelamento)
+                        # Reposiciona o registro editado e ajusta o subtotal (apenas se não foi parcelamento)
                         if justificativa != "Parcelamento":
-                            app.ordenar_por_prioridade_e_renegociacao()
+                            app.reposicionar_registros_editados()
                             
-                            # Salva no JSON
-                            if app.salvar_dados_json():
+                            # As edições já estão no diário; a base JSON é compactada em segundo plano
+                            if app.concluir_edicoes():
                                 st.success("✅ Alterações salvas com sucesso!")
                                 for msg in mensagens:
                                     st.info(f"💰 {msg}")
@@ -2142,24 +3032,27 @@ def pagina_renegociacao_prioridade(app):
                 
                 with col2:
                     if st.button("🗑️ Limpar Renegociação", key=f"limpar_{idx_selecionado}"):
-                        app.dados.loc[idx_selecionado, 'Data Renegociacao'] = pd.NaT
-                        app.dados.loc[idx_selecionado, 'Prioridade'] = None
-                        if app.salvar_dados_json():
+                        usuario = st.session_state.get('username')
+                        app.registrar_edicao(idx_selecionado, 'Data Renegociacao', pd.NaT, usuario)
+                        app.registrar_edicao(idx_selecionado, 'Prioridade', None, usuario)
+                        app.reposicionar_registros_editados()
+                        if app.concluir_edicoes():
                             st.success("Registro limpo!")
                             st.rerun()
                 
                 with col3:
                     if st.button("💾 Salvar Todos os Dados", key="salvar_todos"):
-                        if app.salvar_dados_json():
+                        if app.salvar_dados_json(forcar=True):
                             st.success("Todos os dados salvos em JSON!")
     
     # Exibição em HTML ao invés de DataFrame
     st.subheader("📋 Lista Ordenada por Prioridade e Data de Renegociação")
     
     if len(dados_display) > 0:
-        # Gera HTML dos dados
-        html_content = app.gerar_html_fluxo_caixa(dados_display)
-        st.components.v1.html(html_content, height=800, scrolling=True)
+        # Sem filtro usa a ordenação e os subtotais mantidos pelo app; gera HTML só da página visível
+        filtrado = mostrar_apenas_prioridade or prioridade_filtro != 'Todas'
+        visao = app.preparar_visao_fluxo(dados_display if filtrado else None)
+        exibir_fluxo(app, visao, "renegociacao", 800)
     
     # Legenda de cores
     st.subheader("🎨 Legenda de Prioridades")
@@ -2216,9 +3109,12 @@ def pagina_gerenciar_arquivos(app):
         col1, col2 = st.columns([3, 1])
         
         with col1:
+            opcoes_arquivo = ["Arquivo padrão"] + arquivos_disponiveis
+            arquivo_atual = os.path.basename(arquivo_excel_da_sessao())
             arquivo_selecionado = st.selectbox(
                 "Selecione um arquivo para carregar:",
-                options=["Arquivo padrão"] + arquivos_disponiveis,
+                options=opcoes_arquivo,
+                index=opcoes_arquivo.index(arquivo_atual) if arquivo_atual in arquivos_disponiveis else 0,
                 help="Escolha um arquivo da pasta uploads ou use o arquivo padrão"
             )
         
@@ -2227,29 +3123,29 @@ def pagina_gerenciar_arquivos(app):
                 if arquivo_selecionado == "Arquivo padrão":
                     st.info("📁 Carregando arquivo padrão...")
                     # Usa arquivo padrão
-                    app.arquivo_excel = "Previsão de fluxo de caixa projetado até dezembro_2025.xlsx"
+                    arquivo_excel = FluxoCaixaApp.ARQUIVO_EXCEL_PADRAO
                 else:
                     st.info(f"📁 Carregando {arquivo_selecionado}...")
                     # Usa arquivo selecionado
-                    app.arquivo_excel = os.path.join(app.pasta_uploads, arquivo_selecionado)
+                    arquivo_excel = os.path.join(app.pasta_uploads, arquivo_selecionado)
                 
-                # Recarrega os dados
+                # A escolha vale só para esta sessão: cada arquivo tem o seu app residente
+                # (as demais sessões continuam no arquivo que escolheram)
+                st.session_state['arquivo_excel'] = arquivo_excel
                 try:
-                    dados_excel, msg = app.carregar_dados_excel()
-                    if dados_excel is not None:
-                        # Atualiza dados no app
-                        dados_json = app.carregar_dados_json()
-                        app.dados = app.atualizar_campos_renegociacao_prioridade(dados_excel, dados_json)
-                        app.dados = app.dados.dropna(subset=['Vencto Real'])
-                        app.ordenar_por_prioridade_e_renegociacao()
-                        app.salvar_dados_json()
-                        
-                        st.success(f"✅ Dados carregados com sucesso! Total: {len(app.dados)} registros")
+                    app_arquivo = obter_app_residente(arquivo_excel)
+                    sucesso, msg = app_arquivo.garantir_dados_atualizados()
+                    if sucesso:
+                        st.success(f"✅ Dados carregados com sucesso! Total: {len(app_arquivo.dados)} registros")
                     else:
                         st.error(f"❌ Erro ao carregar arquivo: {msg}")
                 except Exception as e:
                     st.error(f"❌ Erro ao processar arquivo: {str(e)}")
         
+        if st.button("🧹 Limpar Cache de Planilhas", help="Força uma nova leitura dos arquivos Excel"):
+            app.cache_planilhas.invalidar()
+            st.success("✅ Cache de planilhas limpo!")
+        
         # Lista dos arquivos disponíveis
         st.subheader("📂 Arquivos na pasta uploads:")
         for i, arquivo in enumerate(arquivos_disponiveis, 1):
@@ -2381,7 +3277,7 @@ def pagina_saldos_bancarios(app):
         
         # Mostra total calculado
         total_calculado = saldo_bradesco + saldo_bb + saldo_reag
-        st.markdown(f"**💸 Total Disponível: R$ {total_calculado:,.2f}**")
+        st.markdown(f"**💸 Total Disponível: {formatar_moeda(total_calculado)}**")
         
         # Botão para salvar
         submitted = st.form_submit_button("💾 Salvar Saldos", type="primary")
@@ -2411,14 +3307,14 @@ def pagina_saldos_bancarios(app):
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("💰 Saldo Total", f"R$ {disponibilidade['saldo_inicial']:,.2f}")
+                st.metric("💰 Saldo Total", formatar_moeda(disponibilidade['saldo_inicial']))
             
             with col2:
-                st.metric("💸 Saldo Final", f"R$ {disponibilidade['saldo_restante']:,.2f}")
+                st.metric("💸 Saldo Final", formatar_moeda(disponibilidade['saldo_restante']))
             
             with col3:
                 total_comprometido = disponibilidade['saldo_inicial'] - disponibilidade['saldo_restante']
-                st.metric("📋 Total Comprometido", f"R$ {total_comprometido:,.2f}")
+                st.metric("📋 Total Comprometido", formatar_moeda(total_comprometido))
             
             # Detalhamento por prioridade
             st.subheader("🎯 Detalhamento por Prioridade")
@@ -2458,10 +3354,10 @@ def pagina_saldos_bancarios(app):
                                     {cor_saldo} Prioridade {prioridade}
                                 </h4>
                                 <div style="margin: 8px 0; color: {cor_texto}; font-size: 21px; font-weight: 600;">
-                                    Saldo Antes: R$ {saldo_antes:,.2f} - Valor P{prioridade}: R$ {valor_prioridade:,.2f}
+                                    Saldo Antes: {formatar_moeda(saldo_antes)} - Valor P{prioridade}: {formatar_moeda(valor_prioridade)}
                                 </div>
                                 <h2 style="margin: 5px 0; color: {cor_texto};">
-                                    = R$ {saldo_apos_prioridade:,.2f}
+                                    = {formatar_moeda(saldo_apos_prioridade)}
                                 </h2>
                             </div>
                             """, unsafe_allow_html=True)
@@ -2511,10 +3407,10 @@ def pagina_saldos_bancarios(app):
                             {cor_saldo} Sem Prioridade ({info_sem_prioridade['quantidade_itens']} itens)
                         </h4>
                         <div style="margin: 8px 0; color: {cor_texto}; font-size: 21px; font-weight: 600;">
-                            Saldo Antes: R$ {saldo_antes_sem_prioridade:,.2f} - Valor Sem Prioridade: R$ {valor_sem_prioridade:,.2f}
+                            Saldo Antes: {formatar_moeda(saldo_antes_sem_prioridade)} - Valor Sem Prioridade: {formatar_moeda(valor_sem_prioridade)}
                         </div>
                         <h2 style="margin: 5px 0; color: {cor_texto};">
-                            = R$ {saldo_apos_sem_prioridade:,.2f}
+                            = {formatar_moeda(saldo_apos_sem_prioridade)}
                         </h2>
                     </div>
                     """, unsafe_allow_html=True)
@@ -2529,20 +3425,20 @@ def pagina_saldos_bancarios(app):
                         col1, col2, col3, col4 = st.columns(4)
                         
                         with col1:
-                            st.metric("💰 Valor Total", f"R$ {info_prior['valor_total']:,.2f}")
+                            st.metric("💰 Valor Total", formatar_moeda(info_prior['valor_total']))
                         
                         with col2:
                             st.metric("📊 Quantidade", info_prior['quantidade_itens'])
                         
                         with col3:
-                            st.metric("⚡ Saldo Antes", f"R$ {info_prior['saldo_antes']:,.2f}")
+                            st.metric("⚡ Saldo Antes", formatar_moeda(info_prior['saldo_antes']))
                         
                         with col4:
                             cor = "normal" if info_prior['suficiente'] else "inverse"
                             delta_color = "normal" if info_prior['saldo_depois'] >= 0 else "inverse"
                             st.metric(
                                 "🎯 Saldo Depois", 
-                                f"R$ {info_prior['saldo_depois']:,.2f}",
+                                formatar_moeda(info_prior['saldo_depois']),
                                 delta=f"{'✅ Suficiente' if info_prior['suficiente'] else '❌ Insuficiente'}"
                             )
             
@@ -2572,7 +3468,7 @@ def pagina_saldos_bancarios(app):
                 x=categorias,
                 y=valores,
                 marker_color=cores,
-                text=[f'R$ {v:,.0f}' for v in valores],
+                text=list(formatar_moedas(valores, casas=0)),
                 textposition='auto'
             ))
             
@@ -2603,11 +3499,11 @@ def main():
     # Verifica autenticação
     verificar_autenticacao()
     
-    # Inicializa o app
-    app = FluxoCaixaApp()
+    # Obtém o app residente do arquivo desta sessão (compartilhado entre sessões e reruns)
+    app = obter_app_residente(arquivo_excel_da_sessao())
     
-    # Carrega os dados
-    sucesso, mensagem = app.inicializar_dados()
+    # Sincroniza os dados apenas se os arquivos de origem mudaram
+    sucesso, mensagem = app.garantir_dados_atualizados()
     
     if not sucesso:
         st.error(f"Erro ao carregar dados: {mensagem}")
@@ -2657,8 +3553,7 @@ def pagina_controle_parcelamentos(app):
         return
     
     try:
-        with open(arquivo_controle, 'r', encoding='utf-8') as f:
-            dados_parcelamentos = json.load(f)
+        dados_parcelamentos = ler_json(arquivo_controle, padrao=[])
     except Exception as e:
         st.error(f"❌ Erro ao carregar dados de parcelamentos: {e}")
         return
@@ -2726,13 +3621,13 @@ def pagina_controle_parcelamentos(app):
             with col_info1:
                 st.metric(
                     "💰 Valor Original", 
-                    f"R$ {parcelamento.get('valor_original', 0):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+                    formatar_moeda(parcelamento.get('valor_original', 0))
                 )
             
             with col_info2:
                 st.metric(
                     "💳 Valor Total Parcelado",
-                    f"R$ {parcelamento.get('valor_novo_total', 0):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+                    formatar_moeda(parcelamento.get('valor_novo_total', 0))
                 )
             
             with col_info3:
@@ -2757,9 +3652,7 @@ def pagina_controle_parcelamentos(app):
                 
                 # Formata valores para exibição
                 df_display = df_parcelas.copy()
-                df_display['valor_parcela_fmt'] = df_display['valor_parcela'].apply(
-                    lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                )
+                df_display['valor_parcela_fmt'] = formatar_moedas(df_display['valor_parcela'])
                 
                 # Renomeia colunas para exibição
                 df_display = df_display.rename(columns={
@@ -2803,13 +3696,16 @@ def pagina_controle_parcelamentos(app):
                 with col_btn3:
                     if st.button(f"🗑️ Remover Parcelamento", key=f"remover_{idx}", type="secondary"):
                         if st.checkbox(f"⚠️ Confirmar remoção", key=f"confirma_remocao_{idx}"):
-                            # Remove parcelamento da lista
-                            dados_parcelamentos.pop(idx)
+                            # Remove o parcelamento relendo o arquivo sob bloqueio, para não
+                            # descartar parcelamentos gravados por outra sessão nesse meio tempo
+                            def remover_parcelamento(dados_atuais, removido=parcelamento):
+                                dados_atuais = list(dados_atuais or [])
+                                if removido in dados_atuais:
+                                    dados_atuais.remove(removido)
+                                return dados_atuais
                             
-                            # Salva arquivo atualizado
                             try:
-                                with open(arquivo_controle, 'w', encoding='utf-8') as f:
-                                    json.dump(dados_parcelamentos, f, ensure_ascii=False, indent=2)
+                                atualizar_json(arquivo_controle, remover_parcelamento, padrao=[])
                                 st.success("✅ Parcelamento removido com sucesso!")
                                 st.rerun()
                             except Exception as e:
@@ -2840,19 +3736,19 @@ def pagina_controle_parcelamentos(app):
         with col_stat3:
             st.metric(
                 "💰 Valor Original Total",
-                f"R$ {valor_total_original:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+                formatar_moeda(valor_total_original)
             )
         
         with col_stat4:
             st.metric(
                 "💳 Valor Parcelado Total",
-                f"R$ {valor_total_parcelado:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+                formatar_moeda(valor_total_parcelado)
             )
 
 def pagina_leitura_extratos(app):
     """Página para leitura e processamento de extratos bancários"""
     st.title("🏦 Leitura dos Extratos")
-    st.write("Esta página processa automaticamente extratos do Bradesco da pasta 'extratos'.")
+    st.write("Esta página processa automaticamente os extratos do Bradesco, do Banco do Brasil e do REAG da pasta 'extratos'.")
     
     # Cria pasta extratos se não existir
     if not os.path.exists("extratos"):
@@ -2861,11 +3757,11 @@ def pagina_leitura_extratos(app):
     # Informações sobre o processamento
     st.subheader("📋 Regras de Processamento")
     st.info("""
-    **Critérios para arquivos do Bradesco:**
-    - Nome do arquivo deve conter 'bradesco' (maiúscula ou minúscula)
-    - Leitura inicia na linha 10
-    - Colunas processadas: Data, Lançamento, Dcto, Crédito, Débito
-    - Processamento termina na linha que contém 'Total'
+    **Reconhecimento dos arquivos:**
+    - O banco é identificado pelo conteúdo das primeiras linhas (cabeçalho ou título); o nome do arquivo só desempata
+    - **Bradesco:** colunas Data, Lançamento, Dcto, Crédito e Débito, até a linha 'Total'
+    - **Banco do Brasil:** colunas Data, Histórico, Valor e Inf. (C/D); a linha "S A L D O" é ignorada
+    - **REAG:** colunas Identificador, Data/Hora, Histórico, Descrição, Valor (com sinal) e Saldo
     - Conversão automática: datas e valores monetários
     """)
     
@@ -2879,7 +3775,7 @@ def pagina_leitura_extratos(app):
         st.subheader("📁 Como adicionar extratos")
         st.write("""
         1. Coloque os arquivos Excel na pasta: `extratos/`
-        2. Certifique-se que arquivos do Bradesco contenham 'bradesco' no nome
+        2. Use os arquivos exportados pelo Bradesco, Banco do Brasil ou REAG, sem alterar o layout
         3. Clique em 'Processar Extratos' para analisar
         """)
         return
@@ -2889,104 +3785,129 @@ def pagina_leitura_extratos(app):
     
     col1, col2 = st.columns([3, 1])
     
+    # Banco de cada arquivo (a amostra de cada versão do arquivo é lida uma só vez)
+    bancos = {arquivo: app.identificar_banco_extrato(os.path.join("extratos", arquivo)) for arquivo in arquivos}
+    
     with col1:
-        for arquivo in arquivos:
-            caminho_completo = os.path.join("extratos", arquivo)
-            eh_bradesco = app.verificar_arquivo_bradesco(caminho_completo)
-            
-            if eh_bradesco:
-                st.success(f"✅ {arquivo} (Bradesco)")
+        for arquivo, banco in bancos.items():
+            if banco is not None:
+                st.success(f"✅ {arquivo} ({banco})")
             else:
                 st.info(f"ℹ️ {arquivo} (Não será processado)")
     
     with col2:
         st.metric("Total", len(arquivos))
-        bradesco_count = sum(1 for arquivo in arquivos if app.verificar_arquivo_bradesco(os.path.join("extratos", arquivo)))
-        st.metric("Bradesco", bradesco_count)
+        for parser in PARSERS.values():
+            st.metric(parser.tipo, sum(1 for banco in bancos.values() if banco == parser.tipo))
     
-    # Botão para processar
+    # Botão para processar (o resultado fica na sessão para os filtros e o "carregar mais" sobreviverem aos reruns)
     if st.button("🔄 Processar Extratos", type="primary"):
-        with st.spinner("Processando extratos do Bradesco..."):
-            dados, erros = app.processar_todos_extratos()
-            
-            if dados is not None:
-                st.success(f"✅ Processamento concluído! Total de {len(dados)} transações encontradas.")
-                
-                # Exibe estatísticas
-                st.subheader("📊 Resumo dos Dados Processados")
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric("Total Transações", len(dados))
-                
-                with col2:
-                    total_credito = dados['Credito'].sum()
-                    st.metric("Total Créditos", f"R$ {total_credito:,.2f}")
-                
-                with col3:
-                    total_debito = dados['Debito'].sum()
-                    st.metric("Total Débitos", f"R$ {total_debito:,.2f}")
-                
-                with col4:
-                    # Usa o último saldo da série como saldo final
-                    ultimo_saldo = dados['Saldo'].iloc[-1] if len(dados) > 0 else 0
-                    st.metric("Saldo Final", f"R$ {ultimo_saldo:,.2f}")
-                
-                # Filtros
-                st.subheader("🔍 Filtros")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Filtro por período
-                    data_min = dados['Data'].min().date()
-                    data_max = dados['Data'].max().date()
-                    
-                    data_inicio = st.date_input("Data Início", data_min)
-                    data_fim = st.date_input("Data Fim", data_max)
-                
-                with col2:
-                    # Filtro por arquivo origem
-                    arquivos_origem = ['Todos'] + sorted(dados['Arquivo_Origem'].unique().tolist())
-                    arquivo_selecionado = st.selectbox("Arquivo de Origem", arquivos_origem)
-                
-                # Aplica filtros
-                dados_filtrados = dados.copy()
-                dados_filtrados = dados_filtrados[
-                    (dados_filtrados['Data'].dt.date >= data_inicio) &
-                    (dados_filtrados['Data'].dt.date <= data_fim)
-                ]
-                
-                if arquivo_selecionado != 'Todos':
-                    dados_filtrados = dados_filtrados[dados_filtrados['Arquivo_Origem'] == arquivo_selecionado]
-                
-                # Exibe dados filtrados em HTML
-                st.subheader(f"📋 Extratos Processados ({len(dados_filtrados)} transações)")
-                
-                if len(dados_filtrados) > 0:
-                    # Gera HTML dos extratos
-                    html_extratos = app.gerar_html_extratos(dados_filtrados)
-                    st.components.v1.html(html_extratos, height=600, scrolling=True)
-                    
-                    # Botão para download
-                    csv = dados_filtrados.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download CSV",
-                        data=csv,
-                        file_name=f"extratos_processados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
-                    )
-                else:
-                    st.warning("Nenhuma transação encontrada com os filtros aplicados.")
-                
-                # Mostra erros se houver
-                if erros:
-                    st.subheader("⚠️ Erros Encontrados")
-                    for erro in erros:
-                        st.error(erro)
-            else:
-                st.error(f"❌ Erro no processamento: {erros}")
+        barra = st.progress(0.0, text="Processando extratos...")
+        
+        def ao_progresso(concluidos, total, arquivo):
+            barra.progress(concluidos / total, text=f"📄 {arquivo} ({concluidos}/{total})")
+        
+        st.session_state['extratos_processados'] = app.processar_todos_extratos(ao_progresso)
+        barra.empty()
+    
+    if 'extratos_processados' in st.session_state:
+        dados, erros = st.session_state['extratos_processados']
+        exibir_extratos_processados(app, dados, erros)
+
+def exibir_extratos_processados(app, dados, erros):
+    """Resumo, filtros e tabela dos extratos processados (a tabela cresce por blocos com "carregar mais")"""
+    if dados is None:
+        st.error(f"❌ Erro no processamento: {erros}")
+        return
+    
+    st.success(f"✅ Processamento concluído! Total de {len(dados)} transações encontradas.")
+    
+    # Exibe estatísticas
+    st.subheader("📊 Resumo dos Dados Processados")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Total Transações", len(dados))
+    
+    with col2:
+        total_credito = dados['Credito'].sum()
+        st.metric("Total Créditos", formatar_moeda(total_credito))
+    
+    with col3:
+        total_debito = dados['Debito'].sum()
+        st.metric("Total Débitos", formatar_moeda(total_debito))
+    
+    # Saldo final de cada banco (os saldos de bancos diferentes não formam uma única série)
+    saldos = saldos_finais(dados)
+    for coluna, saldo in zip(st.columns(max(len(saldos), 1)), saldos.itertuples(index=False)):
+        with coluna:
+            st.metric(f"Saldo Final {saldo.Banco}", formatar_moeda(saldo.Saldo),
+                      help=f"{saldo.Arquivo_Origem} - último lançamento em {saldo.Data.strftime(FORMATO_DATA_BR)}")
+    
+    # Filtros
+    st.subheader("🔍 Filtros")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Filtro por período
+        data_min = dados['Data'].min().date()
+        data_max = dados['Data'].max().date()
+        
+        data_inicio = st.date_input("Data Início", data_min, key="extratos_data_inicio")
+        data_fim = st.date_input("Data Fim", data_max, key="extratos_data_fim")
+    
+    with col2:
+        # Filtro por arquivo origem
+        arquivos_origem = ['Todos'] + sorted(dados['Arquivo_Origem'].unique().tolist())
+        arquivo_selecionado = st.selectbox("Arquivo de Origem", arquivos_origem, key="extratos_arquivo")
+    
+    # Aplica filtros
+    datas = dados['Data'].dt.date
+    mascara = (datas >= data_inicio) & (datas <= data_fim)
+    if arquivo_selecionado != 'Todos':
+        mascara &= dados['Arquivo_Origem'] == arquivo_selecionado
+    dados_filtrados = dados[mascara]
+    
+    # Exibe dados filtrados em HTML
+    st.subheader(f"📋 Extratos Processados ({len(dados_filtrados)} transações)")
+    
+    if len(dados_filtrados) > 0:
+        # Começa com um bloco de transações; mudar os filtros volta ao primeiro bloco
+        bloco = app.TAMANHO_BLOCO_EXTRATOS
+        filtro = (data_inicio, data_fim, arquivo_selecionado, id(dados))
+        if st.session_state.get('extratos_filtro') != filtro:
+            st.session_state['extratos_filtro'] = filtro
+            st.session_state['extratos_limite'] = bloco
+        limite = min(st.session_state['extratos_limite'], len(dados_filtrados))
+        
+        # Gera HTML só das transações exibidas
+        html_extratos = app.gerar_html_extratos(dados_filtrados, fim=limite)
+        st.components.v1.html(html_extratos, height=600, scrolling=True)
+        
+        if limite < len(dados_filtrados):
+            st.caption(f"Exibindo {limite} de {len(dados_filtrados)} transações")
+            if st.button(f"⬇️ Carregar mais {min(bloco, len(dados_filtrados) - limite)}", key="extratos_carregar_mais"):
+                st.session_state['extratos_limite'] = limite + bloco
+                st.rerun()
+        
+        # Botão para download
+        csv = dados_filtrados.to_csv(index=False)
+        st.download_button(
+            label="📥 Download CSV",
+            data=csv,
+            file_name=f"extratos_processados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+    else:
+        st.warning("Nenhuma transação encontrada com os filtros aplicados.")
+    
+    # Mostra erros se houver
+    if erros:
+        st.subheader("⚠️ Erros Encontrados")
+        for erro in erros:
+            st.error(erro)
 
 if __name__ == "__main__":
     main()
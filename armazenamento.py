@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento - Rota Verde
+Persistência dos registros do fluxo de caixa (JSON + diário ou SQLite)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing, nullcontext
+from datetime import datetime
+
+import pandas as pd
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+# Tempo máximo (segundos) de espera por um bloqueio de arquivo
+TEMPO_LIMITE_BLOQUEIO = 10.0
+
+
+class ArquivoBloqueadoError(TimeoutError):
+    """O bloqueio de um arquivo não foi obtido dentro do tempo limite"""
+
+
+# Bloqueios já obtidos por este processo: caminho do .lock -> estado
+_bloqueios_processo = {}
+_bloqueios_guarda = threading.Lock()
+
+
+def _travar_arquivo(caminho_lock, limite):
+    """Abre o arquivo .lock e obtém o bloqueio exclusivo do SO, tentando até o limite"""
+    arquivo = open(caminho_lock, 'a+b')
+    while True:
+        try:
+            if os.name == 'nt':
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return arquivo
+        except OSError:
+            if time.monotonic() >= limite:
+                arquivo.close()
+                raise ArquivoBloqueadoError(f"Arquivo em uso por outro processo: {caminho_lock}")
+            time.sleep(0.05)
+
+
+def _destravar_arquivo(arquivo):
+    try:
+        if os.name == 'nt':
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+    finally:
+        arquivo.close()
+
+
+class BloqueioArquivo:
+    """Bloqueio consultivo exclusivo de um arquivo (sidecar '<arquivo>.lock')
+
+    Vale entre processos (fcntl/msvcrt) e entre threads do mesmo processo, é
+    reentrante na mesma thread e desiste com ArquivoBloqueadoError depois de
+    `timeout` segundos. Só serializa quem usa o mesmo arquivo.
+    """
+
+    def __init__(self, caminho, timeout=TEMPO_LIMITE_BLOQUEIO):
+        self.caminho_lock = os.path.abspath(caminho) + '.lock'
+        self.timeout = timeout
+
+    def __enter__(self):
+        with _bloqueios_guarda:
+            estado = _bloqueios_processo.setdefault(
+                self.caminho_lock, {'lock': threading.RLock(), 'contagem': 0, 'arquivo': None}
+            )
+        limite = time.monotonic() + self.timeout
+        if not estado['lock'].acquire(timeout=self.timeout):
+            raise ArquivoBloqueadoError(f"Arquivo em uso: {self.caminho_lock}")
+        try:
+            if estado['contagem'] == 0:
+                estado['arquivo'] = _travar_arquivo(self.caminho_lock, limite)
+            estado['contagem'] += 1
+        except BaseException:
+            estado['lock'].release()
+            raise
+        self._estado = estado
+        return self
+
+    def __exit__(self, *exc):
+        estado = self._estado
+        estado['contagem'] -= 1
+        if estado['contagem'] == 0:
+            arquivo, estado['arquivo'] = estado['arquivo'], None
+            _destravar_arquivo(arquivo)
+        estado['lock'].release()
+        return False
+
+
+def gravar_atomico(caminho, conteudo):
+    """Grava bytes em um arquivo temporário, sincroniza e o renomeia sobre o destino
+
+    Leitores veem o conteúdo antigo ou o novo por inteiro, nunca um arquivo truncado.
+    """
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.' + os.path.basename(caminho) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as f:
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    # Sincroniza o diretório para que a renomeação sobreviva a uma queda (POSIX)
+    if os.name != 'nt':
+        descritor_dir = os.open(diretorio, os.O_RDONLY)
+        try:
+            os.fsync(descritor_dir)
+        finally:
+            os.close(descritor_dir)
+
+
+def ler_json(caminho, padrao=None):
+    """Lê um arquivo JSON sob bloqueio; retorna `padrao` se o arquivo não existir"""
+    with BloqueioArquivo(caminho):
+        if not os.path.exists(caminho):
+            return padrao
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def salvar_json(caminho, dados, indent=2):
+    """Grava um JSON de forma atômica e sob bloqueio"""
+    conteudo = json.dumps(dados, ensure_ascii=False, indent=indent).encode('utf-8')
+    with BloqueioArquivo(caminho):
+        gravar_atomico(caminho, conteudo)
+
+
+def atualizar_json(caminho, funcao, padrao=None, indent=2):
+    """Lê, altera com `funcao(dados) -> dados` e regrava um JSON sem soltar o bloqueio
+
+    Evita que duas sessões leiam a mesma versão e uma sobrescreva a alteração da outra.
+    """
+    with BloqueioArquivo(caminho):
+        dados = padrao
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        dados = funcao(dados)
+        gravar_atomico(caminho, json.dumps(dados, ensure_ascii=False, indent=indent).encode('utf-8'))
+        return dados
+
+
+class DiarioEdicoes:
+    """Diário append-only de edições campo a campo (uma linha JSON por edição)
+
+    Cada edição é gravada e sincronizada em disco (fsync) antes de retornar,
+    então o custo de salvar uma alteração não depende do tamanho da base.
+    O diário é reaplicado sobre o JSON base na carga e zerado quando a base
+    é regravada (compactação).
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = BloqueioArquivo(caminho)
+        self._quantidade = None
+        # Ids das edições já refletidas nos dados deste processo
+        self._vistas = set()
+
+    def registrar(self, chave, campo, anterior, novo, usuario=None):
+        """Acrescenta uma edição ao diário e a sincroniza em disco"""
+        entrada = {
+            'id': uuid.uuid4().hex,
+            'chave': chave,
+            'campo': campo,
+            'anterior': anterior,
+            'novo': novo,
+            'usuario': usuario,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        }
+        linha = json.dumps(entrada, ensure_ascii=False, default=str) + '\n'
+
+        with self._lock:
+            with open(self.caminho, 'a', encoding='utf-8') as f:
+                f.write(linha)
+                f.flush()
+                os.fsync(f.fileno())
+            self._vistas.add(entrada['id'])
+            if self._quantidade is not None:
+                self._quantidade += 1
+        return entrada
+
+    def ler(self):
+        """Lê as edições registradas, na ordem em que foram feitas"""
+        if not os.path.exists(self.caminho):
+            return []
+
+        entradas = []
+        with self._lock:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    linha = linha.strip()
+                    if not linha:
+                        continue
+                    try:
+                        entradas.append(json.loads(linha))
+                    except json.JSONDecodeError:
+                        # Última linha incompleta (queda durante a escrita): ignora
+                        continue
+            self._quantidade = len(entradas)
+        return entradas
+
+    def marcar_vistas(self, entradas):
+        """Registra que as edições já foram aplicadas aos dados deste processo"""
+        self._vistas.update(e['id'] for e in entradas if 'id' in e)
+
+    def nao_vistas(self):
+        """Edições gravadas por outros processos e ainda não aplicadas aqui"""
+        return [e for e in self.ler() if 'id' in e and e['id'] not in self._vistas]
+
+    def quantidade(self):
+        """Número de edições pendentes de compactação"""
+        if self._quantidade is None:
+            self.ler()
+        return self._quantidade
+
+    def limpar(self):
+        """Zera o diário (chamado depois que a base foi regravada com as edições)"""
+        with self._lock:
+            if os.path.exists(self.caminho):
+                gravar_atomico(self.caminho, b'')
+            self._vistas.clear()
+            self._quantidade = 0
+
+
+def _serializar_registros(registros):
+    """Codifica os registros como JSON compacto (UTF-8) e retorna (conteúdo, hash)"""
+    conteudo = json.dumps(registros, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return conteudo, hashlib.sha256(conteudo).hexdigest()
+
+
+class ArmazenamentoJSON:
+    """Registros em um único arquivo JSON + diário de edições"""
+
+    nome = 'json'
+    suporta_consulta = False
+
+    def __init__(self, caminho, caminho_diario):
+        self.caminho = caminho
+        self.diario = DiarioEdicoes(caminho_diario)
+        self._hash_salvo = None
+
+    def bloqueio(self):
+        """Bloqueio entre processos que protege o arquivo base e o diário juntos"""
+        return self.diario._lock
+
+    def assinatura(self):
+        """Assinatura (caminho, tamanho, mtime) do arquivo base e do diário"""
+        partes = []
+        for caminho in (self.caminho, self.diario.caminho):
+            try:
+                info = os.stat(caminho)
+                partes.append((os.path.abspath(caminho), info.st_size, info.st_mtime_ns))
+            except OSError:
+                partes.append(None)
+        return tuple(partes)
+
+    def carregar(self):
+        """Lê os registros base; retorna DataFrame ou None se o arquivo não existir"""
+        with self.bloqueio():
+            if not os.path.exists(self.caminho):
+                return None
+            with open(self.caminho, 'rb') as f:
+                conteudo = f.read()
+        registros = json.loads(conteudo.decode('utf-8'))
+        self._hash_salvo = hashlib.sha256(conteudo).hexdigest()
+        return pd.DataFrame(registros)
+
+    def edicoes_pendentes(self):
+        """Edições do diário ainda não incorporadas ao arquivo base"""
+        entradas = self.diario.ler()
+        self.diario.marcar_vistas(entradas)
+        return entradas
+
+    def edicoes_externas(self):
+        """Edições que outros processos gravaram no diário depois da nossa carga"""
+        entradas = self.diario.nao_vistas()
+        self.diario.marcar_vistas(entradas)
+        return entradas
+
+    def quantidade_pendente(self):
+        return self.diario.quantidade()
+
+    def salvar(self, registros):
+        """Regrava o arquivo base (se o conteúdo mudou) e zera o diário
+
+        Retorna True se o arquivo foi regravado e False se a gravação foi pulada.
+        """
+        conteudo, hash_conteudo = _serializar_registros(registros)
+        gravado = False
+        with self.bloqueio():
+            if hash_conteudo != self._hash_salvo or not os.path.exists(self.caminho):
+                gravar_atomico(self.caminho, conteudo)
+                self._hash_salvo = hash_conteudo
+                gravado = True
+
+            # A base agora contém todas as edições do diário
+            self.diario.limpar()
+        return gravado
+
+    def registrar_edicao(self, chave, campo, anterior, novo, usuario=None):
+        """Grava uma edição de campo no diário (append + fsync)
+
+        Retorna False: a edição só chega ao arquivo base na próxima compactação.
+        """
+        self.diario.registrar(chave, campo, anterior, novo, usuario)
+        return False
+
+
+class ArmazenamentoSQLite:
+    """Registros em um banco SQLite (modo WAL) com índices para edição e filtros
+
+    Cada edição de campo vira um UPDATE indexado pela chave do registro, e as
+    páginas podem filtrar direto no banco. Vários processos leem ao mesmo tempo
+    graças ao WAL.
+    """
+
+    nome = 'sqlite'
+    suporta_consulta = True
+    COLUNAS_INDEXADAS = ['Prioridade', 'Vencto Real', 'Data Renegociacao', 'Razão Social']
+
+    def __init__(self, caminho, caminho_legado=None, funcao_chave=None):
+        self.caminho = caminho
+        self.caminho_legado = caminho_legado
+        # Função que calcula a chave do registro a partir de um DataFrame
+        self.funcao_chave = funcao_chave
+        self._lock = threading.Lock()
+        self._inicializar()
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.caminho, timeout=10)
+        conexao.execute('PRAGMA synchronous=NORMAL')
+        return conexao
+
+    @staticmethod
+    def _coluna(nome):
+        """Identificador SQL entre aspas (as colunas têm espaços e acentos)"""
+        return '"' + str(nome).replace('"', '""') + '"'
+
+    def _inicializar(self):
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('CREATE TABLE IF NOT EXISTS registros (id INTEGER PRIMARY KEY, chave TEXT)')
+            conexao.execute('CREATE TABLE IF NOT EXISTS metadados (nome TEXT PRIMARY KEY, valor TEXT)')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS edicoes ('
+                'id INTEGER PRIMARY KEY, chave TEXT, campo TEXT, anterior TEXT, novo TEXT, '
+                'usuario TEXT, timestamp TEXT)'
+            )
+
+            # Chave única: uma colisão falha no INSERT em vez de a edição cair em outro registro
+            conexao.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_registros_chave_unica ON registros (chave)')
+
+    def _colunas_existentes(self, conexao):
+        return [linha[1] for linha in conexao.execute('PRAGMA table_info(registros)')]
+
+    def _garantir_colunas(self, conexao, colunas):
+        """Cria (sem tipo declarado, para preservar '000034' como texto) as colunas que faltam"""
+        existentes = set(self._colunas_existentes(conexao))
+        for coluna in colunas:
+            if coluna not in existentes:
+                conexao.execute(f'ALTER TABLE registros ADD COLUMN {self._coluna(coluna)}')
+                if coluna in self.COLUNAS_INDEXADAS:
+                    indice = self._coluna('idx_registros_' + coluna)
+                    conexao.execute(f'CREATE INDEX IF NOT EXISTS {indice} ON registros ({self._coluna(coluna)})')
+
+    def assinatura(self):
+        """Assinatura do banco e do arquivo WAL"""
+        partes = []
+        for caminho in (self.caminho, self.caminho + '-wal'):
+            try:
+                info = os.stat(caminho)
+                partes.append((os.path.abspath(caminho), info.st_size, info.st_mtime_ns))
+            except OSError:
+                partes.append(None)
+        return tuple(partes)
+
+    def _ler_tabela(self, conexao, where='', parametros=()):
+        colunas = [c for c in self._colunas_existentes(conexao) if c not in ('id', 'chave')]
+        if not colunas:
+            return pd.DataFrame()
+        selecao = ', '.join(self._coluna(c) for c in colunas)
+        cursor = conexao.execute(f'SELECT {selecao} FROM registros {where} ORDER BY id', parametros)
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=colunas)
+
+    def carregar(self):
+        """Lê os registros; na primeira execução importa o JSON legado, se existir"""
+        with closing(self._conectar()) as conexao:
+            vazio = conexao.execute('SELECT COUNT(*) FROM registros').fetchone()[0] == 0
+            if not vazio:
+                return self._ler_tabela(conexao)
+
+        if self.caminho_legado and os.path.exists(self.caminho_legado):
+            with open(self.caminho_legado, 'r', encoding='utf-8') as f:
+                return pd.DataFrame(json.load(f))
+        return None
+
+    def bloqueio(self):
+        # O próprio SQLite serializa as transações de escrita
+        return nullcontext()
+
+    def edicoes_pendentes(self):
+        # Edições já são aplicadas direto no banco
+        return []
+
+    def edicoes_externas(self):
+        return []
+
+    def quantidade_pendente(self):
+        return 0
+
+    def salvar(self, registros):
+        """Substitui todos os registros em uma transação (pulado se o conteúdo não mudou)"""
+        _, hash_conteudo = _serializar_registros(registros)
+        dados = pd.DataFrame(registros)
+        chaves = self.funcao_chave(dados).tolist() if self.funcao_chave and len(dados) else [None] * len(dados)
+        colunas = list(dados.columns)
+
+        with self._lock, closing(self._conectar()) as conexao, conexao:
+            atual = conexao.execute("SELECT valor FROM metadados WHERE nome = 'hash'").fetchone()
+            if atual and atual[0] == hash_conteudo:
+                return False
+
+            self._garantir_colunas(conexao, colunas)
+            conexao.execute('DELETE FROM registros')
+            nomes = ', '.join(['id', 'chave'] + [self._coluna(c) for c in colunas])
+            marcadores = ', '.join(['?'] * (len(colunas) + 2))
+            conexao.executemany(
+                f'INSERT INTO registros ({nomes}) VALUES ({marcadores})',
+                ((i, chave, *(registro.get(c) for c in colunas))
+                 for i, (chave, registro) in enumerate(zip(chaves, registros)))
+            )
+            conexao.execute("INSERT OR REPLACE INTO metadados (nome, valor) VALUES ('hash', ?)", (hash_conteudo,))
+        return True
+
+    def registrar_edicao(self, chave, campo, anterior, novo, usuario=None):
+        """Aplica a edição com um UPDATE pela chave (única) e guarda o histórico
+
+        Retorna True se a edição já está na base e False se nenhum registro tem a
+        chave (o registro só chega ao banco na próxima gravação completa).
+        """
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        with self._lock, closing(self._conectar()) as conexao, conexao:
+            self._garantir_colunas(conexao, [campo])
+            cursor = conexao.execute(
+                f'UPDATE registros SET {self._coluna(campo)} = ? WHERE chave = ?',
+                (novo, chave)
+            )
+            conexao.execute(
+                'INSERT INTO edicoes (chave, campo, anterior, novo, usuario, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                (chave, campo, json.dumps(anterior, default=str), json.dumps(novo, default=str), usuario, timestamp)
+            )
+            # O conteúdo mudou: o hash do último salvamento completo não vale mais
+            conexao.execute("DELETE FROM metadados WHERE nome = 'hash'")
+        return cursor.rowcount == 1
+
+    def consultar(self, data_inicio=None, data_fim=None, razao_social=None, prioridade=None):
+        """Filtra os registros no próprio banco (datas no formato 'YYYY-MM-DD')"""
+        condicoes = []
+        parametros = []
+        if data_inicio is not None:
+            condicoes.append(f'{self._coluna("Vencto Real")} >= ?')
+            parametros.append(str(data_inicio))
+        if data_fim is not None:
+            condicoes.append(f'{self._coluna("Vencto Real")} <= ?')
+            parametros.append(str(data_fim))
+        if razao_social is not None:
+            condicoes.append(f'{self._coluna("Razão Social")} = ?')
+            parametros.append(razao_social)
+        if prioridade is not None:
+            condicoes.append(f'{self._coluna("Prioridade")} = ?')
+            parametros.append(float(prioridade))
+
+        where = ('WHERE ' + ' AND '.join(condicoes)) if condicoes else ''
+        with closing(self._conectar()) as conexao:
+            return self._ler_tabela(conexao, where, parametros)
+
+
+def criar_armazenamento(tipo, base, funcao_chave=None):
+    """Cria o armazenamento dos registros ('json' ou 'sqlite') a partir do nome base dos arquivos"""
+    if tipo == 'sqlite':
+        return ArmazenamentoSQLite(f"{base}.db", caminho_legado=f"{base}.json", funcao_chave=funcao_chave)
+    if tipo == 'json':
+        return ArmazenamentoJSON(f"{base}.json", f"{base}.diario.jsonl")
+    raise ValueError(f"Tipo de armazenamento desconhecido: {tipo}")
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extratos - Rota Verde
+Leitura dos extratos bancários (funções de módulo, executáveis em processos separados)
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from armazenamento import atualizar_json, ler_json
+
+ARQUIVO_CACHE = 'extratos_processados.json'
+# Linhas lidas para reconhecer o formato de um arquivo (sem lê-lo por inteiro)
+LINHAS_AMOSTRA = 15
+# Colunas de saída de todos os parsers
+COLUNAS_EXTRATO = ['Data', 'Lancamento', 'Dcto', 'Credito', 'Debito', 'Saldo']
+
+
+# Rótulos do cabeçalho do Bradesco (minúsculos, sem "(R$)"), nas variações das exportações .XLS e .xlsx
+PADROES_CABECALHO_BRADESCO = {
+    'Data': r'data',
+    'Lancamento': r'lan[çc]amento|hist[óo]rico',
+    'Dcto': r'dcto\.?|docto\.?|documento|n[ºo°]\.? ?(?:do )?documento',
+    'Credito': r'cr[ée]dito',
+    'Debito': r'd[ée]bito',
+    'Saldo': r'saldo',
+}
+CAMPOS_OBRIGATORIOS_BRADESCO = ('Data', 'Lancamento', 'Credito', 'Debito')
+
+
+def _textos_celulas(df):
+    """Células preenchidas (índice linha, coluna) como texto minúsculo, sem espaços nas pontas e sem "(R$)" no fim"""
+    return (df.stack().astype(str).str.strip().str.lower()
+            .str.replace(r'\s*\(?r\$\)?$', '', regex=True))
+
+
+def _localizar_cabecalho(textos, padroes, obrigatorios):
+    """Primeira linha cujas células casam com os rótulos de `padroes` ({campo: regex}) e têm os campos obrigatórios
+
+    Todas as células são comparadas de uma vez (uma regex com um grupo por campo).
+    Retorna (rótulo da linha, {campo: rótulo da coluna}) ou None.
+    """
+    padrao = '|'.join(f'(?P<{campo}>{regex})' for campo, regex in padroes.items())
+    correspondencias = textos.str.extract(f'^(?:{padrao})$').notna()
+    rotulos = correspondencias[correspondencias.any(axis=1)].idxmax(axis=1)
+
+    campos_por_linha = rotulos.groupby(level=0).agg(set)
+    completas = campos_por_linha[campos_por_linha.map(set(obrigatorios).issubset)]
+    if completas.empty:
+        return None
+    linha_cabecalho = completas.index[0]
+
+    colunas = {}
+    for coluna, campo in rotulos.loc[linha_cabecalho].items():
+        colunas.setdefault(campo, coluna)
+    return linha_cabecalho, colunas
+
+
+def _converter_datas(serie):
+    """Datas ISO (ou já convertidas) e, no restante, o padrão brasileiro com dia primeiro ("25/02/2025 17:06")"""
+    datas = pd.to_datetime(serie, errors='coerce', format='ISO8601')
+    faltantes = datas.isna() & serie.notna()
+    if faltantes.any():
+        datas[faltantes] = pd.to_datetime(serie[faltantes].astype(str), errors='coerce', dayfirst=True, format='mixed')
+    return datas
+
+
+# Separador decimal -> tabela que remove o de milhar, troca o decimal por '.' e descarta símbolo e espaços
+TABELAS_VALORES = {
+    ',': str.maketrans({'.': None, ',': '.', 'R': None, '$': None, ' ': None, '\xa0': None}),
+    '.': str.maketrans({',': None, 'R': None, '$': None, ' ': None, '\xa0': None}),
+}
+
+
+def _separador_decimal(textos):
+    """Separador decimal da coluna: o que mais aparece seguido de 1 ou 2 dígitos no fim ("1.234,56", "1,234.56")
+
+    Sem nenhum caso decidível (ex.: só "1.234") vale o padrão brasileiro.
+    """
+    votos = textos.str.extract(r'([.,])\d{1,2}\s*$', expand=False).value_counts()
+    return votos.idxmax() if not votos.empty else ','
+
+
+def converter_valores(serie):
+    """Converte uma coluna de valores monetários (números ou textos pt-BR/en-US) em float
+
+    Números passam direto; os textos têm os separadores detectados para a coluna inteira
+    e são convertidos com um único str.translate. Retorna (valores, nao_convertidos):
+    valores é float (NaN onde não há valor) e nao_convertidos marca as células preenchidas
+    que não puderam ser lidas como número.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float), pd.Series(False, index=serie.index)
+
+    eh_texto = serie.map(type).eq(str)
+    valores = pd.to_numeric(serie.where(~eh_texto), errors='coerce').astype(float)
+    textos = serie[eh_texto].str.strip()
+
+    # Textos em branco contam como vazios, não como falhas
+    preenchidos = serie.notna()
+    preenchidos.loc[textos.index] = textos != ''
+    textos = textos[textos != '']
+    if not textos.empty:
+        convertidos = textos.str.translate(TABELAS_VALORES[_separador_decimal(textos)])
+        valores.loc[textos.index] = pd.to_numeric(convertidos, errors='coerce')
+    return valores, preenchidos & valores.isna()
+
+
+def detectar_layout_bradesco(df):
+    """Localiza cabeçalho, rodapé e colunas de um extrato do Bradesco lido sem cabeçalho
+
+    O cabeçalho é a primeira linha com os campos obrigatórios; a seção de lançamentos vai
+    até a linha 'Total' (ou o próximo cabeçalho, ex. "Saldos Invest Fácil") na coluna Data.
+    Retorna (linha_cabecalho, linha_final, {campo: posição da coluna}).
+    """
+    textos = _textos_celulas(df)
+    cabecalho = _localizar_cabecalho(textos, PADROES_CABECALHO_BRADESCO, CAMPOS_OBRIGATORIOS_BRADESCO)
+    if cabecalho is None:
+        raise ValueError("cabeçalho do extrato (Data, Lançamento, Crédito, Débito) não encontrado")
+    linha_cabecalho, rotulos_colunas = cabecalho
+    colunas = {campo: df.columns.get_loc(coluna) for campo, coluna in rotulos_colunas.items()}
+
+    # Rodapé: 'Total' ou um novo cabeçalho ('Data') na coluna Data, depois do cabeçalho
+    texto_data = textos.xs(rotulos_colunas['Data'], level=1)
+    texto_data = texto_data[texto_data.index > linha_cabecalho]
+    fim = texto_data[texto_data.str.startswith('total') | (texto_data == 'data')]
+    linha_final = df.index.get_loc(fim.index[0]) if len(fim) else len(df)
+
+    return df.index.get_loc(linha_cabecalho), linha_final, colunas
+
+
+def processar_extrato_bradesco(caminho_arquivo):
+    """Processa um extrato do Bradesco seguindo as regras específicas; retorna (dados, erro)"""
+    try:
+        # Lê o arquivo Excel
+        df = pd.read_excel(caminho_arquivo, header=None)
+
+        # Localiza cabeçalho, linha 'Total' e colunas pelos rótulos (.XLS e .xlsx têm deslocamentos diferentes)
+        linha_cabecalho, linha_final, colunas = detectar_layout_bradesco(df)
+
+        # Lê da linha seguinte ao cabeçalho até a linha com 'Total'
+        campos = ['Data', 'Lancamento', 'Dcto', 'Credito', 'Debito']
+        dados_extratos = df.iloc[linha_cabecalho + 1:linha_final].copy()
+        dados_extratos = pd.DataFrame({
+            campo: dados_extratos.iloc[:, colunas[campo]] if campo in colunas else None
+            for campo in campos
+        })
+
+        # Remove linhas vazias
+        dados_extratos = dados_extratos.dropna(how='all')
+
+        # Converte a coluna Data
+        dados_extratos['Data'] = _converter_datas(dados_extratos['Data'])
+
+        # Converte colunas de valores para números com 2 casas decimais
+        # (o .XLS traz os débitos com sinal negativo; a coluna guarda o valor absoluto)
+        nao_convertidos = pd.Series(0, index=dados_extratos.index)
+        for coluna in ['Credito', 'Debito']:
+            valores, falhas = converter_valores(dados_extratos[coluna])
+            dados_extratos[coluna] = valores.abs().fillna(0).round(2)
+            nao_convertidos += falhas
+
+        # Calcula o saldo
+        dados_extratos['Saldo'] = (dados_extratos['Credito'] - dados_extratos['Debito']).cumsum().round(2)
+
+        # Remove linhas com data inválida
+        validas = dados_extratos['Data'].notna()
+        dados_extratos = dados_extratos[validas]
+        dados_extratos.attrs['valores_nao_convertidos'] = int(nao_convertidos[validas].sum())
+
+        return dados_extratos, None
+
+    except Exception as e:
+        return None, f"Erro ao processar arquivo {os.path.basename(caminho_arquivo)}: {str(e)}"
+
+
+# Banco do Brasil: "Data | ... | Historico | Valor R$ | Inf. | ..." (Inf. = C/D); exportações antigas sem cabeçalho
+PADROES_CABECALHO_BB = {
+    'Data': r'data',
+    'Lancamento': r'hist[óo]rico',
+    'Dcto': r'n[úu]mero documento',
+    'Valor': r'valor',
+    'Tipo': r'inf\.?',
+}
+CAMPOS_OBRIGATORIOS_BB = ('Data', 'Lancamento', 'Valor', 'Tipo')
+
+
+def _colunas_bb_sem_cabecalho(df):
+    """Colunas do layout sem cabeçalho: Inf. é a coluna com mais C/D; valor e histórico vêm antes dela"""
+    tipos = df.apply(lambda coluna: coluna.astype(str).str.strip().str.upper().isin(['C', 'D']).sum())
+    posicao_tipo = df.columns.get_loc(tipos.idxmax())
+    if tipos.max() == 0 or posicao_tipo < 2:
+        raise ValueError("colunas do extrato (Histórico, Valor, C/D) não encontradas")
+    return {'Data': df.columns[0], 'Lancamento': df.columns[posicao_tipo - 2],
+            'Valor': df.columns[posicao_tipo - 1], 'Tipo': df.columns[posicao_tipo]}
+
+
+def processar_extrato_bb(caminho_arquivo):
+    """Processa um extrato do Banco do Brasil (valor único + indicador C/D); retorna (dados, erro)"""
+    try:
+        df = pd.read_excel(caminho_arquivo, header=None)
+
+        cabecalho = _localizar_cabecalho(_textos_celulas(df), PADROES_CABECALHO_BB, CAMPOS_OBRIGATORIOS_BB)
+        if cabecalho is not None:
+            linha_cabecalho, colunas = cabecalho
+            df = df.loc[df.index > linha_cabecalho]
+        else:
+            colunas = _colunas_bb_sem_cabecalho(df)
+
+        tipo = df[colunas['Tipo']].astype(str).str.strip().str.upper()
+        lancamento = df[colunas['Lancamento']].astype(str).str.strip()
+        valores, nao_convertidos = converter_valores(df[colunas['Valor']])
+        dados_extratos = pd.DataFrame({
+            'Data': _converter_datas(df[colunas['Data']]),
+            'Lancamento': lancamento,
+            'Dcto': df[colunas['Dcto']] if 'Dcto' in colunas else None,
+            'Valor': valores.abs().fillna(0).round(2),
+            'Tipo': tipo,
+        })
+
+        # Só lançamentos (data válida e C/D); a linha "S A L D O" repete o saldo final e sai
+        resumo = lancamento.str.replace(' ', '', regex=False).str.upper() == 'SALDO'
+        lancamentos = dados_extratos['Data'].notna() & tipo.isin(['C', 'D']) & ~resumo
+        dados_extratos = dados_extratos[lancamentos]
+
+        # "Saldo Anterior"/"Saldo Inicial" entra como crédito e abre o saldo acumulado
+        dados_extratos['Credito'] = dados_extratos['Valor'].where(dados_extratos['Tipo'] == 'C', 0.0)
+        dados_extratos['Debito'] = dados_extratos['Valor'].where(dados_extratos['Tipo'] == 'D', 0.0)
+        dados_extratos['Saldo'] = (dados_extratos['Credito'] - dados_extratos['Debito']).cumsum().round(2)
+
+        dados_extratos = dados_extratos[COLUNAS_EXTRATO]
+        dados_extratos.attrs['valores_nao_convertidos'] = int(nao_convertidos[lancamentos].sum())
+        return dados_extratos, None
+
+    except Exception as e:
+        return None, f"Erro ao processar arquivo {os.path.basename(caminho_arquivo)}: {str(e)}"
+
+
+# REAG: "Identificador | Data/Hora | Histórico | Descrição | Valor | Saldo" (valor com sinal, mais recentes primeiro);
+# exportações antigas sem cabeçalho trazem as mesmas colunas a partir da segunda
+PADROES_CABECALHO_REAG = {
+    'Dcto': r'identificador',
+    'Data': r'data/hora|data',
+    'Lancamento': r'hist[óo]rico',
+    'Descricao': r'descri[çc][ãa]o',
+    'Valor': r'valor',
+    'Saldo': r'saldo',
+}
+CAMPOS_OBRIGATORIOS_REAG = ('Dcto', 'Data', 'Valor', 'Saldo')
+
+
+def _layout_reag_sem_cabecalho(df):
+    """Seis colunas com data/hora na segunda e valor e saldo numéricos nas duas últimas"""
+    if df.shape[1] != 6 or df.empty:
+        return False
+    datas = _converter_datas(df.iloc[:, 1])
+    valores = df.iloc[:, 4:6].apply(pd.to_numeric, errors='coerce')
+    return datas.notna().mean() >= 0.8 and valores.notna().all(axis=1).mean() >= 0.8
+
+
+def processar_extrato_reag(caminho_arquivo):
+    """Processa um extrato do REAG (valor com sinal e saldo do banco); retorna (dados, erro)"""
+    try:
+        df = pd.read_excel(caminho_arquivo, header=None)
+
+        cabecalho = _localizar_cabecalho(_textos_celulas(df), PADROES_CABECALHO_REAG, CAMPOS_OBRIGATORIOS_REAG)
+        if cabecalho is not None:
+            linha_cabecalho, colunas = cabecalho
+            df = df.loc[df.index > linha_cabecalho]
+        elif _layout_reag_sem_cabecalho(df):
+            colunas = dict(zip(['Dcto', 'Data', 'Lancamento', 'Descricao', 'Valor', 'Saldo'], df.columns))
+        else:
+            raise ValueError("cabeçalho do extrato (Identificador, Data/Hora, Valor, Saldo) não encontrado")
+
+        # Lançamento = histórico + descrição (quando houver)
+        lancamento = df[colunas['Lancamento']].astype(str).str.strip()
+        if 'Descricao' in colunas:
+            descricao = df[colunas['Descricao']]
+            lancamento = lancamento.where(descricao.isna(), lancamento + ' ' + descricao.astype(str).str.strip())
+
+        valor, falhas_valor = converter_valores(df[colunas['Valor']])
+        saldo, falhas_saldo = converter_valores(df[colunas['Saldo']])
+        valor = valor.fillna(0).round(2)
+        dados_extratos = pd.DataFrame({
+            'Data': _converter_datas(df[colunas['Data']]),
+            'Lancamento': lancamento,
+            'Dcto': df[colunas['Dcto']],
+            'Credito': valor.clip(lower=0),
+            'Debito': (-valor).clip(lower=0),
+            'Saldo': saldo.round(2),
+        })
+        validas = dados_extratos['Data'].notna()
+        dados_extratos = dados_extratos[validas]
+
+        # Ordem cronológica (invertida antes para manter a ordem do banco entre lançamentos do mesmo minuto)
+        dados_extratos = dados_extratos.iloc[::-1].sort_values('Data', kind='stable')
+
+        dados_extratos = dados_extratos[COLUNAS_EXTRATO]
+        dados_extratos.attrs['valores_nao_convertidos'] = int((falhas_valor | falhas_saldo)[validas].sum())
+        return dados_extratos, None
+
+    except Exception as e:
+        return None, f"Erro ao processar arquivo {os.path.basename(caminho_arquivo)}: {str(e)}"
+
+
+def _assinatura_bradesco(amostra):
+    return _localizar_cabecalho(_textos_celulas(amostra), PADROES_CABECALHO_BRADESCO,
+                                CAMPOS_OBRIGATORIOS_BRADESCO) is not None
+
+
+def _assinatura_bb(amostra):
+    textos = _textos_celulas(amostra)
+    return (_localizar_cabecalho(textos, PADROES_CABECALHO_BB, CAMPOS_OBRIGATORIOS_BB) is not None
+            or textos.str.contains('banco do brasil', regex=False).any())
+
+
+def _assinatura_reag(amostra):
+    return (_localizar_cabecalho(_textos_celulas(amostra), PADROES_CABECALHO_REAG,
+                                 CAMPOS_OBRIGATORIOS_REAG) is not None
+            or _layout_reag_sem_cabecalho(amostra))
+
+
+class ParserExtrato:
+    """Formato de extrato registrado
+
+    `assinatura(amostra)` é uma verificação barata nas primeiras LINHAS_AMOSTRA linhas;
+    `processar(caminho)` lê o arquivo inteiro e retorna (dados, erro) com COLUNAS_EXTRATO e,
+    em dados.attrs['valores_nao_convertidos'], quantos valores preenchidos não eram números.
+    `dica_nome` (regex sobre o nome do arquivo) só desempata. Incrementar `versao` sempre
+    que o resultado do parser mudar (invalida o cache daquele parser).
+    """
+
+    def __init__(self, nome, tipo, versao, dica_nome, assinatura, processar):
+        self.nome = nome
+        self.tipo = tipo
+        self.versao = versao
+        self.dica_nome = dica_nome
+        self.assinatura = assinatura
+        self.processar = processar
+
+
+PARSERS = {parser.nome: parser for parser in (
+    ParserExtrato('bradesco', 'Bradesco', 4, r'bradesco', _assinatura_bradesco, processar_extrato_bradesco),
+    ParserExtrato('bb', 'BB', 2, r'(?<![a-z])bb(?![a-z])|banco do brasil', _assinatura_bb, processar_extrato_bb),
+    ParserExtrato('reag', 'REAG', 2, r'reag', _assinatura_reag, processar_extrato_reag),
+)}
+
+# Formato já identificado por (caminho, tamanho, data de modificação): cada versão do arquivo é amostrada uma vez
+_IDENTIFICACOES = {}
+
+
+def _identificar(caminho_arquivo):
+    nome_arquivo = os.path.basename(caminho_arquivo).lower()
+    try:
+        amostra = pd.read_excel(caminho_arquivo, header=None, nrows=LINHAS_AMOSTRA)
+        candidatos = [nome for nome, parser in PARSERS.items() if parser.assinatura(amostra)]
+    except Exception:
+        # Ilegível: fica com a dica do nome (o erro aparece ao processar)
+        candidatos = []
+    if len(candidatos) == 1:
+        return candidatos[0]
+
+    # Nenhuma ou mais de uma assinatura: o nome do arquivo desempata
+    pelo_nome = [nome for nome in (candidatos or PARSERS) if re.search(PARSERS[nome].dica_nome, nome_arquivo)]
+    if len(pelo_nome) == 1:
+        return pelo_nome[0]
+    return candidatos[0] if candidatos else None
+
+
+def identificar_extrato(caminho_arquivo):
+    """Nome do parser do arquivo (pelo conteúdo das primeiras linhas; o nome só desempata) ou None"""
+    info = os.stat(caminho_arquivo)
+    chave = (os.path.abspath(caminho_arquivo), info.st_size, info.st_mtime_ns)
+    if chave not in _IDENTIFICACOES:
+        _IDENTIFICACOES[chave] = _identificar(caminho_arquivo)
+    return _IDENTIFICACOES[chave]
+
+
+def processar_arquivo_extrato(caminho_arquivo, parser='bradesco'):
+    """Tarefa de um arquivo (executada no processo de trabalho): retorna (caminho, dados, erro)"""
+    dados, erro = PARSERS[parser].processar(caminho_arquivo)
+    if dados is not None:
+        dados['Arquivo_Origem'] = os.path.basename(caminho_arquivo)
+    return caminho_arquivo, dados, erro
+
+
+def processar_extratos_em_paralelo(parsers_por_caminho, max_processos=None):
+    """Processa os arquivos ({caminho: parser}) em um pool de processos, entregando (caminho, dados, erro) à medida que terminam
+
+    O número de processos é limitado pelo de CPUs e pelo de arquivos; com um só arquivo
+    (ou uma só CPU) o processamento é feito no próprio processo, sem o custo de criar o pool.
+    """
+    tarefas = dict(parsers_por_caminho)
+    max_processos = min(len(tarefas), max_processos or os.cpu_count() or 1)
+    if max_processos <= 1:
+        for caminho, parser in tarefas.items():
+            yield processar_arquivo_extrato(caminho, parser)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_processos) as executor:
+        futuros = {executor.submit(processar_arquivo_extrato, caminho, parser): caminho
+                   for caminho, parser in tarefas.items()}
+        for futuro in as_completed(futuros):
+            try:
+                yield futuro.result()
+            except Exception as e:
+                # Processo de trabalho encerrado de forma anormal (ex.: falta de memória)
+                caminho = futuros[futuro]
+                yield caminho, None, f"Erro ao processar arquivo {os.path.basename(caminho)}: {str(e)}"
+
+
+def saldos_finais(dados):
+    """Saldo final de cada banco nos extratos combinados: DataFrame com Banco, Arquivo_Origem, Data e Saldo
+
+    Os parsers entregam cada extrato em ordem cronológica, com o saldo final na última linha, e
+    a junção ordena por data de forma estável: a última linha de cada arquivo continua sendo a
+    dele. Com vários extratos do mesmo banco vale o que termina mais tarde.
+    """
+    ultimas = dados.groupby(['Banco', 'Arquivo_Origem'], sort=False).tail(1)
+    por_banco = ultimas.sort_values('Data', kind='stable').groupby('Banco', sort=False).tail(1)
+    return por_banco[['Banco', 'Arquivo_Origem', 'Data', 'Saldo']].sort_values('Banco').reset_index(drop=True)
+
+
+def hash_arquivo(caminho_arquivo, tamanho_bloco=1 << 20):
+    """SHA-256 do conteúdo do arquivo (lido em blocos)"""
+    digest = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+def chave_cache(hash_conteudo, parser):
+    """Chave do extrato no cache: conteúdo + parser + versão do parser"""
+    return f"sha256:{hash_conteudo}:{parser}:v{PARSERS[parser].versao}"
+
+
+class CacheExtratos:
+    """Extratos já processados em extratos_processados.json, endereçados pelo conteúdo do arquivo
+
+    O mesmo arquivo (mesmo conteúdo, qualquer nome) é processado uma única vez por versão do
+    parser. Ao gravar só saem as entradas substituídas: as de arquivos presentes na pasta que
+    agora estão sob outra chave (conteúdo novo, versão nova do parser ou chave antiga de nome +
+    data de processamento). Entradas de arquivos que não estão mais na pasta são o histórico e
+    ficam como estão, em qualquer formato de chave.
+    """
+
+    def __init__(self, caminho=ARQUIVO_CACHE):
+        self.caminho = caminho
+        self._entradas = None
+
+    def _carregar(self):
+        if self._entradas is None:
+            self._entradas = ler_json(self.caminho, {}) or {}
+        return self._entradas
+
+    def obter(self, chave, arquivo):
+        """DataFrame do extrato guardado na chave (com Arquivo_Origem = `arquivo`) ou None"""
+        entrada = self._carregar().get(chave)
+        if entrada is None:
+            return None
+        dados = pd.DataFrame(entrada['dados'])
+        dados['Data'] = pd.to_datetime(dados['Data'], errors='coerce')
+        dados['Arquivo_Origem'] = arquivo
+        dados.attrs['valores_nao_convertidos'] = entrada.get('valores_nao_convertidos', 0)
+        return dados
+
+    @staticmethod
+    def _entrada(parser, arquivo, dados):
+        registros = json.loads(dados.drop(columns=['Arquivo_Origem'], errors='ignore')
+                               .to_json(orient='records', date_format='iso'))
+        return {
+            'tipo': PARSERS[parser].tipo,
+            'arquivo': arquivo,
+            'data_processamento': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+            'total_transacoes': len(registros),
+            'valores_nao_convertidos': dados.attrs.get('valores_nao_convertidos', 0),
+            'dados': registros,
+        }
+
+    def gravar(self, novos, chaves_atuais):
+        """Acrescenta `novos` ({chave: (parser, arquivo, dados)}) e poda o cache numa única regravação
+
+        `chaves_atuais` ({arquivo: chave}) são as dos arquivos presentes na pasta; outras
+        entradas para esses mesmos nomes foram substituídas e saem do cache.
+        """
+        entradas_novas = {chave: self._entrada(*valor) for chave, valor in novos.items()}
+        vigentes = set(chaves_atuais.values())
+
+        def atualizar(entradas):
+            entradas = dict(entradas or {})
+            entradas.update(entradas_novas)
+            return {
+                chave: entrada for chave, entrada in entradas.items()
+                if chave in vigentes or entrada.get('arquivo') not in chaves_atuais
+            }
+
+        self._entradas = atualizar_json(self.caminho, atualizar, {})
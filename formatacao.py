@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Formatação - Rota Verde
+Valores em reais e datas no padrão brasileiro, com uma regra única para colunas inteiras e valores avulsos
+"""
+
+import numpy as np
+import pandas as pd
+
+# Troca de separadores en-US -> pt-BR ("1,234.56" -> "1.234,56") em uma só passada
+TABELA_SEPARADORES = str.maketrans(',.', '.,')
+
+FORMATO_DATA_ISO = '%Y-%m-%d'
+FORMATO_DATA_BR = '%d/%m/%Y'
+
+
+def _como_array(valores):
+    """Converte lista/array/Series em array float (ausentes e não numéricos viram NaN)"""
+    if isinstance(valores, pd.Series):
+        return pd.to_numeric(valores, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return pd.to_numeric(pd.Series(np.asarray(valores, dtype=object)), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+
+def formatar_moedas(valores, simbolo=True, casas=2, vazio=None, sinal=False):
+    """Formata uma coluna inteira de valores como moeda brasileira
+
+    "R$ 1.234,56" (ou "1.234,56" com simbolo=False); negativos ficam "R$ -1.234,56"
+    e, com sinal=True, positivos ficam "R$ +1.234,56" (diferenças).
+    Ausentes (NaN/None) viram `vazio` ou, se `vazio` for None, o zero formatado.
+    Retorna uma Series (mesmo índice) quando recebe Series e um array de objetos caso contrário.
+
+    Cada valor ainda passa pelo format do Python (implementado em C); a função concentra as
+    regras que antes estavam repetidas em lambdas pelo app. Montar o texto com operações de
+    string do pandas/numpy ficou mais lento que o format nas colunas do app.
+    """
+    numeros = _como_array(valores)
+    ausentes = np.isnan(numeros)
+    modelo = ('R$ {:%s,.%df}' if simbolo else '{:%s,.%df}') % ('+' if sinal else '', casas)
+
+    textos = [texto.translate(TABELA_SEPARADORES) for texto in map(modelo.format, np.where(ausentes, 0.0, numeros).tolist())]
+    resultado = np.array(textos, dtype=object)
+    if vazio is not None and ausentes.any():
+        resultado[ausentes] = vazio
+
+    if isinstance(valores, pd.Series):
+        return pd.Series(resultado, index=valores.index, dtype=object)
+    return resultado
+
+
+def formatar_moeda(valor, simbolo=True, casas=2, vazio=None, sinal=False):
+    """Formata um único valor como moeda brasileira (mesmas regras de formatar_moedas)"""
+    return formatar_moedas([valor], simbolo=simbolo, casas=casas, vazio=vazio, sinal=sinal)[0]
+
+
+def formatar_datas(datas, formato=FORMATO_DATA_ISO, vazio='-'):
+    """Formata uma coluna inteira de datas ('%Y-%m-%d' por padrão); ausentes viram `vazio`
+
+    Retorna uma Series (mesmo índice) quando recebe Series e um array de objetos caso contrário.
+    """
+    serie = datas if isinstance(datas, pd.Series) else pd.Series(np.asarray(datas, dtype=object))
+    textos = pd.to_datetime(serie, errors='coerce').dt.strftime(formato).astype(object)
+    textos = textos.where(textos.notna(), vazio)
+
+    if isinstance(datas, pd.Series):
+        return textos
+    return textos.to_numpy(dtype=object)
+
+
+def formatar_data(valor, formato=FORMATO_DATA_ISO, vazio='-'):
+    """Formata uma única data (mesmas regras de formatar_datas)"""
+    return formatar_datas([valor], formato=formato, vazio=vazio)[0]
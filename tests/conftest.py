@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes - Rota Verde
+Fixtures comuns: importa o app fora do Streamlit e isola os arquivos de dados em uma pasta temporária
+"""
+
+import json
+import os
+import sys
+
+import pytest
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sem sessão autenticada o módulo do app para na tela de login
+st.session_state['authenticated'] = True
+import app as modulo_app  # noqa: E402
+
+
+def registro(razao_social, vencto, valor, **campos):
+    """Registro no formato do JSON base (lançamento manual: sem filial, título e fornecedor)"""
+    base = {
+        'Filial': None, 'No. Titulo': None, 'Parcela': None, 'Tipo': None, 'Natureza': None,
+        'Fornecedor': None, 'Loja': None, 'Razão Social': razao_social, 'Vencto Real': vencto,
+        'Historico': razao_social, 'Valor': valor, 'Data Renegociacao': None, 'Prioridade': None,
+        'Situacao': None, 'Descricao_Negociacao': None,
+    }
+    base.update(campos)
+    return base
+
+
+@pytest.fixture
+def pasta_dados(tmp_path, monkeypatch):
+    """Pasta de trabalho vazia (o app grava JSON, diário e banco no diretório atual)"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ROTA_VERDE_ARMAZENAMENTO', raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def criar_app(pasta_dados):
+    """Fábrica de apps carregados a partir do JSON base `registros` (gravado só na primeira chamada)"""
+    def criar(registros=None):
+        if registros is not None:
+            with open('dados_fluxo_caixa.json', 'w', encoding='utf-8') as f:
+                json.dump(registros, f, ensure_ascii=False)
+        app = modulo_app.FluxoCaixaApp()
+        app.dados = app.carregar_dados_json()
+        app.ordenar_por_prioridade_e_renegociacao()
+        return app
+    return criar
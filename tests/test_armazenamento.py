@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do armazenamento SQLite - Rota Verde
+"""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from armazenamento import ArmazenamentoSQLite
+from conftest import registro
+
+
+@pytest.fixture
+def criar_app_sqlite(criar_app, monkeypatch):
+    monkeypatch.setenv('ROTA_VERDE_ARMAZENAMENTO', 'sqlite')
+    return criar_app
+
+
+def test_edicao_atualiza_o_registro_editado(criar_app_sqlite):
+    app = criar_app_sqlite([
+        registro('CN1', '2025-10-10', 100.0),
+        registro('DELL', '2025-10-10', 200.0),
+        registro('DELL', '2025-10-10', 300.0),
+    ])
+    app.salvar_dados_json(forcar=True)
+
+    dell = app.dados.index[app.dados['Valor'] == 300.0][0]
+    app.registrar_edicao(dell, 'Situacao', 'PG')
+
+    recarregado = criar_app_sqlite()
+    situacoes = recarregado.dados.set_index('Valor')['Situacao']
+    assert situacoes.fillna('').to_dict() == {100.0: '', 200.0: '', 300.0: 'PG'}
+
+
+def test_chave_repetida_falha_ao_gravar(pasta_dados):
+    armazenamento = ArmazenamentoSQLite('teste.db', funcao_chave=lambda dados: pd.Series('mesma', index=dados.index))
+    with pytest.raises(sqlite3.IntegrityError):
+        armazenamento.salvar([registro('CN1', '2025-10-10', 100.0), registro('DELL', '2025-10-10', 200.0)])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do diário de edições - Rota Verde
+"""
+
+from conftest import registro
+
+
+def _linha(app, razao_social, historico=None):
+    dados = app.dados[app.dados['Razão Social'] == razao_social]
+    if historico is not None:
+        dados = dados[dados['Historico'] == historico]
+    assert len(dados) == 1
+    return dados.index[0]
+
+
+def test_chaves_unicas_para_lancamentos_manuais_do_mesmo_dia(criar_app):
+    app = criar_app([
+        registro('CN1', '2025-10-10', 100.0),
+        registro('DELL', '2025-10-10', 200.0),
+        registro('CN1', '2025-10-10', 300.0),
+    ])
+    chaves = app._chaves_registros(app.dados)
+    assert chaves.is_unique
+
+
+def test_edicao_reaplicada_no_registro_editado(criar_app):
+    # CN1 e DELL compartilham todas as colunas da chave antiga (vazias + mesmo vencimento)
+    app = criar_app([
+        registro('CN1', '2025-10-10', 100.0),
+        registro('DELL', '2025-10-10', 200.0),
+    ])
+    dell = _linha(app, 'DELL')
+    assert app.registrar_edicao(dell, 'Valor', 250.0)
+    assert app.registrar_edicao(dell, 'Situacao', 'PG')
+
+    recarregado = criar_app()
+    assert recarregado.dados.loc[_linha(recarregado, 'DELL'), ['Valor', 'Situacao']].tolist() == [250.0, 'PG']
+    assert recarregado.dados.loc[_linha(recarregado, 'CN1'), ['Valor', 'Situacao']].tolist() == [100.0, None]
+
+
+def test_edicao_de_registro_repetido_apos_reordenacao(criar_app):
+    # Dois lançamentos idênticos nas colunas da chave; o segundo sobe ao ganhar prioridade
+    app = criar_app([
+        registro('CN1', '2025-10-03', 1500000.00, Historico='CN1 a'),
+        registro('CN1', '2025-10-03', 4075664.64, Historico='CN1 b'),
+    ])
+    segundo = _linha(app, 'CN1', 'CN1 b')
+    app.registrar_edicao(segundo, 'Prioridade', 1.0)
+    app.reposicionar_registros_editados()
+    segundo = _linha(app, 'CN1', 'CN1 b')
+    app.registrar_edicao(segundo, 'Situacao', 'PG')
+
+    recarregado = criar_app()
+    assert recarregado.dados.loc[_linha(recarregado, 'CN1', 'CN1 b'), ['Prioridade', 'Situacao']].tolist() == [1.0, 'PG']
+    assert recarregado.dados.loc[_linha(recarregado, 'CN1', 'CN1 a'), 'Situacao'] is None
+
+    # Depois da compactação (base regravada na nova ordem) as chaves seguem a nova ordem
+    recarregado.salvar_dados_json(forcar=True)
+    primeiro = _linha(recarregado, 'CN1', 'CN1 a')
+    recarregado.registrar_edicao(primeiro, 'Situacao', 'NPG')
+    final = criar_app()
+    assert final.dados.loc[_linha(final, 'CN1', 'CN1 a'), 'Situacao'] == 'NPG'
+    assert final.dados.loc[_linha(final, 'CN1', 'CN1 b'), 'Situacao'] == 'PG'
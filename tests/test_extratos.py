@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do cache de extratos processados - Rota Verde
+"""
+
+import pandas as pd
+
+from armazenamento import ler_json, salvar_json
+from extratos import CacheExtratos, chave_cache, saldos_finais
+
+
+def extrato(saldo):
+    return pd.DataFrame({'Data': pd.to_datetime(['2025-01-02']), 'Lancamento': ['PIX'], 'Dcto': [None],
+                         'Credito': [saldo], 'Debito': [0.0], 'Saldo': [saldo]})
+
+
+def entrada_antiga(arquivo):
+    return {'tipo': 'Bradesco', 'arquivo': arquivo, 'data_processamento': '2025-01-01_10-00-00',
+            'total_transacoes': 0, 'dados': []}
+
+
+def test_gravacao_mantem_historico_e_poda_so_entradas_substituidas(pasta_dados):
+    salvar_json('extratos_processados.json', {
+        'Bradesco_janeiro.xlsx_2025-01-01_10-00-00': entrada_antiga('janeiro.xlsx'),
+        'Bradesco_fevereiro.xlsx_2025-02-01_10-00-00': entrada_antiga('fevereiro.xlsx'),
+        'sha256:aaa:bradesco:v1': entrada_antiga('marco.xlsx'),
+        'sha256:bbb:bradesco:v1': entrada_antiga('fevereiro.xlsx'),
+    })
+    chave = chave_cache('ccc', 'bradesco')
+
+    CacheExtratos().gravar({chave: ('bradesco', 'fevereiro.xlsx', extrato(10.0))}, {'fevereiro.xlsx': chave})
+
+    entradas = ler_json('extratos_processados.json')
+    # Arquivos fora da pasta continuam no histórico, em qualquer formato de chave
+    assert set(entradas) == {'Bradesco_janeiro.xlsx_2025-01-01_10-00-00', 'sha256:aaa:bradesco:v1', chave}
+    dados = CacheExtratos().obter(chave, 'fevereiro.xlsx')
+    assert dados['Saldo'].tolist() == [10.0]
+    assert dados['Arquivo_Origem'].tolist() == ['fevereiro.xlsx']
+
+
+def test_saldo_final_por_banco_vem_da_ultima_linha_de_cada_arquivo():
+    # Junção já ordenada por data: o último lançamento geral é do BB, mas cada banco tem o seu saldo
+    dados = pd.DataFrame({
+        'Data': pd.to_datetime(['2025-01-02', '2025-01-03', '2025-01-03', '2025-01-05', '2025-02-01', '2025-02-03']),
+        'Saldo': [100.0, 7.0, 150.0, 9.0, 400.0, 11.0],
+        'Banco': ['Bradesco', 'BB', 'Bradesco', 'BB', 'Bradesco', 'BB'],
+        'Arquivo_Origem': ['bradesco_jan.xlsx', 'bb.xlsx', 'bradesco_jan.xlsx', 'bb.xlsx', 'bradesco_fev.xlsx', 'bb.xlsx'],
+    })
+
+    saldos = saldos_finais(dados)
+
+    assert saldos['Banco'].tolist() == ['BB', 'Bradesco']
+    assert saldos['Saldo'].tolist() == [11.0, 400.0]
+    assert saldos['Arquivo_Origem'].tolist() == ['bb.xlsx', 'bradesco_fev.xlsx']
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da formatação de valores e datas - Rota Verde
+"""
+
+import numpy as np
+import pandas as pd
+
+from formatacao import formatar_data, formatar_datas, formatar_moeda, formatar_moedas
+
+
+def test_moeda_no_padrao_brasileiro():
+    assert formatar_moeda(1234567.891) == 'R$ 1.234.567,89'
+    assert formatar_moeda(-1234.5) == 'R$ -1.234,50'
+    assert formatar_moeda(0) == 'R$ 0,00'
+    assert formatar_moeda(1234.5, simbolo=False) == '1.234,50'
+
+
+def test_sinal_explicito_nas_diferencas():
+    assert formatar_moeda(150.0, sinal=True) == 'R$ +150,00'
+    assert formatar_moeda(-150.0, sinal=True) == 'R$ -150,00'
+    assert formatar_moeda(1500.0, simbolo=False, sinal=True) == '+1.500,00'
+
+
+def test_casas_decimais():
+    assert formatar_moeda(1234.56, casas=0) == 'R$ 1.235'
+    assert formatar_moeda(-0.4, casas=0) == 'R$ -0'
+    assert formatar_moeda(2.5, casas=1) == 'R$ 2,5'
+
+
+def test_ausentes_viram_zero_ou_vazio():
+    valores = pd.Series([10.0, np.nan, None, 'abc'], index=[7, 8, 9, 10], dtype=object)
+
+    assert formatar_moedas(valores).tolist() == ['R$ 10,00', 'R$ 0,00', 'R$ 0,00', 'R$ 0,00']
+    formatados = formatar_moedas(valores, vazio='-')
+    assert formatados.tolist() == ['R$ 10,00', '-', '-', '-']
+    assert formatados.index.tolist() == [7, 8, 9, 10]
+    assert formatar_moeda(None, vazio='') == ''
+
+
+def test_lista_retorna_array_de_textos():
+    formatados = formatar_moedas([1.0, -2.0], simbolo=False)
+    assert isinstance(formatados, np.ndarray)
+    assert formatados.tolist() == ['1,00', '-2,00']
+
+
+def test_datas_com_ausentes():
+    datas = pd.Series(['2025-03-01', None, 'inválida'])
+    assert formatar_datas(datas, formato='%d/%m/%Y').tolist() == ['01/03/2025', '-', '-']
+    assert formatar_data(pd.Timestamp('2025-12-31')) == '2025-12-31'
+    assert formatar_data(None, vazio='') == ''
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da ordenação por prioridade e renegociação - Rota Verde
+"""
+
+import numpy as np
+import pandas as pd
+
+from conftest import registro
+
+
+def _chave_recalculada(app):
+    """Chave de ordenação calculada do zero (sem reaproveitar a Data Efetiva guardada)"""
+    return app.calcular_chave_ordenacao(app.dados.drop(columns=['Data Efetiva']))
+
+
+def test_chave_atualizada_ao_editar_renegociacao(criar_app):
+    app = criar_app([
+        registro('CN1', '2025-10-10', 100.0, Prioridade=2),
+        registro('DELL', '2025-10-20', 200.0, Prioridade=2),
+    ])
+    idx = app.dados.index[app.dados['Razão Social'] == 'DELL'][0]
+
+    app.registrar_edicao(idx, 'Data Renegociacao', pd.Timestamp('2025-09-01'))
+    assert app.dados.loc[idx, 'Data Efetiva'] == pd.Timestamp('2025-09-01')
+    assert (app.dados['Chave_Ordenacao'].to_numpy() == _chave_recalculada(app)).all()
+
+    app.registrar_edicao(idx, 'Data Renegociacao', None)
+    app.registrar_edicao(idx, 'Prioridade', 1.0)
+    assert app.dados.loc[idx, 'Data Efetiva'] == pd.Timestamp('2025-10-20')
+    assert (app.dados['Chave_Ordenacao'].to_numpy() == _chave_recalculada(app)).all()
+
+
+def test_reposicionamento_equivale_a_ordenacao_completa(criar_app):
+    rng = np.random.default_rng(12)
+    registros = [
+        registro(f'Fornecedor {i}', str(pd.Timestamp('2025-10-01') + pd.Timedelta(days=int(rng.integers(0, 90))))[:10],
+                 float(i), Prioridade=int(rng.integers(1, 6)) if rng.random() < 0.7 else None)
+        for i in range(120)
+    ]
+    app = criar_app(registros)
+    razao_por_rotulo = app.dados['Razão Social'].to_dict()
+
+    for _ in range(60):
+        idx = app.dados.index[rng.integers(0, len(app.dados))]
+        if rng.random() < 0.5:
+            novo = float(rng.integers(1, 6)) if rng.random() < 0.8 else None
+            app.registrar_edicao(idx, 'Prioridade', novo)
+        else:
+            novo = pd.Timestamp('2025-09-15') + pd.Timedelta(days=int(rng.integers(0, 120))) if rng.random() < 0.8 else None
+            app.registrar_edicao(idx, 'Data Renegociacao', novo)
+        app.reposicionar_registros_editados()
+
+        esperado = app.dados.sort_values('Chave_Ordenacao', kind='stable')
+        assert (app.dados['Chave_Ordenacao'].to_numpy() == esperado['Chave_Ordenacao'].to_numpy()).all()
+        assert (app.dados['Chave_Ordenacao'].to_numpy() == _chave_recalculada(app)).all()
+        # Os rótulos continuam identificando os mesmos registros
+        assert app.dados['Razão Social'].to_dict() == razao_por_rotulo
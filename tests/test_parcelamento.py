@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do parcelamento de registros - Rota Verde
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from armazenamento import ler_json
+from conftest import registro
+
+
+def parcelas(quantidade, valor):
+    return [{'numero': f"{i}/{quantidade}", 'data': date(2025, 1 + i, 10), 'valor': valor}
+            for i in range(1, quantidade + 1)]
+
+
+def test_parcelamento_transforma_original_e_acrescenta_parcelas(criar_app):
+    app = criar_app([registro('ALFA', '2025-01-10', 300.0), registro('BETA', '2025-01-20', 50.0)])
+    idx = app.dados.index[app.dados['Razão Social'] == 'ALFA'][0]
+    versao = app.versao_dados
+
+    salvo, mensagens = app.parcelar_registro(idx, parcelas(3, 100.0), 300.0, date(2025, 2, 10),
+                                             'Acordo', 'N_PG', 'Alta')
+
+    assert salvo and mensagens
+    assert app.versao_dados > versao
+    assert app.dados.index.is_unique
+    alfa = app.dados[app.dados['Razão Social'] == 'ALFA']
+    assert sorted(alfa['Parcela']) == ['1/3', '2/3', '3/3']
+    assert alfa['Valor'].sum() == 300.0
+    assert app.dados.loc[idx, 'Parcela'] == '1/3'
+    assert alfa['ID_Parcelamento_Original'].nunique() == 1
+    assert len(ler_json('controle_parcelamentos.json')[0]['parcelas']) == 3
+
+    recarregado = criar_app()
+    assert sorted(recarregado.dados['Parcela'].dropna()) == ['1/3', '2/3', '3/3']
+
+
+def test_parcelamentos_simultaneos_mantem_todas_as_parcelas(criar_app):
+    nomes = [f"FORNECEDOR {i}" for i in range(12)]
+    app = criar_app([registro(nome, '2025-01-10', 120.0) for nome in nomes])
+    indices = [app.dados.index[app.dados['Razão Social'] == nome][0] for nome in nomes]
+
+    def parcelar(idx):
+        return app.parcelar_registro(idx, parcelas(4, 30.0), 120.0, date(2025, 2, 10), '', 'N_PG', None)[0]
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        assert all(executor.map(parcelar, indices))
+
+    assert len(app.dados) == 12 * 4
+    assert app.dados.index.is_unique
+    assert (app.dados.groupby('Razão Social')['Valor'].sum() == 120.0).all()
+    assert len(ler_json('controle_parcelamentos.json')) == 12
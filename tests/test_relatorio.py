@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do relatório HTML do fluxo de caixa - Rota Verde
+"""
+
+from conftest import registro
+
+
+def test_registro_movido_para_grupo_vazio(criar_app):
+    app = criar_app([registro('CN1', '2025-10-10', 100.0, Prioridade=2)])
+    html = app.gerar_html_fluxo_caixa()
+    assert 'Prioridade 2 - Alta' in html and 'prioridade-2' in html
+    _, grade = app.gerar_dados_grade_virtual(app.preparar_visao_fluxo(None))
+    assert grade['grupos'][0]['classe'] == 'prioridade-2'
+
+    # Mesmas linhas em outro grupo: o fragmento em cache do grupo 2 não serve
+    app.registrar_edicao(app.dados.index[0], 'Prioridade', 3.0)
+    app.garantir_ordenacao()
+    html = app.gerar_html_fluxo_caixa()
+    assert 'Prioridade 3 - Média' in html and 'prioridade-3' in html
+    assert 'Prioridade 2 - Alta' not in html
+    _, grade = app.gerar_dados_grade_virtual(app.preparar_visao_fluxo(None))
+    assert [(g['rotulo'], g['classe']) for g in grade['grupos']] == [('Prioridade 3 - Média', 'prioridade-3')]
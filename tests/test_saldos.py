@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes dos saldos bancários - Rota Verde
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from armazenamento import ler_json
+
+
+def test_marcacoes_simultaneas_somam_todas_as_diferencas(criar_app):
+    app = criar_app([])
+    app.salvar_saldos_bancarios(10000.0, 500.0, 250.0)
+
+    # 40 itens de R$ 10 marcados como pagos e 10 de R$ 5 desmarcados, em paralelo
+    mudancas = [(10.0, 'N_PG', 'PG')] * 40 + [(5.0, 'PG', 'N_PG')] * 10
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        resultados = list(executor.map(lambda m: app.atualizar_saldo_por_situacao(*m), mudancas))
+
+    assert all(sucesso for sucesso, _ in resultados)
+    saldos = ler_json('saldos_bancarios.json')
+    assert saldos['saldos'] == {'bradesco': 10000.0 - 400.0 + 50.0, 'banco_brasil': 500.0, 'reag': 250.0}
+    assert saldos['total'] == 10000.0 - 400.0 + 50.0 + 500.0 + 250.0
+
+
+def test_situacao_sem_mudanca_nao_altera_saldo(criar_app):
+    app = criar_app([])
+    app.salvar_saldos_bancarios(100.0, 0.0, 0.0)
+    assert app.atualizar_saldo_por_situacao(30.0, 'PG', 'PG')[0]
+    assert ler_json('saldos_bancarios.json')['saldos']['bradesco'] == 100.0